@@ -0,0 +1,145 @@
+import itertools
+import random
+
+from hdl_simulator import Elaborator, nand_order
+
+# --- Part 1: Golden Models ---
+# Python reference behavior of the combinational chips, pin values as unsigned ints.
+def _mux(a, b, sel):
+    return b if sel else a
+
+def _alu(x, y, zx, nx, zy, ny, f, no):
+    if zx: x = 0
+    if nx: x = ~x & 0xFFFF
+    if zy: y = 0
+    if ny: y = ~y & 0xFFFF
+    out = (x + y) & 0xFFFF if f else x & y
+    if no: out = ~out & 0xFFFF
+    return {'out': out, 'zr': int(out == 0), 'ng': out >> 15}
+
+GOLDEN_MODELS = {
+    'Not':       lambda p: {'out': 1 - p['in']},
+    'And':       lambda p: {'out': p['a'] & p['b']},
+    'Or':        lambda p: {'out': p['a'] | p['b']},
+    'Xor':       lambda p: {'out': p['a'] ^ p['b']},
+    'Mux':       lambda p: {'out': _mux(p['a'], p['b'], p['sel'])},
+    'DMux':      lambda p: {'a': p['in'] & (1 - p['sel']), 'b': p['in'] & p['sel']},
+    'Not16':     lambda p: {'out': ~p['in'] & 0xFFFF},
+    'And16':     lambda p: {'out': p['a'] & p['b']},
+    'Or16':      lambda p: {'out': p['a'] | p['b']},
+    'Mux16':     lambda p: {'out': _mux(p['a'], p['b'], p['sel'])},
+    'Or8Way':    lambda p: {'out': int(p['in'] != 0)},
+    'Mux4Way16': lambda p: {'out': p['abcd'[p['sel']]]},
+    'Mux8Way16': lambda p: {'out': p['abcdefgh'[p['sel']]]},
+    'DMux4Way':  lambda p: {pin: p['in'] * (p['sel'] == i) for i, pin in enumerate('abcd')},
+    'DMux8Way':  lambda p: {pin: p['in'] * (p['sel'] == i) for i, pin in enumerate('abcdefgh')},
+    'HalfAdder': lambda p: {'sum': (p['a'] + p['b']) & 1, 'carry': (p['a'] + p['b']) >> 1},
+    'FullAdder': lambda p: {'sum': (p['a'] + p['b'] + p['c']) & 1, 'carry': (p['a'] + p['b'] + p['c']) >> 1},
+    'Add16':     lambda p: {'out': (p['a'] + p['b']) & 0xFFFF},
+    'Inc16':     lambda p: {'out': (p['in'] + 1) & 0xFFFF},
+    'ALU':       lambda p: _alu(p['x'], p['y'], p['zx'], p['nx'], p['zy'], p['ny'], p['f'], p['no']),
+}
+
+
+# --- Part 2: Lane Packing ---
+# Lane k of a wire's int holds that wire's value in test vector k.
+def pack_lanes(values, width):
+    """Turns one int per test vector into `width` lane ints, one per bit."""
+    lanes = []
+    for bit in range(width):
+        bits = ''.join('1' if (v >> bit) & 1 else '0' for v in reversed(values))
+        lanes.append(int(bits, 2) if bits else 0)
+    return lanes
+
+
+def unpack_lanes(lanes, count):
+    """The inverse of pack_lanes: one int per test vector."""
+    columns = [format(lane, f'0{count}b')[::-1] for lane in lanes]
+    values = []
+    for k in range(count):
+        value = 0
+        for bit, column in enumerate(columns):
+            if column[k] == '1':
+                value |= 1 << bit
+        values.append(value)
+    return values
+
+
+# --- Part 3: Bitsliced Evaluation ---
+class BitslicedEvaluator:
+    """
+    Evaluates a combinational netlist on many input vectors at once: every net
+    holds a Python int whose bit k is the net's value for vector k, so one
+    topological sweep of bitwise Nands covers the whole batch.
+    """
+
+    def __init__(self, netlist):
+        if len(netlist.dff_out) or netlist.blocks:
+            raise ValueError(f"{netlist.name} is not combinational")
+        self.netlist = netlist
+        order = nand_order(netlist)
+        self._gates = [(netlist.nand_a[g], netlist.nand_b[g], netlist.nand_out[g]) for g in order]
+
+    def evaluate(self, lane_inputs, count):
+        """lane_inputs maps each input pin to its lane ints; returns the same for the outputs."""
+        mask = (1 << count) - 1
+        values = [0] * self.netlist.n_nets
+        values[1] = mask
+        for pin, lanes in lane_inputs.items():
+            for net, lane in zip(self.netlist.pins[pin], lanes):
+                values[net] = lane
+        for a, b, out in self._gates:
+            values[out] = mask ^ (values[a] & values[b])
+        return {pin: [values[net] for net in self.netlist.pins[pin]] for pin in self.netlist.outputs}
+
+    def run(self, vectors):
+        """Evaluates a list of {input pin: value} dicts; returns a list of {output pin: value}."""
+        count = len(vectors)
+        lane_inputs = {pin: pack_lanes([v.get(pin, 0) for v in vectors], width)
+                       for pin, width in self.netlist.inputs.items()}
+        lane_outputs = self.evaluate(lane_inputs, count)
+        columns = {pin: unpack_lanes(lanes, count) for pin, lanes in lane_outputs.items()}
+        return [{pin: columns[pin][k] for pin in columns} for k in range(count)]
+
+
+def exhaustive_vectors(inputs):
+    """Every combination of the input pins (only sensible up to ~20 input bits)."""
+    pins = list(inputs)
+    for values in itertools.product(*(range(1 << inputs[pin]) for pin in pins)):
+        yield dict(zip(pins, values))
+
+
+def random_vectors(inputs, count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield {pin: rng.getrandbits(width) for pin, width in inputs.items()}
+
+
+def check_chip(chip, vectors=None, batch=4096, elaborator=None, model=None):
+    """
+    Runs test vectors through the gate-level chip and its golden model and returns
+    (vectors checked, list of (vector, got, expected) mismatches). By default chips
+    with up to 20 input bits are tested exhaustively and wider ones on 65536 random vectors.
+    """
+    netlist = (elaborator or Elaborator()).netlist(chip)
+    model = model or GOLDEN_MODELS[chip]
+    evaluator = BitslicedEvaluator(netlist)
+    if vectors is None:
+        if sum(netlist.inputs.values()) <= 20:
+            vectors = exhaustive_vectors(netlist.inputs)
+        else:
+            vectors = random_vectors(netlist.inputs, 65536)
+
+    checked = 0
+    mismatches = []
+    vectors = iter(vectors)
+    while True:
+        chunk = list(itertools.islice(vectors, batch))
+        if not chunk:
+            break
+        for vector, got in zip(chunk, evaluator.run(chunk)):
+            expected = model(vector)
+            if got != expected:
+                mismatches.append((vector, got, expected))
+        checked += len(chunk)
+    return checked, mismatches
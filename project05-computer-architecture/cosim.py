@@ -0,0 +1,147 @@
+import zlib
+from collections import namedtuple
+
+from hack_emulator import HackEmulator, KBD, SCREEN
+from hdl_parser import parse_hdl
+from hdl_simulator import Elaborator, HDLSimulator, substitution_blocks
+
+# The Computer with the CPU's memory pins brought out so both sides can be compared
+COSIM_HDL = """
+CHIP CoSimComputer {
+    IN reset;
+    OUT pc[15], addressM[15], writeM, outM[16];
+    PARTS:
+    ROM32K(address=pc, out=instruction);
+    CPU(inM=inM, instruction=instruction, reset=reset,
+        outM=outM, writeM=writeM, addressM=addressM, pc=pc);
+    Memory(in=outM, load=writeM, address=addressM, out=inM);
+}
+"""
+
+# What one cycle looks like from outside: the memory pins while the instruction
+# runs, then the registers after the clock. D is None when it isn't observable.
+CycleState = namedtuple('CycleState', 'writeM addressM outM pc A D')
+# cycle is 1-based; fields names what differed (['memory'] if only RAM contents did)
+Divergence = namedtuple('Divergence', 'cycle fields gate emulator')
+CoSimResult = namedtuple('CoSimResult', 'cycles divergence')
+
+
+# --- Part 1: The Gate-Level Side ---
+class GateComputer:
+    """
+    CPU.hdl and Memory.hdl simulated at gate level, with the sub-chips of
+    `level` (see substitution_blocks) swapped for behavioral models. RAM must
+    be behavioral so its contents can be hashed; with the registers behavioral
+    too, A and D are read straight from the ARegister/DRegister blocks.
+    """
+
+    def __init__(self, program, level='registers'):
+        blocks = substitution_blocks(level)
+        if 'RAM16K' not in blocks:
+            raise ValueError("co-simulation needs behavioral RAM16K (level 'memory' or above)")
+        elaborator = Elaborator(blocks=blocks)
+        elaborator.define(parse_hdl(COSIM_HDL))
+        self.sim = HDLSimulator(elaborator.netlist('CoSimComputer'), blocks)
+        rom = self.sim.block('ROM32K')
+        rom.load(program)
+        self.sim.touch(rom)
+        self.ram = self.sim.block('RAM16K')
+        self.screen = self.sim.block('Screen')
+        self.keyboard = self.sim.block('Keyboard')
+        names = {block.chip: block for block in self.sim.blocks}
+        self._a = names.get('ARegister')
+        self._d = names.get('DRegister')
+
+    def poke(self, address, value):
+        """Sets a data memory word before or between cycles."""
+        if address < SCREEN:
+            self.ram.words[address] = value
+            self.sim.touch(self.ram)
+        elif address < KBD:
+            self.screen.words[address - SCREEN] = value
+            self.sim.touch(self.screen)
+        elif address == KBD:
+            self.keyboard.key = value
+            self.sim.touch(self.keyboard)
+
+    def step(self):
+        sim = self.sim
+        sim.eval()  # poke() and loading ROM only schedule their blocks
+        write = sim.get('writeM')
+        pins = (write, sim.get('addressM'), sim.get('outM') if write else 0)
+        sim.clock()
+        if self._a is None:
+            return CycleState(*pins, sim.get('pc'), sim.get('addressM'), None)
+        return CycleState(*pins, sim.get('pc'), self._a.value, self._d.value)
+
+    def memory_hash(self):
+        return zlib.crc32(self.screen.words, zlib.crc32(self.ram.words))
+
+    def registers(self):
+        """(pc, A, D) between cycles."""
+        pc = self.sim.get('pc')
+        if self._a is None:
+            return (pc, self.sim.get('addressM'), None)
+        return (pc, self._a.value, self._d.value)
+
+    @property
+    def observes_registers(self):
+        return self._a is not None
+
+
+# --- Part 2: The Emulator Side ---
+def _emulator_state(emulator, full):
+    if full:
+        return (emulator.PC, emulator.A, emulator.D)
+    return (emulator.PC, emulator.A & 0x7FFF, None)
+
+
+def _emulator_hash(emulator, full):
+    memory = zlib.crc32(memoryview(emulator.ram)[:KBD])
+    return hash((_emulator_state(emulator, full), memory))
+
+
+def _emulator_cycle(emulator, full):
+    pins = emulator.step()
+    return CycleState(*pins, *_emulator_state(emulator, full))
+
+
+# --- Part 3: Lockstep Comparison ---
+def cosimulate(program, cycles, batch=256, level='registers', memory=None):
+    """
+    Runs `program` (ROM words) on the gate-level computer and on HackEmulator.
+    The emulator runs each batch of cycles on its fast path and only the
+    machine state hashes (registers plus all of RAM and the screen) are
+    compared at batch boundaries. On a mismatch the emulator is rewound to the
+    batch's checkpoint and single-stepped against the gate-level trace of that
+    batch to find the first cycle that differs. `memory` maps addresses to
+    initial values on both sides.
+    """
+    gate = GateComputer(program, level)
+    emulator = HackEmulator(program)
+    for address, value in (memory or {}).items():
+        gate.poke(address, value)
+        emulator.ram[address] = value
+    full = gate.observes_registers
+
+    done = 0
+    while done < cycles:
+        n = min(batch, cycles - done)
+        checkpoint = (emulator.A, emulator.D, emulator.PC, emulator.cycles, emulator.ram[:])
+        trace = [gate.step() for _ in range(n)]
+        emulator.run(n)
+        if hash((gate.registers(), gate.memory_hash())) != _emulator_hash(emulator, full):
+            emulator.A, emulator.D, emulator.PC, emulator.cycles, emulator.ram = checkpoint
+            return CoSimResult(done + n, _first_divergence(trace, emulator, full, done))
+        done += n
+    return CoSimResult(done, None)
+
+
+def _first_divergence(trace, emulator, full, start):
+    for k, gate_state in enumerate(trace):
+        emulator_state = _emulator_cycle(emulator, full)
+        if gate_state != emulator_state:
+            fields = [f for f, g, e in zip(CycleState._fields, gate_state, emulator_state) if g != e]
+            return Divergence(start + k + 1, fields, gate_state, emulator_state)
+    # registers and pins agreed every cycle, so the memories themselves differ
+    return Divergence(start + len(trace), ['memory'], trace[-1], _emulator_state(emulator, full))
@@ -0,0 +1,135 @@
+from collections import namedtuple
+
+from hack_emulator import TRAP, Trap
+
+# Why a run stopped: 'breakpoint', 'watchpoint', 'step' or 'limit'. For a watchpoint,
+# detail is (RAM address, old value, new value); address is the PC.
+StopEvent = namedtuple('StopEvent', 'reason address cycles detail')
+
+
+class Debugger:
+    """
+    Breakpoints, watchpoints and stepping on a HackEmulator. Nothing is checked
+    per cycle: a breakpoint replaces the decoded op at its ROM address with
+    TRAP, and watchpoints trap every instruction that writes M, so unpatched
+    code runs through HackEmulator.run() at full speed. `symbols` is the
+    assembler's symbol table (after the second pass, so statics like
+    'StaticTest.3' are in it) and lets labels and variables be used by name.
+    Patches are lost if the emulator's program is reloaded.
+    """
+
+    def __init__(self, emulator, symbols=None):
+        self.emulator = emulator
+        self.symbols = symbols or {}
+        self.breakpoints = set()
+        self.watchpoints = set()
+        self._original = {}   # patched ROM address -> decoded op
+        self._writers = {pc for pc, op in enumerate(emulator._code) if op.comp is not None and op.dest & 1}
+
+    def address_of(self, where):
+        """A ROM/RAM address from an int or a symbol ('LOOP', 'SP', 'StaticTest.3')."""
+        if isinstance(where, int):
+            return where
+        if where not in self.symbols:
+            raise KeyError(f"Unknown symbol '{where}'")
+        return self.symbols[where]
+
+    # --- patching ---
+
+    def _patch(self, pc):
+        if pc not in self._original:
+            self._original[pc] = self.emulator._code[pc]
+            self.emulator._code[pc] = TRAP
+
+    def _unpatch(self, pc):
+        if pc in self._original and pc not in self.breakpoints and not (self.watchpoints and pc in self._writers):
+            self.emulator._code[pc] = self._original.pop(pc)
+
+    def add_breakpoint(self, where):
+        pc = self.address_of(where)
+        self.breakpoints.add(pc)
+        self._patch(pc)
+        return pc
+
+    def remove_breakpoint(self, where):
+        pc = self.address_of(where)
+        self.breakpoints.discard(pc)
+        self._unpatch(pc)
+
+    def watch(self, where):
+        """Stops after any instruction that writes RAM[where]."""
+        if not self.watchpoints:
+            for pc in self._writers:
+                self._patch(pc)
+        address = self.address_of(where)
+        self.watchpoints.add(address)
+        return address
+
+    def unwatch(self, where):
+        self.watchpoints.discard(self.address_of(where))
+        if not self.watchpoints:
+            for pc in self._writers:
+                self._unpatch(pc)
+
+    # --- execution ---
+
+    def _execute_original(self):
+        """Runs the real instruction under the trap at PC; returns a StopEvent if it hit a watchpoint."""
+        emulator = self.emulator
+        pc = emulator.PC
+        emulator._code[pc] = self._original[pc]
+        try:
+            address = emulator.A & 0x7FFF
+            old = emulator.ram[address]
+            writes = emulator.step()[0]
+        finally:
+            emulator._code[pc] = TRAP
+        if writes and address in self.watchpoints:
+            return StopEvent('watchpoint', pc, emulator.cycles, (address, old, emulator.ram[address]))
+        return None
+
+    def step(self, count=1):
+        """Executes `count` instructions, ignoring breakpoints but not watchpoints."""
+        emulator = self.emulator
+        for _ in range(count):
+            if emulator.PC in self._original:
+                event = self._execute_original()
+                if event:
+                    return event
+            else:
+                emulator.step()
+        return StopEvent('step', emulator.PC, emulator.cycles, None)
+
+    def run(self, max_cycles):
+        """
+        Runs until a breakpoint, a watched write or max_cycles. Starting on a
+        breakpoint executes it first, so repeated run() calls make progress.
+        """
+        emulator = self.emulator
+        end = emulator.cycles + max_cycles
+        if emulator.PC in self._original and emulator.cycles < end:
+            event = self._execute_original()
+            if event:
+                return event
+        while emulator.cycles < end:
+            try:
+                emulator.run(end - emulator.cycles)
+            except Trap:
+                pc = emulator.PC
+                if pc in self.breakpoints:
+                    return StopEvent('breakpoint', pc, emulator.cycles, None)
+                event = self._execute_original()
+                if event:
+                    return event
+        return StopEvent('limit', emulator.PC, emulator.cycles, None)
+
+    def run_until(self, where, max_cycles):
+        """Runs until PC reaches `where` (address or label), with a temporary breakpoint."""
+        pc = self.address_of(where)
+        temporary = pc not in self.breakpoints
+        self.add_breakpoint(pc)
+        try:
+            return self.run(max_cycles)
+        finally:
+            if temporary:
+                self.remove_breakpoint(pc)
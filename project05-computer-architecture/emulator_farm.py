@@ -0,0 +1,129 @@
+import multiprocessing
+from array import array
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+from hack_emulator import RAM_WORDS, TRAP, HackEmulator, Trap
+
+# --- Part 1: Jobs and Results ---
+# program: a name given to EmulatorFarm; setup: address -> initial value;
+# checks: address -> expected value once the run stops
+Job = namedtuple('Job', 'program setup checks max_cycles', defaults=({}, {}, 1_000_000))
+# cycles: instructions run before the program reached its halt loop (or
+# max_cycles); values: the checked addresses; failures: (address, expected, got)
+RunResult = namedtuple('RunResult', 'program cycles halted values failures')
+
+
+def halt_loops(rom):
+    """ROM addresses of `(X) @X 0;JMP` loops, where a program parks itself when done."""
+    return [k for k in range(len(rom) - 1)
+            if rom[k] == k and rom[k + 1] & 0xE007 == 0xE007 and not rom[k + 1] & 0x0038]
+
+
+def prepare(emulator, rom):
+    """Loads `rom` and puts TRAP on its halt loops, so a run stops on the exact cycle it halts."""
+    emulator.load(rom)
+    for address in halt_loops(rom):
+        emulator._code[address] = TRAP
+    return emulator
+
+
+_ZERO_RAM = array('H', bytes(2 * RAM_WORDS))
+
+
+def run_job(emulator, job):
+    """One job on an emulator from prepare(); RAM and registers are cleared first."""
+    emulator.ram[:] = _ZERO_RAM
+    emulator.A = emulator.D = 0
+    emulator.reset()
+    for address, value in job.setup.items():
+        emulator.ram[address] = value
+    try:
+        emulator.run(job.max_cycles)
+        halted = False
+    except Trap:
+        halted = True
+    values = {address: emulator.ram[address] for address in job.checks}
+    failures = [(address, expected, values[address]) for address, expected in job.checks.items()
+                if values[address] != expected & 0xFFFF]
+    return RunResult(job.program, emulator.cycles, halted, values, failures)
+
+
+# --- Part 2: Workers ---
+# Every ROM image sits once in a shared memory block; a worker attaches to it
+# and decodes a program the first time one of its jobs needs it, so a job
+# crosses the process boundary as a name and a few RAM words. Workers share
+# their parent's resource tracker, so attaching doesn't make them owners.
+_worker = {}
+
+
+def _emulator(emulators, words, index, program):
+    if program not in emulators:
+        offset, length = index[program]
+        emulators[program] = prepare(HackEmulator(), words[offset:offset + length])
+    return emulators[program]
+
+
+def _init_worker(name, index):
+    block = shared_memory.SharedMemory(name)
+    _worker.update(block=block, words=block.buf.cast('H'), index=index, emulators={})
+
+
+def _run_in_worker(job):
+    return run_job(_emulator(_worker['emulators'], _worker['words'], _worker['index'], job.program), job)
+
+
+# --- Part 3: The Farm ---
+class EmulatorFarm:
+    """
+    Runs many jobs over a fixed set of programs (name -> ROM words) on a
+    process pool. The ROM images are copied once into shared memory when the
+    farm starts; workers=0 runs the jobs in this process instead, on the same
+    code path. Use as a context manager, or close() to free the pool and the
+    shared block.
+    """
+
+    def __init__(self, programs, workers=None):
+        self.index, offset = {}, 0
+        for name, rom in programs.items():
+            self.index[name] = (offset, len(rom))
+            offset += len(rom)
+        self.block = shared_memory.SharedMemory(create=True, size=max(2 * offset, 2))
+        words = self.block.buf.cast('H')
+        for name, rom in programs.items():
+            start, length = self.index[name]
+            words[start:start + length] = array('H', rom)
+        words.release()
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self.pool = None
+        self._emulators = {}  # for workers=0
+        if self.workers:
+            self.pool = multiprocessing.Pool(self.workers, _init_worker, (self.block.name, self.index))
+
+    def run(self, jobs, chunksize=8):
+        """RunResults in the order of `jobs`."""
+        for job in jobs:
+            if job.program not in self.index:
+                raise ValueError(f"no program named {job.program}")
+        if self.pool is not None:
+            return self.pool.map(_run_in_worker, jobs, chunksize)
+        words = self.block.buf.cast('H')
+        try:
+            return [run_job(_emulator(self._emulators, words, self.index, job.program), job) for job in jobs]
+        finally:
+            words.release()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self._emulators = {}
+        self.block.close()
+        self.block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
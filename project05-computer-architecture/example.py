@@ -0,0 +1,772 @@
+"""
+tests for the hdl simulator (hdl_parser, hdl_simulator, bitslice, netlist_compiler),
+hack_emulator.py, framebuffer.py, keyboard_replay.py, profiler.py, debugger.py, intrinsic_traps.py,
+snapshot.py, emulator_farm.py and cosim.py
+run: python3 example.py
+"""
+
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+
+from hdl_parser import parse_hdl, find_hdl_files
+from hdl_simulator import Elaborator, HDLSimulator, substitution_blocks
+from bitslice import GOLDEN_MODELS, check_chip, pack_lanes, unpack_lanes, random_vectors
+from netlist_compiler import CompiledChip, InterpretedChip, compile_chip, generate_source
+import hack_emulator
+from hack_emulator import HackEmulator, KBD, SCREEN
+from cosim import GateComputer, cosimulate
+from framebuffer import FrameDumper, to_pbm, to_png, to_ppm
+from keyboard_replay import (KeyEvent, KeyRecorder, benchmark_replay, load_trace, replay,
+                             save_trace, stop_at_cycle, stop_on_ram, stop_when_halted)
+
+from profiler import asm_origins, profile_program
+from debugger import Debugger
+from intrinsic_traps import IntrinsicTraps
+from snapshot import load_snapshot, restore, save_snapshot, shared_pages, snapshot
+from emulator_farm import EmulatorFarm, Job, halt_loops
+from multiprocessing import shared_memory
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'project06-assembler'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'project07-vm-stack-arithmetic'))
+from HackAssembler import first_pass_for_labels, second_pass_for_translation
+from sourcemap import SourceMap
+from vm_translator import parse_vm_file
+from os_intrinsics import Intrinsics
+
+PROJECT04 = os.path.join(os.path.dirname(__file__), '..', 'project04-machine-language')
+PROJECT06 = os.path.join(os.path.dirname(__file__), '..', 'project06-assembler')
+PROJECT07 = os.path.join(os.path.dirname(__file__), '..', 'project07-vm-stack-arithmetic')
+
+PASS = 0
+FAIL = 0
+
+def check(name, got, expected):
+    global PASS, FAIL
+    if got == expected:
+        PASS += 1
+    else:
+        FAIL += 1
+        print(f"    FAIL {name}: got {got!r}, expected {expected!r}")
+
+
+ELABORATOR = Elaborator()
+
+def simulator(chip):
+    return HDLSimulator(ELABORATOR.netlist(chip))
+
+
+def assemble(filename, directory=PROJECT04):
+    with open(os.path.join(directory, filename)) as f:
+        return assemble_lines(f.read().splitlines())
+
+
+def assemble_lines(lines):
+    instructions, table = first_pass_for_labels(lines)
+    return [int(word, 2) for word in second_pass_for_translation(instructions, table)]
+
+
+# -- golden models --
+
+def alu_model(x, y, zx, nx, zy, ny, f, no):
+    if zx: x = 0
+    if nx: x = ~x & 0xFFFF
+    if zy: y = 0
+    if ny: y = ~y & 0xFFFF
+    out = (x + y) & 0xFFFF if f else x & y
+    if no: out = ~out & 0xFFFF
+    return out, int(out == 0), out >> 15
+
+
+# -- parser --
+
+def test_parse_hdl():
+    print("  parse_hdl")
+    chip = parse_hdl("""
+    // comment
+    CHIP Foo {
+        IN a[16], b, /* inline */ sel;
+        OUT out[16], flag;
+        PARTS:
+        Mux16(a=a, b[0..7]=false, b[8]=b, sel=sel, out=out, out[15]=flag);
+    }""")
+    check("name", chip.name, 'Foo')
+    check("inputs", chip.inputs, {'a': 16, 'b': 1, 'sel': 1})
+    check("outputs", chip.outputs, {'out': 16, 'flag': 1})
+    check("one part", len(chip.parts), 1)
+    conns = chip.parts[0].connections
+    check("bus range", (conns[1].pin, conns[1].pin_range, conns[1].signal), ('b', (0, 7), 'false'))
+    check("single bit", conns[2].pin_range, (8, 8))
+    check("second output", (conns[5].pin, conns[5].pin_range, conns[5].signal), ('out', (15, 15), 'flag'))
+
+
+def test_find_hdl_files():
+    print("  find_hdl_files")
+    files = find_hdl_files()
+    for chip in ['Not', 'Mux16', 'ALU', 'RAM16K', 'CPU', 'Computer']:
+        check(f"found {chip}", chip in files, True)
+
+
+# -- combinational chips --
+
+def test_truth_tables():
+    print("  1-bit gates, exhaustive")
+    models = {
+        'Not':  (['in'], lambda i: {'out': 1 - i}),
+        'And':  (['a', 'b'], lambda a, b: {'out': a & b}),
+        'Or':   (['a', 'b'], lambda a, b: {'out': a | b}),
+        'Xor':  (['a', 'b'], lambda a, b: {'out': a ^ b}),
+        'Mux':  (['a', 'b', 'sel'], lambda a, b, s: {'out': b if s else a}),
+        'DMux': (['in', 'sel'], lambda i, s: {'a': i & (1 - s), 'b': i & s}),
+        'FullAdder': (['a', 'b', 'c'], lambda a, b, c: {'sum': (a + b + c) & 1, 'carry': (a + b + c) >> 1}),
+    }
+    for chip, (pins, model) in models.items():
+        sim = simulator(chip)
+        bad = 0
+        for bits in itertools.product((0, 1), repeat=len(pins)):
+            for pin, bit in zip(pins, bits):
+                sim.set(pin, bit)
+            sim.eval()
+            expected = model(*bits)
+            if {pin: sim.get(pin) for pin in expected} != expected:
+                bad += 1
+        check(f"{chip} truth table", bad, 0)
+
+
+def test_add16_and_alu():
+    print("  Add16 + ALU vs python models")
+    rng = random.Random(7)
+    sim = simulator('Add16')
+    bad = 0
+    for _ in range(200):
+        a, b = rng.randrange(65536), rng.randrange(65536)
+        sim.set('a', a)
+        sim.set('b', b)
+        sim.eval()
+        bad += sim.get('out') != (a + b) & 0xFFFF
+    check("Add16", bad, 0)
+
+    sim = simulator('ALU')
+    bad = 0
+    for _ in range(300):
+        x, y = rng.randrange(65536), rng.randrange(65536)
+        control = [rng.randrange(2) for _ in range(6)]
+        sim.set('x', x)
+        sim.set('y', y)
+        for pin, bit in zip(['zx', 'nx', 'zy', 'ny', 'f', 'no'], control):
+            sim.set(pin, bit)
+        sim.eval()
+        bad += (sim.get('out'), sim.get('zr'), sim.get('ng')) != alu_model(x, y, *control)
+    check("ALU", bad, 0)
+
+
+def test_lane_packing():
+    print("  pack/unpack lanes")
+    values = [0, 1, 0xFFFF, 0x8001, 1234]
+    lanes = pack_lanes(values, 16)
+    check("bit 0 lane", lanes[0], 0b01110)  # lane k = bit 0 of values[k]
+    check("roundtrip", unpack_lanes(lanes, len(values)), values)
+
+
+def test_bitsliced_golden_models():
+    print("  bitsliced sweep vs golden models")
+    for chip in GOLDEN_MODELS:
+        netlist = ELABORATOR.netlist(chip)
+        vectors = None if sum(netlist.inputs.values()) <= 12 else random_vectors(netlist.inputs, 2000, seed=3)
+        checked, mismatches = check_chip(chip, vectors, batch=1024, elaborator=ELABORATOR)
+        check(f"{chip} ({checked} vectors)", mismatches[:1], [])
+
+
+def test_compiled_netlists():
+    print("  compiled netlists vs golden models, disk cache")
+    cache_dir = tempfile.mkdtemp()
+    for chip in ['Xor', 'Mux16', 'DMux8Way', 'Add16', 'ALU']:
+        compiled = compile_chip(chip, ELABORATOR, cache_dir)
+        vectors = list(random_vectors(compiled.netlist.inputs, 500, seed=5))
+        bad = sum(compiled(v) != GOLDEN_MODELS[chip](v) for v in vectors)
+        check(f"{chip} compiled", (type(compiled).__name__, bad), ('CompiledChip', 0))
+    check("fresh compile not from cache", compile_chip('Not', ELABORATOR, cache_dir).from_cache, False)
+    check("second load from cache", compile_chip('ALU', ELABORATOR, cache_dir).from_cache, True)
+    check("positional fast path", compile_chip('Add16', ELABORATOR, cache_dir).function(40000, 30000),
+          ((40000 + 30000) & 0xFFFF,))
+    check("Not is one expression", 'n3 = n2 ^ 1' in generate_source(ELABORATOR.netlist('Not')), True)
+
+    # chips defined in code have no file to hash: the key is their definition
+    elaborator = Elaborator()
+    elaborator.define(parse_hdl("CHIP X { IN a, b; OUT out; PARTS: Nand(a=a, b=b, out=out); }"))
+    check("defined X is Nand", compile_chip('X', elaborator, cache_dir)({'a': 1, 'b': 1}), {'out': 0})
+    elaborator.define(parse_hdl("CHIP X { IN a, b; OUT out; PARTS: Nand(a=a, b=b, out=t); Nand(a=t, b=t, out=out); }"))
+    redefined = compile_chip('X', elaborator, cache_dir)
+    check("redefined X isn't the cached Nand", (redefined.from_cache, redefined.function(1, 1)), (False, (1,)))
+
+    register = compile_chip('Register', ELABORATOR, cache_dir)
+    check("Register is compiled", isinstance(register, CompiledChip), True)
+    check("not stored before the clock", register({'in': 5, 'load': 1}), {'out': 0})
+    register.clock()
+    check("stored by the clock", register({'in': 9, 'load': 0}), {'out': 5})
+    blocks = substitution_blocks(['Register'])
+    check("behavioral blocks fall back to the interpreter",
+          isinstance(compile_chip('Register', Elaborator(blocks=blocks), cache_dir), InterpretedChip), True)
+
+    # the CPU's cone compiled around its DFFs agrees with the event-driven simulator cycle by cycle
+    cpu = compile_chip('CPU', ELABORATOR, cache_dir)
+    sim = simulator('CPU')
+    rng = random.Random(7)
+    bad = 0
+    for cycle in range(300):
+        inputs = {'instruction': rng.getrandbits(16), 'inM': rng.getrandbits(16), 'reset': int(cycle % 97 == 0)}
+        for pin, value in inputs.items():
+            sim.set(pin, value)
+        sim.eval()
+        bad += cpu(inputs) != {pin: sim.get(pin) for pin in sim.netlist.outputs}
+        cpu.clock()
+        sim.clock()
+    check("CPU compiled, 300 random cycles", (type(cpu).__name__, bad), ('CompiledChip', 0))
+
+    # a RAM's state is thousands of DFFs wide: packed and unpacked without deep expressions
+    ram = compile_chip('RAM512', ELABORATOR, None)
+    ram({'in': 1234, 'load': 1, 'address': 300})
+    ram.clock()
+    ram({'in': 77, 'load': 1, 'address': 511})
+    ram.clock()
+    check("RAM512 compiled and stepped", (type(ram).__name__, len(ram.netlist.dff_out),
+                                          ram({'address': 300}), ram({'address': 511}), ram({'address': 299})),
+          ('CompiledChip', 8192, {'out': 1234}, {'out': 77}, {'out': 0}))
+
+
+# -- sequential chips --
+
+def test_register_and_pc():
+    print("  Register + PC")
+    sim = simulator('Register')
+    sim.set('in', 1234)
+    sim.set('load', 1)
+    sim.eval()
+    check("not stored before clock", sim.get('out'), 0)
+    sim.clock()
+    check("stored after clock", sim.get('out'), 1234)
+    sim.set('in', 99)
+    sim.set('load', 0)
+    sim.clock()
+    check("held without load", sim.get('out'), 1234)
+
+    sim = simulator('PC')
+    sim.set('inc', 1)
+    for _ in range(5):
+        sim.clock()
+    check("inc 5 times", sim.get('out'), 5)
+    sim.set('in', 1000)
+    sim.set('load', 1)
+    sim.clock()
+    check("load", sim.get('out'), 1000)
+    sim.set('reset', 1)
+    sim.clock()
+    check("reset", sim.get('out'), 0)
+
+
+def test_ram64():
+    print("  RAM64 write/read")
+    sim = simulator('RAM64')
+    written = {3: 111, 17: 222, 63: 333}
+    for address, value in written.items():
+        sim.set('address', address)
+        sim.set('in', value)
+        sim.set('load', 1)
+        sim.clock()
+    sim.set('load', 0)
+    for address in range(64):
+        sim.set('address', address)
+        sim.eval()
+        if sim.get('out') != written.get(address, 0):
+            check(f"RAM64[{address}]", sim.get('out'), written.get(address, 0))
+            break
+    else:
+        check("RAM64 contents", True, True)
+
+
+def test_cpu():
+    print("  CPU: @5, D=A, M=D, 0;JMP")
+    sim = simulator('CPU')
+    sim.set('instruction', 5)          # @5
+    sim.clock()
+    check("addressM after @5", sim.get('addressM'), 5)
+    check("pc after @5", sim.get('pc'), 1)
+    sim.set('instruction', 0xEC10)     # D=A
+    sim.clock()
+    sim.set('instruction', 0xE308)     # M=D
+    sim.eval()
+    check("writeM", sim.get('writeM'), 1)
+    check("outM", sim.get('outM'), 5)
+    sim.clock()
+    sim.set('instruction', 0xEA87)     # 0;JMP
+    sim.clock()
+    check("jumped to A", sim.get('pc'), 5)
+
+
+def test_event_driven():
+    print("  only downstream gates re-evaluate")
+    sim = simulator('RAM64')
+    sim.set('address', 9)
+    sim.eval()
+    sim.set('address', 9)   # no change: nothing should be scheduled
+    check("nothing scheduled", sum(len(b) for b in sim._buckets[1:sim._dff_level]), 0)
+    sim.set('in', 1)        # only the readers of in[0] are scheduled
+    scheduled = sum(len(b) for b in sim._buckets[1:sim._dff_level])
+    in0 = sim.netlist.pins['in'][0]
+    check("readers of in[0]", scheduled, sim._fanout_start[in0 + 1] - sim._fanout_start[in0])
+
+
+def test_behavioral_substitution():
+    print("  Mult.asm on Computer with behavioral sub-chips")
+    program = assemble('Mult.asm')
+    for level in ['memory', 'datapath']:
+        blocks = substitution_blocks(level)
+        sim = HDLSimulator(Elaborator(blocks=blocks).netlist('Computer'), blocks)
+        rom = sim.block('ROM32K')
+        rom.load(program)
+        sim.touch(rom)
+        ram = sim.block('RAM16K')
+        ram.words[0], ram.words[1] = 7, 6
+        sim.set('reset', 1)
+        sim.clock()
+        sim.set('reset', 0)
+        for _ in range(200):
+            sim.clock()
+        check(f"R2 = 7 * 6 at level {level}", ram.words[2], 42)
+    check("CPU wiring stays gates", len(sim.netlist.nand_out) > 0, True)
+    check("ALU swapped out", any(name == 'ALU' for name, _ in sim.netlist.blocks), True)
+
+    blocks = substitution_blocks(['PC'])
+    sim = HDLSimulator(Elaborator(blocks=blocks).netlist('PC'), blocks)
+    sim.set('inc', 1)
+    for _ in range(3):
+        sim.clock()
+    check("behavioral PC", (sim.get('out'), sim.block('PC').value), (3, 3))
+
+
+# -- emulator + co-simulation --
+
+def test_emulator():
+    print("  HackEmulator: Mult.asm, step() == run()")
+    emulator = HackEmulator(assemble('Mult.asm'))
+    emulator.ram[0], emulator.ram[1] = 123, 45
+    emulator.run(2000)
+    check("R2 = 123 * 45", emulator.ram[2], 123 * 45)
+
+    stepped, ran = HackEmulator(assemble('Fill.asm')), HackEmulator(assemble('Fill.asm'))
+    stepped.ram[KBD] = ran.ram[KBD] = 1
+    for _ in range(500):
+        stepped.step()
+    ran.run(500)
+    check("same registers", stepped.state(), ran.state())
+    check("same memory", stepped.ram == ran.ram, True)
+    check("Fill blackened the screen", ran.ram[SCREEN], 0xFFFF)
+
+
+def test_framebuffer():
+    print("  screen view + PBM/PPM/PNG frames")
+    emulator = HackEmulator()
+    emulator.ram[SCREEN] = 0x0001               # pixel (0, 0)
+    emulator.ram[SCREEN + 32 + 1] = 0x8000      # pixel (1, 31)
+    view = emulator.screen
+    check("pixel (0, 0)", view[0, 0], 1)
+    check("pixel (1, 31)", (view[1, 30], view[1, 31], view[1, 32]), (0, 1, 0))
+    emulator.ram[SCREEN + 5] = 0xFFFF
+    check("view is not a copy", sum(view.row(0)), 17)
+
+    pbm = to_pbm(view)
+    header = b'P4\n512 256\n'
+    check("pbm leftmost pixel in msb", (pbm[:len(header)], pbm[len(header)]), (header, 0x80))
+    ppm = to_ppm(view)
+    check("ppm first pixels black, white", ppm[15:21], b'\x00\x00\x00\xff\xff\xff')
+    png = to_png(view)
+    idat = png.index(b'IDAT')
+    length = int.from_bytes(png[idat - 4:idat], 'big')
+    rows = zlib.decompress(png[idat + 4:idat + 4 + length])
+    check("png row 0: filter byte, then inverted bits", rows[:2], b'\x00\x7f')
+
+    emulator = HackEmulator(assemble('Fill.asm'))
+    emulator.ram[KBD] = 1
+    frames = FrameDumper(tempfile.mkdtemp(), interval=40000, fmt='pbm')
+    emulator.run(200000, frames)
+    check("one frame per interval", len(frames.paths), 5)
+    with open(frames.paths[-1], 'rb') as f:
+        check("last frame all black", f.read()[len(header):] == b'\xff' * (512 * 256 // 8), True)
+
+
+def test_keyboard_replay():
+    print("  key traces: record, save/load, replay, stop conditions")
+    emulator = HackEmulator(assemble('Mult.asm'))
+    emulator.ram[0], emulator.ram[1] = 3, 4
+    result = replay(emulator, [], [stop_when_halted(), stop_at_cycle(10000)], check_every=10)
+    check("Mult stops when halted", (result.reason, emulator.ram[2]), ('halted', 12))
+
+    # record a live session: hold a key for a while, then let go
+    live = HackEmulator(assemble('Fill.asm'))
+    recorder = KeyRecorder(live)
+    live.run(1000)
+    recorder.press(ord('a'))
+    live.run(149000)
+    recorder.release()
+    live.run(150000)
+    path = os.path.join(tempfile.mkdtemp(), 'fill.keys')
+    recorder.save(path)
+    check("6 bytes an event", os.path.getsize(path), 5 + 6 * 2)
+    events = load_trace(path)
+    check("trace roundtrip", events, [KeyEvent(1000, ord('a')), KeyEvent(150000, 0)])
+
+    # replaying the trace reproduces the live run exactly
+    emulator = HackEmulator(assemble('Fill.asm'))
+    result = replay(emulator, events, [stop_at_cycle(300000)])
+    check("replay matches live run", (result.events_fed, emulator.state(), emulator.ram == live.ram),
+          (2, live.state(), True))
+
+    blackened = stop_on_ram(SCREEN + 8191, 0xFFFF)
+    cleared = lambda e: 'cleared' if e.cycles > 150000 and e.ram[SCREEN + 1] == 0 else None
+    result = replay(HackEmulator(assemble('Fill.asm')), events, [blackened, stop_at_cycle(10 ** 6)])
+    check("stops once the screen is black", (result.reason, result.events_fed), ('RAM[24575] == 65535', 1))
+    best = benchmark_replay(lambda: HackEmulator(assemble('Fill.asm')), events, [cleared, stop_at_cycle(10 ** 6)])
+    check("benchmark is repeatable", best.reason, 'cleared')
+
+    # a press and a release on the same cycle keep their order: the key ends up released
+    tap = [KeyEvent(5, ord('a')), KeyEvent(5, 0)]
+    save_trace(path, tap)
+    check("same-cycle events saved in order", load_trace(path), tap)
+    emulator = HackEmulator(assemble('Fill.asm'))
+    replay(emulator, tap, [stop_at_cycle(100)], check_every=10)
+    check("tap leaves the key released", emulator.ram[KBD], 0)
+
+
+def test_profiler():
+    print("  profiler: counters, labels, VM functions and lines")
+    emulator = HackEmulator(assemble('Mult.asm'))
+    emulator.run(100)
+    check("no counters unless enabled", emulator.counters, None)
+
+    with open(os.path.join(PROJECT06, 'Pong.asm')) as f:
+        pong = f.read().splitlines()
+    check("one origin per ROM word", len(asm_origins(pong)), len(assemble_lines(pong)))
+    emulator = HackEmulator(assemble_lines(pong))
+    profile = profile_program(emulator, pong, 50000)
+    check("every cycle counted", profile.total, 50000)
+    check("profiling switched back off", emulator.counters, None)
+    functions = dict(profile.by_vm_function())
+    check("Pong boots through Sys.init", functions.get('sys.init', 0) > 0, True)
+    check("labels add up", sum(n for _, n in profile.by_label()), 50000)
+
+    asm_path = os.path.join(tempfile.mkdtemp(), 'StackTest.asm')
+    vm_path = os.path.join(PROJECT07, 'StackTest.vm')
+    parse_vm_file(vm_path, asm_path)
+    with open(asm_path) as f:
+        lines = f.read().splitlines()
+    emulator = HackEmulator(assemble_lines(lines))
+    emulator.ram[0] = 256
+    profile = profile_program(emulator, lines, 1000, vm_path)
+    by_line = dict(profile.by_vm_line())
+    check("push constant 17 on line 8 takes 7 instructions", by_line.get('StackTest.vm:8 push constant 17'), 7)
+    check("report mentions VM lines", 'hottest by VM line' in profile.report(3), True)
+
+    # the same attribution from binary source maps instead of comments
+    asm_map, rom_map = SourceMap(), SourceMap()
+    parse_vm_file(vm_path, asm_path, asm_map)
+    with open(asm_path) as f:
+        first_pass_for_labels(f.read().splitlines(), rom_map, rom_map.file_id('StackTest.asm'))
+    by_source = dict(profile.by_source(rom_map.compose(asm_map)))
+    check("source map agrees", by_source.get('StackTest.vm:8'), 7)
+
+    # a data block stands for a whole run of array stores; what follows keeps its own lines
+    stores = []
+    for index in range(10):
+        stores += [f'push constant {index}', 'push static 0', 'add', f'push constant {index + 1}',
+                   'pop temp 0', 'pop pointer 1', 'push temp 0', 'pop that 0']
+    comments, mapped = vm_line_profiles(stores + ['push constant 7', 'pop temp 1', 'label HALT', 'goto HALT'],
+                                        {0: 256, 16: 3000})
+    check("data run credited to its first line", 'Data.vm:1 push constant 0' in comments, True)
+    check("line after the run", comments.get('Data.vm:81 push constant 7'), 7)
+    check("comments agree with the source map", {name.split()[0]: n for name, n in comments.items()}, mapped)
+
+    # a tail call's block covers the call and the return after it
+    tail = ['push constant 5', 'call T.f 1', 'pop temp 1', 'label HALT', 'goto HALT',
+            'function T.f 0', 'push argument 0', 'call T.g 1', 'return',
+            'function T.g 0', 'push argument 0', 'push constant 1', 'add', 'return']
+    comments, mapped = vm_line_profiles(tail, {0: 256})
+    check("tail call credited to the call", comments.get('Data.vm:8 call T.g 1'), 12)
+    check("callee's lines after a tail call", (comments.get('Data.vm:11 push argument 0'),
+                                               comments.get('Data.vm:13 add')), (10, 5))
+    check("tail-call comments agree with the source map", {name.split()[0]: n for name, n in comments.items()}, mapped)
+
+
+def vm_line_profiles(vm_lines, setup, cycles=2000):
+    """
+    Profiles vm_lines (as Data.vm) by VM line from the .asm comments and from
+    the source map. They should end in a loop of their own: the translator's
+    end loop has no VM line in the comments but counts for the last one in the map.
+    """
+    directory = tempfile.mkdtemp()
+    vm_path, asm_path = os.path.join(directory, 'Data.vm'), os.path.join(directory, 'Data.asm')
+    with open(vm_path, 'w') as f:
+        f.write('\n'.join(vm_lines) + '\n')
+    asm_map, rom_map = SourceMap(), SourceMap()
+    parse_vm_file(vm_path, asm_path, asm_map)
+    with open(asm_path) as f:
+        lines = f.read().splitlines()
+    first_pass_for_labels(lines, rom_map, rom_map.file_id('Data.asm'))
+    emulator = HackEmulator(assemble_lines(lines))
+    for address, value in setup.items():
+        emulator.ram[address] = value
+    profile = profile_program(emulator, lines, cycles, vm_path)
+    comments = {name: n for name, n in profile.by_vm_line() if name}
+    mapped = {name: n for name, n in profile.by_source(rom_map.compose(asm_map)) if name}
+    return comments, mapped
+
+
+def test_debugger():
+    print("  debugger: breakpoints, watchpoints, step, run-until")
+    asm_path = os.path.join(tempfile.mkdtemp(), 'StaticTest.asm')
+    parse_vm_file(os.path.join(PROJECT07, 'StaticTest.vm'), asm_path)
+    with open(asm_path) as f:
+        instructions, symbols = first_pass_for_labels(f.read().splitlines())
+    program = [int(word, 2) for word in second_pass_for_translation(instructions, symbols)]
+    emulator = HackEmulator(program)
+    emulator.ram[0] = 256
+    debugger = Debugger(emulator, symbols)
+
+    debugger.watch('StaticTest.3')
+    event = debugger.run(10000)
+    check("pop static 3 hits the watchpoint", (event.reason, event.detail),
+          ('watchpoint', (symbols['StaticTest.3'], 0, 333)))
+    debugger.unwatch('StaticTest.3')
+    check("unwatch removes every trap", any(op.comp is not None and op.comp.__name__ == '_trap'
+                                            for op in emulator._code), False)
+
+    debugger.watch('SP')
+    event = debugger.step(100)
+    check("step stops on the SP write", (event.reason, event.detail[0]), ('watchpoint', 0))
+    debugger.unwatch('SP')
+    check("plain steps", debugger.step(3).cycles, event.cycles + 3)
+
+    event = debugger.run_until('END', 10000)
+    check("run until END", (event.reason, event.address), ('breakpoint', symbols['END']))
+    check("(333 - 111) + 888 on the stack", emulator.ram[256], 1110)
+    check("temporary breakpoint removed", debugger.breakpoints, set())
+
+    pc = debugger.add_breakpoint('END')
+    first = debugger.run(100)
+    second = debugger.run(100)
+    check("resuming leaves the breakpoint and comes back", (first.address, second.address), (pc, pc))
+    check("the END loop is 2 instructions", second.cycles - first.cycles, 2)
+
+
+def call_compiled(emulator, debugger, function, args):
+    """Calls a function of the loaded program the way `call` would, returning to ROM 0."""
+    ram = emulator.ram
+    ram[300:300 + len(args)] = array('H', args)
+    frame = 300 + len(args)
+    ram[frame:frame + 5] = array('H', [0, 0, 0, 0, 0])
+    ram[0] = ram[1] = frame + 5
+    ram[2] = 300
+    emulator.PC = debugger.address_of(function)
+    debugger.run_until(0, 100000)
+    return ram[300], ram[0]
+
+
+def test_intrinsic_traps():
+    print("  native OS calls in the emulator")
+    with open(os.path.join(PROJECT06, 'Pong.asm')) as f:
+        instructions, symbols = first_pass_for_labels(f.read().splitlines())
+    program = [int(word, 2) for word in second_pass_for_translation(instructions, symbols)]
+
+    # the compiled OS and the intrinsics agree, once Sys.init has run Math.init
+    emulator = HackEmulator(program)
+    debugger = Debugger(emulator, symbols)
+    debugger.run_until('screen.init', 100000)
+    native = Intrinsics()
+    for function, args in [('math.multiply', [123, 45]), ('math.multiply', [0x10000 - 9, 7]),
+                           ('math.divide', [1000, 7]), ('math.divide', [0x10000 - 100, 7])]:
+        name = 'Math.' + function.split('.')[1]
+        check(f"{name}{tuple(args)}", call_compiled(emulator, debugger, function, args),
+              (native.call(name, emulator.ram, args), 301))
+
+    emulator = HackEmulator(program)
+    intrinsics = Intrinsics()
+    traps = IntrinsicTraps(emulator, symbols, intrinsics)
+    check("Math.multiply patched", traps.names.get(symbols['math.multiply']), 'Math.multiply')
+    traps.run(1000000)
+    check("exact cycle count", emulator.cycles, 1000000)
+    check("Pong has drawn by 1M cycles", any(emulator.ram[SCREEN:KBD]), True)
+    check("multiply and drawRectangle ran", all(intrinsics.counts[name] > 100
+                                                for name in ['Math.multiply', 'Screen.drawRectangle']), True)
+    traps.uninstall()
+    check("uninstall restores the ROM", emulator._code[symbols['math.multiply']] == hack_emulator.decode(
+        program[symbols['math.multiply']]), True)
+
+
+def test_snapshots():
+    print("  snapshots: boot once, restore per scenario")
+    with open(os.path.join(PROJECT06, 'Pong.asm')) as f:
+        instructions, symbols = first_pass_for_labels(f.read().splitlines())
+    program = [int(word, 2) for word in second_pass_for_translation(instructions, symbols)]
+    emulator = HackEmulator(program)
+    Debugger(emulator, symbols).run_until('screen.init', 1000000)
+    booted = snapshot(emulator)
+    screen = emulator.screen
+
+    # two scenarios from the same booted state: one key held, none
+    emulator.ram[KBD] = 130
+    emulator.run(200000)
+    left = (emulator.state(), emulator.ram.tobytes())
+    start = time.perf_counter()
+    written = restore(emulator, booted)
+    seconds = time.perf_counter() - start
+    check("registers and cycles back", (emulator.state(), emulator.cycles), ((booted.PC, booted.A, booted.D), booted.cycles))
+    check("RAM back", emulator.ram.tobytes(), b''.join(booted.pages))
+    check("only changed pages written", 0 < written < 64, True)
+    check("restored in place", screen.words.obj is emulator.ram, True)
+    emulator.ram[KBD] = 130
+    emulator.run(200000)
+    check("the rerun is identical", (emulator.state(), emulator.ram.tobytes()), left)
+    print(f"    restore: {written} of 64 pages in {seconds * 1e6:.0f} us")
+
+    later = snapshot(emulator, booted)
+    check("unchanged pages shared with the base", shared_pages(booted, later) >= 32, True)
+    check("changed pages copied", shared_pages(booted, later) < 64, True)
+
+    # a warmed-up state reused by another emulator, as another process would
+    path = os.path.join(tempfile.mkdtemp(), 'pong.snap')
+    save_snapshot(path, later)
+    check("compressed on disk", os.path.getsize(path) < 2 * 32768, True)
+    fresh = HackEmulator(program)
+    restore(fresh, load_snapshot(path))
+    check("loaded snapshot restores", (fresh.state(), fresh.cycles, fresh.ram == emulator.ram),
+          (emulator.state(), emulator.cycles, True))
+    fresh.run(1000)
+    emulator.run(1000)
+    check("and runs on the same", fresh.ram == emulator.ram, True)
+    for name, action in [("different ROM", lambda: restore(HackEmulator(assemble('Mult.asm')), later)),
+                         ("not a snapshot", lambda: load_snapshot(os.path.join(PROJECT06, 'Pong.asm')))]:
+        try:
+            action()
+            check(f"{name} rejected", False, True)
+        except ValueError:
+            check(f"{name} rejected", True, True)
+
+
+def test_emulator_farm():
+    print("  emulator farm: project 7 programs x initial RAM on a process pool")
+    programs = {}
+    for name in ['SimpleAdd', 'StackTest', 'BasicTest', 'PointerTest', 'StaticTest']:
+        asm_path = os.path.join(tempfile.mkdtemp(), name + '.asm')
+        parse_vm_file(os.path.join(PROJECT07, name + '.vm'), asm_path)
+        with open(asm_path) as f:
+            programs[name] = assemble_lines(f.read().splitlines())
+    check("one halt loop each", [len(halt_loops(rom)) for rom in programs.values()], [1] * 5)
+
+    # every program from ten different segment bases, checked against a plain emulator stepped to its halt
+    jobs, expected = [], []
+    for name, rom in programs.items():
+        for k in range(10):
+            setup = {0: 256 + k, 1: 300 + k, 2: 400 + k, 3: 3000 + k, 4: 3010 + k}
+            emulator = HackEmulator(rom)
+            for address, value in setup.items():
+                emulator.ram[address] = value
+            while not emulator.halted():
+                emulator.step()
+            watched = [256 + k, 300 + k, 401 + k, 3002 + k, 3016 + k, 11, 16, 17]
+            jobs.append(Job(name, setup, {address: emulator.ram[address] for address in watched}))
+            expected.append(emulator.cycles)
+    jobs.append(Job('SimpleAdd', {0: 256}, {256: 15, 257: 99}))
+
+    with EmulatorFarm(programs, workers=2) as farm:
+        block = farm.block.name
+        results = farm.run(jobs)
+    check("results in job order", [r.program for r in results], [job.program for job in jobs])
+    check("all halted", all(r.halted for r in results), True)
+    check("exact halting cycle", [r.cycles for r in results[:-1]], expected)
+    check("RAM checks pass", [r.failures for r in results[:-1]], [[]] * 50)
+    check("a wrong expectation is reported", results[-1].failures, [(257, 99, 8)])
+    try:
+        shared_memory.SharedMemory(block)
+        check("shared ROM unlinked on close", False, True)
+    except FileNotFoundError:
+        check("shared ROM unlinked on close", True, True)
+
+    with EmulatorFarm(programs, workers=0) as farm:
+        check("in-process run agrees", farm.run(jobs), results)
+        check("max_cycles stops a run", farm.run([Job('StackTest', {0: 256}, {}, 100)])[0][:3],
+              ('StackTest', 100, False))
+        try:
+            farm.run([Job('Pong')])
+            check("unknown program rejected", False, True)
+        except ValueError:
+            check("unknown program rejected", True, True)
+
+
+def test_cosimulation():
+    print("  gate-level CPU vs emulator")
+    mult = assemble('Mult.asm')
+    for level in ['memory', 'registers']:
+        result = cosimulate(mult, 200, batch=32, level=level, memory={0: 7, 1: 6})
+        check(f"Mult agrees at level {level}", result, (200, None))
+    result = cosimulate(assemble('Fill.asm'), 600, batch=128, memory={KBD: 65})
+    check("Fill agrees with a key down", result.divergence, None)
+
+    # break D+M in the emulator: the batch hash catches it, the replay finds the exact cycle
+    add = hack_emulator.COMP[0b000010]
+    hack_emulator.COMP[0b000010] = lambda d, y: d + y + 1
+    try:
+        batched = cosimulate(mult, 200, batch=64, memory={0: 7, 1: 6})
+        lockstep = cosimulate(mult, 200, batch=1, memory={0: 7, 1: 6})
+    finally:
+        hack_emulator.COMP[0b000010] = add
+    check("divergence found", batched.divergence is not None, True)
+    check("same cycle as lockstep", batched.divergence.cycle, lockstep.divergence.cycle)
+    check("outM differs", batched.divergence.fields, ['outM'])
+
+    # a memory write as the very first instruction, and right after a poke
+    gate = GateComputer(assemble_lines(['M=1', 'M=M+1']))
+    check("first cycle's pins", gate.step()[:3], (1, 0, 1))
+    gate.poke(0, 41)
+    check("pins after a poke", gate.step()[:3], (1, 0, 42))
+    check("RAM agrees", gate.ram.words[0], 42)
+    check("first-cycle write agrees", cosimulate(assemble_lines(['M=M+1', 'D=M', 'M=D+M']), 3, batch=1,
+                                                  memory={0: 41}), (3, None))
+
+
+if __name__ == '__main__':
+    print("=== project 5: hdl simulator tests ===\n")
+    print("-- parser --")
+    test_parse_hdl()
+    test_find_hdl_files()
+
+    print("\n-- combinational --")
+    test_truth_tables()
+    test_add16_and_alu()
+    test_lane_packing()
+    test_bitsliced_golden_models()
+    test_compiled_netlists()
+
+    print("\n-- sequential --")
+    test_register_and_pc()
+    test_ram64()
+    test_cpu()
+    test_event_driven()
+    test_behavioral_substitution()
+
+    print("\n-- emulator --")
+    test_emulator()
+    test_framebuffer()
+    test_keyboard_replay()
+    test_profiler()
+    test_debugger()
+    test_intrinsic_traps()
+    test_snapshots()
+    test_emulator_farm()
+    test_cosimulation()
+
+    print(f"\n{PASS} passed, {FAIL} failed")
+    sys.exit(1 if FAIL else 0)
@@ -0,0 +1,97 @@
+import os
+import struct
+import sys
+import zlib
+
+WIDTH = 512
+HEIGHT = 256
+WORDS_PER_ROW = WIDTH // 16
+SCREEN_WORDS = WORDS_PER_ROW * HEIGHT
+
+# Hack puts pixel col at bit col % 16 (lsb = leftmost); image formats want the
+# leftmost pixel in the msb of each byte, so every byte gets its bits reversed.
+_REVERSE = bytes(int(f"{b:08b}"[::-1], 2) for b in range(256))
+_INVERT = bytes(0xFF ^ b for b in range(256))
+# one byte of 8 pixels -> 24 bytes of RGB, for P6
+_RGB = [b''.join(b'\x00\x00\x00' if (b >> (7 - k)) & 1 else b'\xff\xff\xff' for k in range(8))
+        for b in range(256)]
+
+
+# --- Part 1: A View of the Screen ---
+class ScreenView:
+    """
+    A 512x256 pixel view over the screen words of a RAM array, without copying:
+    view[row, col] reads one pixel (1 = black) straight from the words.
+    """
+
+    def __init__(self, ram, base=16384):
+        self.words = memoryview(ram)[base:base + SCREEN_WORDS]
+
+    def __getitem__(self, pixel):
+        row, col = pixel
+        return (self.words[row * WORDS_PER_ROW + (col >> 4)] >> (col & 15)) & 1
+
+    def row(self, row):
+        """The pixels of one row as a list of 0/1."""
+        words = self.words[row * WORDS_PER_ROW:(row + 1) * WORDS_PER_ROW]
+        return [(w >> bit) & 1 for w in words for bit in range(16)]
+
+    def packed(self):
+        """The frame as 1 bit per pixel, leftmost pixel in each byte's msb (PBM layout)."""
+        data = self.words.tobytes()
+        if sys.byteorder == 'big':
+            swapped = bytearray(data)
+            swapped[0::2], swapped[1::2] = data[1::2], data[0::2]
+            data = bytes(swapped)
+        return data.translate(_REVERSE)
+
+
+# --- Part 2: Image Formats ---
+def to_pbm(view):
+    return b'P4\n%d %d\n' % (WIDTH, HEIGHT) + view.packed()
+
+
+def to_ppm(view):
+    rgb = _RGB
+    return b'P6\n%d %d\n255\n' % (WIDTH, HEIGHT) + b''.join(rgb[b] for b in view.packed())
+
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def to_png(view):
+    """A 1-bit grayscale PNG (0 = black there, so the bits are inverted too)."""
+    bits = view.packed().translate(_INVERT)
+    stride = WIDTH // 8
+    raw = b''.join(b'\x00' + bits[r * stride:(r + 1) * stride] for r in range(HEIGHT))
+    header = struct.pack('>IIBBBBB', WIDTH, HEIGHT, 1, 0, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header)
+            + _png_chunk(b'IDAT', zlib.compress(raw)) + _png_chunk(b'IEND', b''))
+
+
+FORMATS = {'pbm': to_pbm, 'ppm': to_ppm, 'png': to_png}
+
+
+# --- Part 3: Dumping Frames ---
+class FrameDumper:
+    """
+    Writes the screen to directory/frame_00000.<fmt> every `interval` cycles
+    while HackEmulator.run(cycles, frames=dumper) executes.
+    """
+
+    def __init__(self, directory, interval=100000, fmt='png'):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown frame format '{fmt}' (expected one of {', '.join(FORMATS)})")
+        self.directory = directory
+        self.interval = interval
+        self.fmt = fmt
+        self.paths = []
+
+    def dump(self, view):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"frame_{len(self.paths):05d}.{self.fmt}")
+        with open(path, 'wb') as f:
+            f.write(FORMATS[self.fmt](view))
+        self.paths.append(path)
+        return path
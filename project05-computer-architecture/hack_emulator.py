@@ -0,0 +1,242 @@
+from array import array
+from collections import namedtuple
+
+from framebuffer import ScreenView
+
+# --- Part 1: Memory Map ---
+RAM_WORDS = 32768
+SCREEN = 16384
+KBD = 24576
+
+# One decoded ROM word. An A-instruction has comp None and value set;
+# a C-instruction has the comp function, the a-bit, dest bits and jump bits.
+Op = namedtuple('Op', 'comp a dest jump value')
+
+
+# --- Part 2: Decoding ---
+def _alu(d, y, bits):
+    """The Hack ALU on its six control bits (zx nx zy ny f no, msb first)."""
+    zx, nx, zy, ny, f, no = ((bits >> k) & 1 for k in range(5, -1, -1))
+    x = 0 if zx else d
+    if nx: x = ~x
+    y = 0 if zy else y
+    if ny: y = ~y
+    out = x + y if f else x & y
+    return ~out if no else out
+
+
+# the 18 documented computations, fast; anything else goes through _alu
+COMP = {
+    0b101010: lambda d, y: 0,      0b111111: lambda d, y: 1,
+    0b111010: lambda d, y: -1,     0b001100: lambda d, y: d,
+    0b110000: lambda d, y: y,      0b001101: lambda d, y: ~d,
+    0b110001: lambda d, y: ~y,     0b001111: lambda d, y: -d,
+    0b110011: lambda d, y: -y,     0b011111: lambda d, y: d + 1,
+    0b110111: lambda d, y: y + 1,  0b001110: lambda d, y: d - 1,
+    0b110010: lambda d, y: y - 1,  0b000010: lambda d, y: d + y,
+    0b010011: lambda d, y: d - y,  0b000111: lambda d, y: y - d,
+    0b000000: lambda d, y: d & y,  0b010101: lambda d, y: d | y,
+}
+
+# jump bits -> (jump if negative, jump if zero, jump if positive)
+JUMPS = [((j >> 2) & 1, (j >> 1) & 1, j & 1) for j in range(8)]
+
+
+class Trap(Exception):
+    """Raised by a patched-in TRAP op; the run loops save their state first, with PC on the trap."""
+
+
+def _trap(d, y):
+    raise Trap
+
+
+# Debuggers swap this in for a decoded op (see debugger.py); it stops the run
+# before the instruction has any effect, so normal execution pays nothing.
+TRAP = Op(_trap, 0, 0, 0, 0)
+
+
+def decode(word):
+    if not word & 0x8000:
+        return Op(None, 0, 0, 0, word)
+    bits = (word >> 6) & 0x3F
+    comp = COMP.get(bits) or (lambda d, y, bits=bits: _alu(d, y, bits))
+    return Op(comp, (word >> 12) & 1, (word >> 3) & 7, word & 7, 0)
+
+
+# --- Part 3: The Emulator ---
+class HackEmulator:
+    """
+    The Hack computer in Python: the MiniCPU of project 7 grown to the full
+    32K address space, with the ROM decoded once up front. Writes at or past
+    KBD are ignored, so the words above it read 0 and ram[KBD] is the key
+    currently pressed.
+    """
+
+    def __init__(self, program=()):
+        self.ram = array('H', bytes(2 * RAM_WORDS))
+        self.rom = array('H', bytes(2 * RAM_WORDS))
+        self.A = self.D = self.PC = 0
+        self.cycles = 0
+        self.counters = None  # per-ROM-address execution counts while profiling
+        self._code = [decode(0)] * RAM_WORDS
+        if program:
+            self.load(program)
+
+    def load(self, program):
+        """Loads ROM words (ints) and restarts at address 0."""
+        self.rom = array('H', bytes(2 * RAM_WORDS))
+        self.rom[:len(program)] = array('H', program)
+        self._code = [decode(word) for word in self.rom]
+        self.reset()
+
+    def reset(self):
+        self.PC = 0
+        self.cycles = 0
+
+    def state(self):
+        return (self.PC, self.A, self.D)
+
+    def enable_profiling(self):
+        """Counts executions of every ROM address from now on (see profiler.py)."""
+        self.counters = array('Q', bytes(8 * RAM_WORDS))
+        return self.counters
+
+    def disable_profiling(self):
+        self.counters = None
+
+    def step(self):
+        """
+        Runs one instruction and returns what the CPU put on its memory pins
+        during it: (writeM, addressM, outM), outM being 0 when nothing is written.
+        """
+        op = self._code[self.PC]
+        self.cycles += 1
+        if self.counters is not None:
+            self.counters[self.PC] += 1
+        address = self.A & 0x7FFF
+        if op.comp is None:
+            self.A = op.value
+            self.PC = (self.PC + 1) & 0x7FFF
+            return (0, address, 0)
+        y = self.ram[address] if op.a else self.A
+        result = op.comp(self.D, y) & 0xFFFF
+        dest = op.dest
+        if dest & 1 and address < KBD:
+            self.ram[address] = result
+        if dest & 2:
+            self.D = result
+        jump_to = self.A
+        if dest & 4:
+            self.A = result
+        self.PC = (jump_to if self._jumps(op.jump, result) else self.PC + 1) & 0x7FFF
+        return (dest & 1, address, result if dest & 1 else 0)
+
+    @staticmethod
+    def _jumps(jump, result):
+        negative, zero, positive = JUMPS[jump]
+        if result == 0:
+            return zero
+        return negative if result & 0x8000 else positive
+
+    def halted(self):
+        """True inside the usual `(END) @END 0;JMP` loop, which never changes state again."""
+        code, pc = self._code, self.PC
+        if code[pc].comp is None:
+            start = pc
+        elif code[pc].jump == 7 and self.A == pc - 1:
+            start = pc - 1
+        else:
+            return False
+        at, jump = code[start], code[(start + 1) & 0x7FFF]
+        return (at.comp is None and at.value == start
+                and jump.comp is not None and jump.jump == 7 and not jump.dest)
+
+    @property
+    def screen(self):
+        """A zero-copy 512x256 ScreenView of the SCREEN region."""
+        return ScreenView(self.ram, SCREEN)
+
+    def run(self, cycles, frames=None):
+        """
+        Runs `cycles` instructions. With a FrameDumper the run is split into
+        chunks of frames.interval cycles and the screen is dumped after each;
+        without one the loop below runs straight through.
+        """
+        if frames is not None:
+            while cycles > 0:
+                chunk = min(cycles, frames.interval)
+                self.run(chunk)
+                cycles -= chunk
+                frames.dump(self.screen)
+            return
+        if self.counters is not None:
+            return self._run_profiled(cycles)
+        code, ram, jumps = self._code, self.ram, JUMPS
+        A, D, PC = self.A, self.D, self.PC
+        try:
+            for done in range(cycles):
+                comp, a, dest, jump, value = code[PC]
+                if comp is None:
+                    A = value
+                    PC = (PC + 1) & 0x7FFF
+                    continue
+                address = A & 0x7FFF
+                y = ram[address] if a else A
+                result = comp(D, y) & 0xFFFF
+                jump_to = A
+                if dest:
+                    if dest & 1 and address < KBD:
+                        ram[address] = result
+                    if dest & 2:
+                        D = result
+                    if dest & 4:
+                        A = result
+                if jump:
+                    negative, zero, positive = jumps[jump]
+                    taken = zero if result == 0 else (negative if result & 0x8000 else positive)
+                    PC = (jump_to if taken else PC + 1) & 0x7FFF
+                else:
+                    PC = (PC + 1) & 0x7FFF
+        except Trap:
+            self.A, self.D, self.PC = A, D, PC
+            self.cycles += done
+            raise
+        self.A, self.D, self.PC = A, D, PC
+        self.cycles += cycles
+
+    def _run_profiled(self, cycles):
+        """run() plus one counter bump per instruction; kept separate so run() pays nothing for it."""
+        code, ram, jumps, counters = self._code, self.ram, JUMPS, self.counters
+        A, D, PC = self.A, self.D, self.PC
+        try:
+            for done in range(cycles):
+                counters[PC] += 1
+                comp, a, dest, jump, value = code[PC]
+                if comp is None:
+                    A = value
+                    PC = (PC + 1) & 0x7FFF
+                    continue
+                address = A & 0x7FFF
+                y = ram[address] if a else A
+                result = comp(D, y) & 0xFFFF
+                jump_to = A
+                if dest:
+                    if dest & 1 and address < KBD:
+                        ram[address] = result
+                    if dest & 2:
+                        D = result
+                    if dest & 4:
+                        A = result
+                if jump:
+                    negative, zero, positive = jumps[jump]
+                    taken = zero if result == 0 else (negative if result & 0x8000 else positive)
+                    PC = (jump_to if taken else PC + 1) & 0x7FFF
+                else:
+                    PC = (PC + 1) & 0x7FFF
+        except Trap:
+            self.A, self.D, self.PC = A, D, PC
+            self.cycles += done
+            counters[PC] -= 1
+            raise
+        self.A, self.D, self.PC = A, D, PC
+        self.cycles += cycles
@@ -0,0 +1,148 @@
+import os
+import re
+from collections import namedtuple
+
+# --- Part 1: Chip Definitions ---
+# A parsed .hdl file. inputs/outputs map pin name -> width, in declaration order.
+ChipDef = namedtuple('ChipDef', 'name inputs outputs parts')
+# One line of the PARTS section, e.g. Mux16(a=x, b[0..7]=false, out=y)
+PartDef = namedtuple('PartDef', 'name connections')
+# pin[pin_range]=signal[signal_range]; a range is (lo, hi) inclusive or None for the whole bus
+Connection = namedtuple('Connection', 'pin pin_range signal signal_range')
+
+# Directories holding the chips of projects 01-05, relative to the repo root
+HDL_PROJECT_DIRS = [
+    'project01-boolean-logic',
+    'project02-boolean-arithmetic',
+    'project03-sequential-logic',
+    'project05-computer-architecture',
+]
+
+TOKEN_REGEX = re.compile(r'\s*(?:(\w+)|(\.\.)|(.))')
+
+
+def strip_comments(text):
+    """Removes // and /* */ comments from HDL source."""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+    return re.sub(r'//.*', '', text)
+
+
+def tokenize_hdl(text):
+    """Splits comment-free HDL into identifier/number, '..' and single-character tokens."""
+    tokens = []
+    for match in TOKEN_REGEX.finditer(text):
+        token = match.group(1) or match.group(2) or match.group(3)
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+# --- Part 2: Parsing ---
+class _HDLParser:
+    def __init__(self, tokens):
+        self._tokens = tokens
+        self._pos = 0
+
+    def _peek(self):
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _next(self, expected=None):
+        token = self._peek()
+        if token is None:
+            raise SyntaxError("Unexpected end of HDL file.")
+        if expected is not None and token != expected:
+            raise SyntaxError(f"Expected '{expected}' but got '{token}'")
+        self._pos += 1
+        return token
+
+    def parse_chip(self):
+        """'CHIP' name '{' ('IN' pins ';')? ('OUT' pins ';')? 'PARTS:' part* '}'"""
+        self._next('CHIP')
+        name = self._next()
+        self._next('{')
+        inputs, outputs = {}, {}
+        if self._peek() == 'IN':
+            self._next()
+            inputs = self._parse_pin_list()
+        if self._peek() == 'OUT':
+            self._next()
+            outputs = self._parse_pin_list()
+        self._next('PARTS')
+        self._next(':')
+        parts = []
+        while self._peek() != '}':
+            parts.append(self._parse_part())
+        self._next('}')
+        return ChipDef(name, inputs, outputs, parts)
+
+    def _parse_pin_list(self):
+        """pin ('[' width ']')? (',' pin ('[' width ']')?)* ';'"""
+        pins = {}
+        while True:
+            name = self._next()
+            width = 1
+            if self._peek() == '[':
+                self._next('[')
+                width = int(self._next())
+                self._next(']')
+            pins[name] = width
+            if self._next() == ';':
+                return pins
+
+    def _parse_range(self):
+        """('[' lo ('..' hi)? ']')?"""
+        if self._peek() != '[':
+            return None
+        self._next('[')
+        lo = hi = int(self._next())
+        if self._peek() == '..':
+            self._next('..')
+            hi = int(self._next())
+        self._next(']')
+        return (lo, hi)
+
+    def _parse_part(self):
+        """name '(' connection (',' connection)* ')' ';'"""
+        name = self._next()
+        self._next('(')
+        connections = []
+        while True:
+            pin = self._next()
+            pin_range = self._parse_range()
+            self._next('=')
+            signal = self._next()
+            signal_range = self._parse_range()
+            connections.append(Connection(pin, pin_range, signal, signal_range))
+            if self._next() == ')':
+                break
+        self._next(';')
+        return PartDef(name, connections)
+
+
+def parse_hdl(text):
+    """Parses the text of a .hdl file into a ChipDef."""
+    return _HDLParser(tokenize_hdl(strip_comments(text))).parse_chip()
+
+
+def parse_hdl_file(filepath):
+    with open(filepath, 'r') as f:
+        return parse_hdl(f.read())
+
+
+# --- Part 3: Finding Chips ---
+def default_search_dirs():
+    """The project01-05 chip directories of this repo."""
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    return [os.path.join(root, d) for d in HDL_PROJECT_DIRS]
+
+
+def find_hdl_files(search_dirs=None):
+    """Returns {chip name: path} for every .hdl file in the search directories."""
+    files = {}
+    for directory in search_dirs or default_search_dirs():
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.hdl'):
+                files.setdefault(filename[:-4], os.path.join(directory, filename))
+    return files
@@ -0,0 +1,718 @@
+from array import array
+from itertools import accumulate
+
+from hdl_parser import ChipDef, find_hdl_files, parse_hdl_file
+
+# --- Part 1: Netlists ---
+# Chips the CPU refers to by another name (unless a block table claims the name itself)
+CHIP_ALIASES = {'ARegister': 'Register', 'DRegister': 'Register'}
+
+
+class Netlist:
+    """
+    A chip flattened to Nand gates, DFFs and behavioral blocks over numbered nets.
+    Nets 0 and 1 are the constants false and true; the chip's own pin bits come
+    next (2 .. 2 + pin_nets), then everything internal. pins[name] lists the net
+    of each bit, bit 0 first.
+    """
+
+    def __init__(self, name, inputs, outputs):
+        self.name = name
+        self.inputs = dict(inputs)
+        self.outputs = dict(outputs)
+        self.pin_nets = sum(self.inputs.values()) + sum(self.outputs.values())
+        self.n_nets = 2 + self.pin_nets
+        self.pins = {}
+        self.nand_a = array('i')
+        self.nand_b = array('i')
+        self.nand_out = array('i')
+        self.dff_in = array('i')
+        self.dff_out = array('i')
+        self.blocks = []  # (block name, {pin: [nets]})
+
+    def gate_counts(self):
+        return {'Nand': len(self.nand_out), 'DFF': len(self.dff_out), 'blocks': len(self.blocks)}
+
+
+def _primitive(name, inputs, outputs, kind):
+    """Template for Nand, DFF or a behavioral block: pins wired straight to one primitive."""
+    netlist = Netlist(name, inputs, outputs)
+    net = 2
+    for pin, width in list(inputs.items()) + list(outputs.items()):
+        netlist.pins[pin] = list(range(net, net + width))
+        net += width
+    pins = netlist.pins
+    if kind == 'Nand':
+        netlist.nand_a.append(pins['a'][0])
+        netlist.nand_b.append(pins['b'][0])
+        netlist.nand_out.append(pins['out'][0])
+    elif kind == 'DFF':
+        netlist.dff_in.append(pins['in'][0])
+        netlist.dff_out.append(pins['out'][0])
+    else:
+        netlist.blocks.append((name, {pin: list(nets) for pin, nets in pins.items()}))
+    return netlist
+
+
+class _UnionFind:
+    """Merges nets that the HDL connects together; the lowest net number wins."""
+
+    def __init__(self):
+        self._parent = {}
+
+    def find(self, x):
+        parent = self._parent
+        root = x
+        while root in parent:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, x, y):
+        x, y = self.find(x), self.find(y)
+        if x != y:
+            lo, hi = min(x, y), max(x, y)
+            self._parent[hi] = lo
+
+
+def _select(nets, bus_range, what):
+    """Picks bits lo..hi (inclusive) of a bus."""
+    if bus_range is None:
+        return list(nets)
+    lo, hi = bus_range
+    if not 0 <= lo <= hi < len(nets):
+        raise ValueError(f"{what}[{lo}..{hi}] is out of range for a {len(nets)}-bit bus")
+    return list(nets[lo:hi + 1])
+
+
+class Elaborator:
+    """
+    Flattens chips from their .hdl files into Netlists. Each chip is flattened
+    once into a template and then stamped into its parents by renumbering nets,
+    so a RAM16K costs one RAM4K flattening plus four copies.
+    """
+
+    def __init__(self, search_dirs=None, blocks=None):
+        self._files = find_hdl_files(search_dirs)
+        self._blocks = dict(BUILTIN_BLOCKS if blocks is None else blocks)
+        self._defs = {}
+        self._templates = {}
+
+    def _resolve(self, name):
+        return name if name in self._blocks else CHIP_ALIASES.get(name, name)
+
+    def define(self, chip_def):
+        """Adds a chip that has no .hdl file, e.g. a test harness parsed with parse_hdl."""
+        self._defs[chip_def.name] = chip_def
+        self._templates.pop(chip_def.name, None)
+
+    def chip_def(self, name):
+        """The parsed definition of a chip, or a pins-only ChipDef for primitives and blocks."""
+        name = self._resolve(name)
+        if name not in self._defs:
+            if name == 'Nand':
+                self._defs[name] = ChipDef('Nand', {'a': 1, 'b': 1}, {'out': 1}, [])
+            elif name == 'DFF':
+                self._defs[name] = ChipDef('DFF', {'in': 1}, {'out': 1}, [])
+            elif name in self._blocks:
+                block = self._blocks[name]
+                self._defs[name] = ChipDef(name, block.INPUTS, block.OUTPUTS, [])
+            elif name in self._files:
+                self._defs[name] = parse_hdl_file(self._files[name])
+            else:
+                raise ValueError(f"No HDL file or built-in for chip '{name}'")
+        return self._defs[name]
+
+    def hierarchy(self, name):
+        """{chip: ChipDef} for a chip and every chip it is built from, with files or not."""
+        defs = {}
+        pending = [self._resolve(name)]
+        while pending:
+            chip = pending.pop()
+            if chip not in defs:
+                defs[chip] = self.chip_def(chip)
+                pending.extend(self._resolve(p.name) for p in defs[chip].parts)
+        return defs
+
+    def block_class(self, name):
+        """The behavioral block class a chip name stands for, or None."""
+        return self._blocks.get(self._resolve(name))
+
+    def source_files(self, name):
+        """Every .hdl file a chip's hierarchy is built from, sorted."""
+        return sorted(self._files[chip] for chip in self.hierarchy(name) if chip in self._files)
+
+    def netlist(self, name):
+        """Returns the flattened Netlist of a chip (cached)."""
+        name = self._resolve(name)
+        if name not in self._templates:
+            chip = self.chip_def(name)
+            if name in ('Nand', 'DFF') or name in self._blocks:
+                self._templates[name] = _primitive(name, chip.inputs, chip.outputs, name)
+            else:
+                self._templates[name] = self._flatten(chip)
+        return self._templates[name]
+
+    def _flatten(self, chip):
+        netlist = Netlist(chip.name, chip.inputs, chip.outputs)
+        where = f"chip {chip.name}"
+
+        # Every signal gets its nets up front: pins first, then internal signals
+        signals = {}
+        net = 2
+        for pin, width in list(chip.inputs.items()) + list(chip.outputs.items()):
+            signals[pin] = list(range(net, net + width))
+            net += width
+        input_nets = {n for pin in chip.inputs for n in signals[pin]}
+        for part in chip.parts:
+            part_def = self.chip_def(part.name)
+            for c in part.connections:
+                if c.pin in part_def.outputs and c.signal not in signals:
+                    if c.signal_range is not None:
+                        raise ValueError(f"{where}: internal signal '{c.signal}' cannot be subscripted")
+                    if c.signal in ('true', 'false'):
+                        raise ValueError(f"{where}: cannot drive constant '{c.signal}'")
+                    width = len(_select(range(part_def.outputs[c.pin]), c.pin_range, c.pin))
+                    signals[c.signal] = list(range(net, net + width))
+                    net += width
+
+        # Pass 1: work out how each part's pins map onto our signals
+        nets = _UnionFind()
+        driven = set()
+        plans = []
+        for part in chip.parts:
+            template = self.netlist(part.name)
+            part_def = self.chip_def(part.name)
+            pin_map = {}
+            for pin in part_def.inputs:
+                for local in template.pins[pin]:
+                    pin_map[local] = 0  # unconnected inputs read false
+            for c in part.connections:
+                if c.pin in part_def.inputs:
+                    local_nets = _select(template.pins[c.pin], c.pin_range, f"{part.name}.{c.pin}")
+                    if c.signal in ('true', 'false'):
+                        parent_nets = [1 if c.signal == 'true' else 0] * len(local_nets)
+                    elif c.signal in signals:
+                        parent_nets = _select(signals[c.signal], c.signal_range, c.signal)
+                    else:
+                        raise ValueError(f"{where}: signal '{c.signal}' is never driven")
+                    if len(parent_nets) != len(local_nets):
+                        raise ValueError(f"{where}: {part.name}.{c.pin} is {len(local_nets)} bits "
+                                         f"but '{c.signal}' is {len(parent_nets)}")
+                    for local, parent in zip(local_nets, parent_nets):
+                        pin_map[local] = parent
+                elif c.pin in part_def.outputs:
+                    local_nets = _select(template.pins[c.pin], c.pin_range, f"{part.name}.{c.pin}")
+                    parent_nets = _select(signals[c.signal], c.signal_range, c.signal)
+                    if len(parent_nets) != len(local_nets):
+                        raise ValueError(f"{where}: {part.name}.{c.pin} is {len(local_nets)} bits "
+                                         f"but '{c.signal}' is {len(parent_nets)}")
+                    for local, parent in zip(local_nets, parent_nets):
+                        if parent in input_nets:
+                            raise ValueError(f"{where}: {part.name} drives input pin '{c.signal}'")
+                        if parent in driven:
+                            raise ValueError(f"{where}: '{c.signal}' has more than one driver")
+                        driven.add(parent)
+                        if local in pin_map:
+                            nets.union(pin_map[local], parent)
+                        else:
+                            pin_map[local] = parent
+                else:
+                    raise ValueError(f"{where}: {part.name} has no pin '{c.pin}'")
+            plans.append((template, pin_map))
+
+        for name, signal_nets in signals.items():
+            if name not in chip.inputs and not all(n in driven for n in signal_nets):
+                if name in chip.outputs:
+                    continue  # an unconnected output just reads false
+                raise ValueError(f"{where}: signal '{name}' is never driven")
+
+        # Pass 2: stamp every part's gates in, renumbered into our nets
+        for template, pin_map in plans:
+            remap = [0, 1]
+            for local in range(2, 2 + template.pin_nets):
+                if local in pin_map:
+                    remap.append(nets.find(pin_map[local]))
+                else:
+                    remap.append(net)  # unconnected output bit
+                    net += 1
+            n_internal = template.n_nets - 2 - template.pin_nets
+            remap.extend(range(net, net + n_internal))
+            net += n_internal
+
+            netlist.nand_a.extend([remap[x] for x in template.nand_a])
+            netlist.nand_b.extend([remap[x] for x in template.nand_b])
+            netlist.nand_out.extend([remap[x] for x in template.nand_out])
+            netlist.dff_in.extend([remap[x] for x in template.dff_in])
+            netlist.dff_out.extend([remap[x] for x in template.dff_out])
+            for block_name, block_pins in template.blocks:
+                netlist.blocks.append((block_name, {pin: [remap[x] for x in bits]
+                                                    for pin, bits in block_pins.items()}))
+
+        netlist.n_nets = net
+        for pin in list(chip.inputs) + list(chip.outputs):
+            netlist.pins[pin] = [nets.find(n) for n in signals[pin]]
+        unconnected = [n for pin in chip.outputs for n in netlist.pins[pin] if n not in driven]
+        for n in unconnected:
+            # undriven output bits read false: Nand(true, true) = 0
+            netlist.nand_a.append(1)
+            netlist.nand_b.append(1)
+            netlist.nand_out.append(n)
+        return netlist
+
+
+def nand_order(netlist):
+    """
+    The Nand gates of a netlist in topological order. Chip inputs, DFF outputs
+    and block outputs count as sources, so this is the combinational cone
+    between clock edges.
+    """
+    nand_a, nand_b, nand_out = netlist.nand_a, netlist.nand_b, netlist.nand_out
+    driver = {net: gate for gate, net in enumerate(nand_out)}
+    readers = {}
+    pending = array('i', bytes(4 * len(nand_out)))
+    ready = []
+    for gate, (a, b) in enumerate(zip(nand_a, nand_b)):
+        inputs = (a,) if a == b else (a, b)
+        for net in inputs:
+            if net in driver:
+                pending[gate] += 1
+                readers.setdefault(net, []).append(gate)
+        if not pending[gate]:
+            ready.append(gate)
+
+    order = []
+    while ready:
+        gate = ready.pop()
+        order.append(gate)
+        for reader in readers.get(nand_out[gate], ()):
+            pending[reader] -= 1
+            if not pending[reader]:
+                ready.append(reader)
+    if len(order) != len(nand_out):
+        raise ValueError(f"{netlist.name} has a combinational loop")
+    return order
+
+
+# --- Part 2: Behavioral Blocks ---
+class Block:
+    """
+    A chip simulated in Python instead of gates. INPUTS/OUTPUTS give pin widths,
+    COMB_INPUTS are the inputs the outputs depend on combinationally and CLOCKED
+    blocks get tick() on every clock with the pre-clock input values.
+    """
+    INPUTS = {}
+    OUTPUTS = {}
+    COMB_INPUTS = ()
+    CLOCKED = False
+
+    def __init__(self, pins):
+        self.pins = pins
+        self.chip = None  # set by the simulator, along with node
+        self.node = None
+
+    def read(self, values, pin):
+        """The value on an input pin as an unsigned int."""
+        value = 0
+        for bit, net in enumerate(self.pins[pin]):
+            if values[net]:
+                value |= 1 << bit
+        return value
+
+    def evaluate(self, sim):
+        """Drives the outputs from the current inputs and state."""
+
+    def tick(self, values):
+        """Captures state on the clock edge."""
+
+
+class ROM32K(Block):
+    INPUTS = {'address': 15}
+    OUTPUTS = {'out': 16}
+    COMB_INPUTS = ('address',)
+
+    def __init__(self, pins):
+        super().__init__(pins)
+        self.words = array('H', bytes(2 * 32768))
+
+    def load(self, words):
+        self.words = array('H', bytes(2 * 32768))
+        self.words[:len(words)] = array('H', words)
+
+    def evaluate(self, sim):
+        sim.drive(self.pins['out'], self.words[self.read(sim.values, 'address')])
+
+
+class Screen(Block):
+    INPUTS = {'in': 16, 'load': 1, 'address': 13}
+    OUTPUTS = {'out': 16}
+    COMB_INPUTS = ('address',)
+    CLOCKED = True
+
+    def __init__(self, pins):
+        super().__init__(pins)
+        self.words = array('H', bytes(2 * 8192))
+
+    def evaluate(self, sim):
+        sim.drive(self.pins['out'], self.words[self.read(sim.values, 'address')])
+
+    def tick(self, values):
+        if values[self.pins['load'][0]]:
+            self.words[self.read(values, 'address')] = self.read(values, 'in')
+
+
+class Keyboard(Block):
+    OUTPUTS = {'out': 16}
+
+    def __init__(self, pins):
+        super().__init__(pins)
+        self.key = 0
+
+    def evaluate(self, sim):
+        sim.drive(self.pins['out'], self.key)
+
+
+BUILTIN_BLOCKS = {'ROM32K': ROM32K, 'Screen': Screen, 'Keyboard': Keyboard}
+
+
+# Behavioral stand-ins for chips we already trust at gate level. Substituting
+# them lets larger programs run on the Computer while CPU.hdl stays gates.
+class Register(Block):
+    INPUTS = {'in': 16, 'load': 1}
+    OUTPUTS = {'out': 16}
+    CLOCKED = True
+
+    def __init__(self, pins):
+        super().__init__(pins)
+        self.value = 0
+
+    def evaluate(self, sim):
+        sim.drive(self.pins['out'], self.value)
+
+    def tick(self, values):
+        if values[self.pins['load'][0]]:
+            self.value = self.read(values, 'in')
+
+
+class PC(Register):
+    INPUTS = {'in': 16, 'load': 1, 'inc': 1, 'reset': 1}
+
+    def tick(self, values):
+        if values[self.pins['reset'][0]]:
+            self.value = 0
+        elif values[self.pins['load'][0]]:
+            self.value = self.read(values, 'in')
+        elif values[self.pins['inc'][0]]:
+            self.value = (self.value + 1) & 0xFFFF
+
+
+class RAM(Block):
+    """RAM8 ... RAM16K; subclasses only set the address width."""
+    ADDRESS_BITS = 0
+    OUTPUTS = {'out': 16}
+    COMB_INPUTS = ('address',)
+    CLOCKED = True
+
+    def __init__(self, pins):
+        super().__init__(pins)
+        self.words = array('H', bytes(2 << self.ADDRESS_BITS))
+
+    def evaluate(self, sim):
+        sim.drive(self.pins['out'], self.words[self.read(sim.values, 'address')])
+
+    def tick(self, values):
+        if values[self.pins['load'][0]]:
+            self.words[self.read(values, 'address')] = self.read(values, 'in')
+
+
+def _ram(name, address_bits):
+    return type(name, (RAM,), {'ADDRESS_BITS': address_bits,
+                               'INPUTS': {'in': 16, 'load': 1, 'address': address_bits}})
+
+
+RAM_BLOCKS = {name: _ram(name, bits) for name, bits in
+              [('RAM8', 3), ('RAM64', 6), ('RAM512', 9), ('RAM4K', 12), ('RAM16K', 14)]}
+
+
+class ALU(Block):
+    INPUTS = {'x': 16, 'y': 16, 'zx': 1, 'nx': 1, 'zy': 1, 'ny': 1, 'f': 1, 'no': 1}
+    OUTPUTS = {'out': 16, 'zr': 1, 'ng': 1}
+    COMB_INPUTS = tuple(INPUTS)
+
+    def evaluate(self, sim):
+        values = sim.values
+        bit = lambda pin: values[self.pins[pin][0]]
+        x = 0 if bit('zx') else self.read(values, 'x')
+        if bit('nx'):
+            x ^= 0xFFFF
+        y = 0 if bit('zy') else self.read(values, 'y')
+        if bit('ny'):
+            y ^= 0xFFFF
+        out = (x + y) & 0xFFFF if bit('f') else x & y
+        if bit('no'):
+            out ^= 0xFFFF
+        sim.drive(self.pins['out'], out)
+        sim.drive(self.pins['zr'], int(out == 0))
+        sim.drive(self.pins['ng'], out >> 15)
+
+
+# ARegister/DRegister get their own entries so a simulator can tell A and D apart
+BEHAVIORAL_BLOCKS = dict(RAM_BLOCKS, Register=Register, ARegister=Register, DRegister=Register, PC=PC, ALU=ALU)
+
+# How much of the machine to swap for behavioral models, from none to everything but the wiring
+REGISTER_BLOCKS = ('Register', 'ARegister', 'DRegister', 'PC')
+SUBSTITUTION_LEVELS = {
+    'gates': (),
+    'memory': tuple(RAM_BLOCKS),
+    'registers': tuple(RAM_BLOCKS) + REGISTER_BLOCKS,
+    'datapath': tuple(RAM_BLOCKS) + REGISTER_BLOCKS + ('ALU',),
+}
+
+
+def substitution_blocks(level='datapath'):
+    """
+    The blocks table for an Elaborator/HDLSimulator: the I/O built-ins plus the
+    behavioral chips of a level from SUBSTITUTION_LEVELS, or an explicit list of chip names.
+    """
+    names = SUBSTITUTION_LEVELS[level] if isinstance(level, str) else level
+    blocks = dict(BUILTIN_BLOCKS)
+    for name in names:
+        blocks[name] = BEHAVIORAL_BLOCKS[name]
+    return blocks
+
+
+# --- Part 3: Event-Driven Simulation ---
+class HDLSimulator:
+    """
+    Simulates a Netlist. Gates are levelized once, and after an input or clock
+    change only the gates downstream of a changed net are re-evaluated, in level
+    order, so each one runs at most once per settle. DFFs whose input changed are
+    remembered so a clock only looks at those.
+    """
+
+    def __init__(self, netlist, blocks=None):
+        block_classes = dict(BUILTIN_BLOCKS if blocks is None else blocks)
+        self.netlist = netlist
+        self.values = bytearray(netlist.n_nets)
+        self.values[1] = 1
+
+        self._n_nand = len(netlist.nand_out)
+        self._n_dff = len(netlist.dff_out)
+        self.blocks = []
+        for i, (name, pins) in enumerate(netlist.blocks):
+            block = block_classes[name](pins)
+            block.chip = name
+            block.node = self._n_nand + self._n_dff + i
+            self.blocks.append(block)
+        self._clocked = [b for b in self.blocks if b.CLOCKED]
+        self._n_nodes = self._n_nand + self._n_dff + len(self.blocks)
+
+        self._build_fanout()
+        self._levelize()
+        self._scheduled = bytearray(self._n_nodes)
+        self._buckets = [[] for _ in range(self._dff_level + 1)]
+        for node in range(self._n_nodes):
+            self._schedule(node)
+        self._settle()
+
+    @classmethod
+    def from_chip(cls, name, search_dirs=None, blocks=None):
+        return cls(Elaborator(search_dirs, blocks).netlist(name), blocks)
+
+    def _block_inputs(self, block):
+        """The nets whose changes must re-evaluate a block."""
+        return sorted({n for pin in block.COMB_INPUTS for n in block.pins[pin]})
+
+    def _block_outputs(self, block):
+        return [n for pin in block.OUTPUTS for n in block.pins[pin]]
+
+    def _build_fanout(self):
+        """Compressed fanout lists: nodes reading net n are _fanout[_fanout_start[n]:_fanout_start[n + 1]]."""
+        netlist = self.netlist
+        n_nets = netlist.n_nets
+        first_block = self._n_nand + self._n_dff
+        counts = array('i', bytes(4 * (n_nets + 1)))
+        for a, b in zip(netlist.nand_a, netlist.nand_b):
+            counts[a + 1] += 1
+            if b != a:
+                counts[b + 1] += 1
+        for net in netlist.dff_in:
+            counts[net + 1] += 1
+        for block in self.blocks:
+            for net in self._block_inputs(block):
+                counts[net + 1] += 1
+        start = array('i', accumulate(counts))
+
+        fill = array('i', start)
+        fanout = array('i', bytes(4 * start[n_nets]))
+        for node, (a, b) in enumerate(zip(netlist.nand_a, netlist.nand_b)):
+            fanout[fill[a]] = node
+            fill[a] += 1
+            if b != a:
+                fanout[fill[b]] = node
+                fill[b] += 1
+        for node, net in enumerate(netlist.dff_in, self._n_nand):
+            fanout[fill[net]] = node
+            fill[net] += 1
+        for node, block in enumerate(self.blocks, first_block):
+            for net in self._block_inputs(block):
+                fanout[fill[net]] = node
+                fill[net] += 1
+        self._fanout_start = start
+        self._fanout = fanout
+
+    def _levelize(self):
+        """Kahn's algorithm over the combinational nodes; DFFs go after the last level."""
+        netlist = self.netlist
+        n_nand, n_dff = self._n_nand, self._n_dff
+        first_block = n_nand + n_dff
+        comb_driven = bytearray(netlist.n_nets)
+        for net in netlist.nand_out:
+            comb_driven[net] = 1
+        for block in self.blocks:
+            for net in self._block_outputs(block):
+                comb_driven[net] = 1
+
+        level = array('i', bytes(4 * self._n_nodes))
+        pending = array('i', bytes(4 * self._n_nodes))
+        ready = []
+        for node, (a, b) in enumerate(zip(netlist.nand_a, netlist.nand_b)):
+            count = comb_driven[a] + (comb_driven[b] if b != a else 0)
+            pending[node] = count
+            if not count:
+                ready.append(node)
+        for node, block in enumerate(self.blocks, first_block):
+            count = sum(comb_driven[net] for net in self._block_inputs(block))
+            pending[node] = count
+            if not count:
+                ready.append(node)
+        for node in ready:
+            level[node] = 1
+
+        nand_out, start, fanout = netlist.nand_out, self._fanout_start, self._fanout
+        done = 0
+        while ready:
+            node = ready.pop()
+            done += 1
+            next_level = level[node] + 1
+            if node < n_nand:
+                outputs = (nand_out[node],)
+            else:
+                outputs = self._block_outputs(self.blocks[node - first_block])
+            for net in outputs:
+                for i in range(start[net], start[net + 1]):
+                    reader = fanout[i]
+                    if n_nand <= reader < first_block:
+                        continue
+                    if level[reader] < next_level:
+                        level[reader] = next_level
+                    pending[reader] -= 1
+                    if not pending[reader]:
+                        ready.append(reader)
+        if done != n_nand + len(self.blocks):
+            raise ValueError(f"{netlist.name} has a combinational loop")
+
+        self._dff_level = max(level) + 1 if done else 1
+        for node in range(n_nand, first_block):
+            level[node] = self._dff_level
+        self._level = level
+
+    # --- scheduling ---
+
+    def _schedule(self, node):
+        if not self._scheduled[node]:
+            self._scheduled[node] = 1
+            self._buckets[self._level[node]].append(node)
+
+    def _set_net(self, net, value):
+        """Changes a net and schedules everything reading it."""
+        if self.values[net] != value:
+            self.values[net] = value
+            for i in range(self._fanout_start[net], self._fanout_start[net + 1]):
+                self._schedule(self._fanout[i])
+
+    def drive(self, nets, value):
+        """Puts an unsigned int on a bus (used by blocks and for top-level inputs)."""
+        for bit, net in enumerate(nets):
+            self._set_net(net, (value >> bit) & 1)
+
+    def _settle(self):
+        """Propagates scheduled changes level by level until the circuit is stable."""
+        values = self.values
+        nand_a, nand_b, nand_out = self.netlist.nand_a, self.netlist.nand_b, self.netlist.nand_out
+        start, fanout = self._fanout_start, self._fanout
+        level, buckets, scheduled = self._level, self._buckets, self._scheduled
+        n_nand = self._n_nand
+        first_block = n_nand + self._n_dff
+        for current in range(1, self._dff_level):
+            bucket = buckets[current]
+            if not bucket:
+                continue
+            buckets[current] = []
+            for node in bucket:
+                scheduled[node] = 0
+                if node < n_nand:
+                    value = 0 if values[nand_a[node]] and values[nand_b[node]] else 1
+                    net = nand_out[node]
+                    if values[net] != value:
+                        values[net] = value
+                        for i in range(start[net], start[net + 1]):
+                            reader = fanout[i]
+                            if not scheduled[reader]:
+                                scheduled[reader] = 1
+                                buckets[level[reader]].append(reader)
+                else:
+                    self.blocks[node - first_block].evaluate(self)
+
+    # --- public interface ---
+
+    def set(self, pin, value):
+        """Sets a top-level input pin (call eval() or clock() to propagate)."""
+        if pin not in self.netlist.inputs:
+            raise KeyError(f"{self.netlist.name} has no input pin '{pin}'")
+        self.drive(self.netlist.pins[pin], value)
+
+    def get(self, pin):
+        """Reads a top-level pin as an unsigned int."""
+        value = 0
+        for bit, net in enumerate(self.netlist.pins[pin]):
+            if self.values[net]:
+                value |= 1 << bit
+        return value
+
+    def eval(self):
+        """Settles the combinational logic."""
+        self._settle()
+
+    def clock(self):
+        """One full clock cycle: settle, capture every DFF and clocked block, then settle again."""
+        self._settle()
+        values = self.values
+        dirty = self._buckets[self._dff_level]
+        self._buckets[self._dff_level] = []
+        updates = []
+        for node in dirty:
+            self._scheduled[node] = 0
+            i = node - self._n_nand
+            value = values[self.netlist.dff_in[i]]
+            if value != values[self.netlist.dff_out[i]]:
+                updates.append((self.netlist.dff_out[i], value))
+        for block in self._clocked:
+            block.tick(values)
+        for net, value in updates:
+            self._set_net(net, value)
+        for block in self._clocked:
+            self._schedule(block.node)
+        self._settle()
+
+    def touch(self, block):
+        """Re-evaluates a block after its state was changed from outside (e.g. ROM loaded)."""
+        self._schedule(block.node)
+
+    def block(self, name):
+        """The first behavioral block standing in for a given chip."""
+        for block in self.blocks:
+            if block.chip == name:
+                return block
+        raise KeyError(f"No {name} block in {self.netlist.name}")
@@ -0,0 +1,56 @@
+from hack_emulator import TRAP, Trap
+
+
+class IntrinsicTraps:
+    """
+    Runs OS functions natively on a HackEmulator. The entry of every function
+    `intrinsics` (an os_intrinsics.Intrinsics) implements is patched with
+    TRAP, the way the debugger patches breakpoints; when a call lands there,
+    the arguments are read from the caller's frame, the intrinsic runs
+    against emulator RAM, and the VM `return` sequence is done in Python.
+    A native call costs one cycle. `symbols` is the assembler's symbol table;
+    compiled OS labels may be lowercase ('math.multiply', as in Pong.asm).
+    """
+
+    def __init__(self, emulator, symbols, intrinsics):
+        self.emulator = emulator
+        self.intrinsics = intrinsics
+        self.names = {}       # patched ROM address -> intrinsic name
+        self._original = {}
+        for name in intrinsics.table:
+            address = symbols.get(name, symbols.get(name.lower()))
+            if address is not None:
+                self.names[address] = name
+                self._original[address] = emulator._code[address]
+                emulator._code[address] = TRAP
+
+    def uninstall(self):
+        for address, op in self._original.items():
+            self.emulator._code[address] = op
+        self.names = {}
+        self._original = {}
+
+    def _native_call(self, name):
+        """At a function's entry LCL == SP and the frame below it is the caller's; return through it."""
+        emulator = self.emulator
+        ram = emulator.ram
+        frame, arg = ram[1], ram[2]
+        result = self.intrinsics.call(name, ram, list(ram[arg:frame - 5]))
+        emulator.PC = ram[frame - 5]  # before the result lands on it, as with no arguments
+        ram[arg] = result
+        ram[0] = arg + 1
+        ram[4], ram[3], ram[2], ram[1] = ram[frame - 1], ram[frame - 2], ram[frame - 3], ram[frame - 4]
+        emulator.cycles += 1
+
+    def run(self, cycles):
+        """HackEmulator.run() with intrinsics; other traps (breakpoints) propagate."""
+        emulator = self.emulator
+        end = emulator.cycles + cycles
+        while emulator.cycles < end:
+            try:
+                emulator.run(end - emulator.cycles)
+            except Trap:
+                name = self.names.get(emulator.PC)
+                if name is None:
+                    raise
+                self._native_call(name)
@@ -0,0 +1,115 @@
+import struct
+import time
+from collections import namedtuple
+
+from hack_emulator import KBD
+
+# The KBD word becomes `key` once the emulator has run `cycle` instructions (0 = released)
+KeyEvent = namedtuple('KeyEvent', 'cycle key')
+ReplayResult = namedtuple('ReplayResult', 'cycles reason events_fed seconds')
+
+# --- Part 1: Trace Files ---
+# "HKEY", a version byte, then one record per event: cycles since the previous
+# event (uint32) and the key code (uint16), little-endian. Six bytes an event.
+TRACE_MAGIC = b'HKEY\x01'
+_RECORD = struct.Struct('<IH')
+
+
+def save_trace(path, events):
+    previous = 0
+    with open(path, 'wb') as f:
+        f.write(TRACE_MAGIC)
+        for event in sorted(events, key=lambda e: e.cycle):
+            f.write(_RECORD.pack(event.cycle - previous, event.key))
+            previous = event.cycle
+
+
+def load_trace(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(TRACE_MAGIC):
+        raise ValueError(f"{path} is not a key trace")
+    body = memoryview(data)[len(TRACE_MAGIC):]
+    if len(body) % _RECORD.size:
+        raise ValueError(f"{path} is truncated")
+    events = []
+    cycle = 0
+    for delta, key in _RECORD.iter_unpack(body):
+        cycle += delta
+        events.append(KeyEvent(cycle, key))
+    return events
+
+
+class KeyRecorder:
+    """Presses keys on an emulator during a live run and remembers when, for replay()."""
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.events = []
+
+    def press(self, key):
+        if key != self.emulator.ram[KBD]:
+            self.emulator.ram[KBD] = key
+            self.events.append(KeyEvent(self.emulator.cycles, key))
+
+    def release(self):
+        self.press(0)
+
+    def save(self, path):
+        save_trace(path, self.events)
+
+
+# --- Part 2: Stop Conditions ---
+# Each returns the reason to stop, or None to keep going.
+def stop_at_cycle(limit):
+    return lambda emulator: 'cycle limit' if emulator.cycles >= limit else None
+
+
+def stop_on_ram(address, value):
+    return lambda emulator: f"RAM[{address}] == {value}" if emulator.ram[address] == value else None
+
+
+def stop_when_halted():
+    """The program parked itself in a `(END) @END 0;JMP` loop."""
+    return lambda emulator: 'halted' if emulator.halted() else None
+
+
+# --- Part 3: Replay ---
+def replay(emulator, events, stop_conditions, check_every=1000):
+    """
+    Runs the emulator with the KBD word following `events`. Events land on
+    their exact cycle; stop conditions are checked every `check_every` cycles,
+    so the emulator's fast loop runs undisturbed in between and a replay
+    always stops on the same cycle.
+    """
+    if not stop_conditions:
+        raise ValueError("replay needs at least one stop condition")
+    events = sorted(events, key=lambda e: e.cycle)  # stable: same-cycle events keep their order
+    fed = 0
+    reason = None
+    start = time.perf_counter()
+    while reason is None:
+        next_check = (emulator.cycles // check_every + 1) * check_every
+        while fed < len(events) and events[fed].cycle <= emulator.cycles:
+            emulator.ram[KBD] = events[fed].key
+            fed += 1
+        until = min(next_check, events[fed].cycle) if fed < len(events) else next_check
+        emulator.run(until - emulator.cycles)
+        if emulator.cycles == next_check:
+            for condition in stop_conditions:
+                reason = condition(emulator)
+                if reason:
+                    break
+    return ReplayResult(emulator.cycles, reason, fed, time.perf_counter() - start)
+
+
+def benchmark_replay(make_emulator, events, stop_conditions, repeats=3, check_every=1000):
+    """
+    Replays the same trace on fresh emulators and returns the fastest run, so a
+    recorded session doubles as a repeatable performance benchmark. Raises if
+    the runs don't all stop on the same cycle.
+    """
+    results = [replay(make_emulator(), events, stop_conditions, check_every) for _ in range(repeats)]
+    if len({(r.cycles, r.reason) for r in results}) != 1:
+        raise RuntimeError(f"replay is not deterministic: {results}")
+    return min(results, key=lambda r: r.seconds)
@@ -0,0 +1,176 @@
+import hashlib
+import marshal
+import os
+import sys
+
+from hdl_simulator import Elaborator, HDLSimulator, nand_order
+
+# Bump when the generated code changes shape, so stale cache entries are ignored
+GENERATOR_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'netlists')
+
+
+# --- Part 1: Code Generation ---
+def generate_source(netlist, func_name='evaluate'):
+    """
+    Straight-line Python for a netlist's combinational cone: one local per net
+    and one bitwise expression per Nand, in topological order. The function
+    takes the input pins positionally (declaration order) as unsigned ints and
+    returns a tuple of the output pins. With DFFs, it also takes the DFF
+    outputs packed into one int (DFF k is bit k) as a last argument and
+    returns their next values, the DFF inputs, packed the same way last.
+    """
+    if netlist.blocks:
+        raise ValueError(f"{netlist.name} has behavioral blocks")
+    args = [f"i{k}" for k in range(len(netlist.inputs))]
+    if len(netlist.dff_out):
+        args.append('state')
+    lines = [f"def {func_name}({', '.join(args)}):",
+             f"    # {netlist.name}: {len(netlist.nand_out)} nands, {len(netlist.dff_out)} DFFs",
+             "    n0 = 0",
+             "    n1 = 1"]
+    for arg, pin in zip(args, netlist.inputs):
+        for bit, net in enumerate(netlist.pins[pin]):
+            shifted = f"({arg} >> {bit})" if bit else arg
+            lines.append(f"    n{net} = {shifted} & 1")
+    # the state goes through a binary string: linear in the DFF count, where
+    # shifting a RAM's 8192-bit state once per DFF would be quadratic
+    n_dff = len(netlist.dff_out)
+    if n_dff:
+        lines.append(f"    bits = format(state, '0{n_dff}b').encode()")
+    for k, net in enumerate(netlist.dff_out):
+        lines.append(f"    n{net} = bits[{n_dff - 1 - k}] & 1")
+    for g in nand_order(netlist):
+        a, b, out = netlist.nand_a[g], netlist.nand_b[g], netlist.nand_out[g]
+        if a == b:
+            lines.append(f"    n{out} = n{a} ^ 1")
+        else:
+            lines.append(f"    n{out} = (n{a} & n{b}) ^ 1")
+    results = []
+    for pin in netlist.outputs:
+        terms = [f"n{net} << {bit}" if bit else f"n{net}" for bit, net in enumerate(netlist.pins[pin])]
+        results.append(' | '.join(terms))
+    if n_dff:
+        # one flat tuple, not a chain of | that nests too deep to compile
+        nets = ', '.join(f"n{net}" for net in reversed(netlist.dff_in))
+        lines.append(f"    next_state = int(''.join(map(str, ({nets},))), 2)")
+        results.append('next_state')
+    lines.append(f"    return ({', '.join(results)},)")
+    return '\n'.join(lines) + '\n'
+
+
+def compile_netlist(netlist, func_name='evaluate'):
+    """The code object of the module defining `func_name` for a netlist."""
+    return compile(generate_source(netlist, func_name), f"<netlist {netlist.name}>", 'exec')
+
+
+# --- Part 2: Disk Cache ---
+def chip_hash(name, elaborator):
+    """
+    Hash of the parsed definition of every chip in the hierarchy (so chips
+    added with Elaborator.define count too, and comments don't), which
+    block class stands in for each, plus the generator version.
+    """
+    h = hashlib.sha256(f"{name}:{GENERATOR_VERSION}".encode())
+    for chip, chip_def in sorted(elaborator.hierarchy(name).items()):
+        block = elaborator.block_class(chip)
+        h.update(repr((chip_def, block and f"{block.__module__}.{block.__qualname__}")).encode())
+    return h.hexdigest()
+
+
+def _cache_path(cache_dir, name, digest):
+    return os.path.join(cache_dir, f"{name}-{digest[:16]}.{sys.implementation.cache_tag}.bin")
+
+
+def _load_cached(path):
+    try:
+        with open(path, 'rb') as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _store_cached(path, code):
+    """Writes via a temp file and rename so concurrent builds never see half a file."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            marshal.dump(code, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # the cache is an optimization; a read-only tree still works
+
+
+# --- Part 3: Evaluators ---
+class CompiledChip:
+    """
+    A chip's combinational cone as a generated Python function. A chip with
+    DFFs keeps their outputs in `state`, and clock() latches the DFF inputs
+    computed by the last call, like HDLSimulator.clock().
+    """
+
+    def __init__(self, netlist, code, from_cache=False):
+        self.netlist = netlist
+        self.name = netlist.name
+        self.from_cache = from_cache
+        namespace = {}
+        exec(code, namespace)
+        # positional ints in, tuple of ints out: the fast path for tight loops
+        self.function = namespace['evaluate']
+        self.sequential = len(netlist.dff_out) > 0
+        self.state = 0
+        self._next_state = 0
+        if self.sequential:
+            self({})
+
+    def __call__(self, inputs):
+        """Evaluates {input pin: value} and returns {output pin: value}."""
+        args = [inputs.get(pin, 0) for pin in self.netlist.inputs]
+        if not self.sequential:
+            return dict(zip(self.netlist.outputs, self.function(*args)))
+        *result, self._next_state = self.function(*args, self.state)
+        return dict(zip(self.netlist.outputs, result))
+
+    def clock(self):
+        self.state = self._next_state
+
+
+class InterpretedChip:
+    """The same calling convention backed by the event-driven simulator."""
+
+    def __init__(self, netlist, blocks=None):
+        self.netlist = netlist
+        self.name = netlist.name
+        self.simulator = HDLSimulator(netlist, blocks)
+
+    def __call__(self, inputs):
+        for pin in self.netlist.inputs:
+            self.simulator.set(pin, inputs.get(pin, 0))
+        self.simulator.eval()
+        return {pin: self.simulator.get(pin) for pin in self.netlist.outputs}
+
+    def clock(self):
+        self.simulator.clock()
+
+
+def compile_chip(name, elaborator=None, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Returns a CompiledChip, loading the code object from cache_dir when the
+    chip's HDL hasn't changed (cache_dir=None disables the cache). DFFs
+    (Bit, Register, PC, the CPU's registers...) are sources of the compiled
+    cone and latched in Python on clock(). Chips with behavioral blocks fall
+    back to an InterpretedChip.
+    """
+    elaborator = elaborator or Elaborator()
+    netlist = elaborator.netlist(name)
+    if netlist.blocks:
+        return InterpretedChip(netlist, {block: elaborator.block_class(block) for block, _ in netlist.blocks})
+    path = _cache_path(cache_dir, name, chip_hash(name, elaborator)) if cache_dir else None
+    code = _load_cached(path) if path else None
+    if code is not None:
+        return CompiledChip(netlist, code, from_cache=True)
+    code = compile_netlist(netlist)
+    if path:
+        _store_cached(path, code)
+    return CompiledChip(netlist, code)
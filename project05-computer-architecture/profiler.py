@@ -0,0 +1,151 @@
+import os
+import re
+from collections import namedtuple
+
+# First words of the whole-line `// <vm command>` comments the VM translator writes
+VM_COMMANDS = frozenset(['push', 'pop', 'add', 'sub', 'neg', 'eq', 'gt', 'lt', 'and', 'or', 'not',
+                         'label', 'goto', 'if-goto', 'function', 'call', 'return'])
+# A data block's comment covers a whole run of array stores: "data: k array stores, n commands, ..."
+DATA_RUN_COMMENT = re.compile(r'data: \d+ array stores, (\d+) commands')
+
+# Where one ROM word came from: the last label above it, the VM function and
+# VM command it was translated from, and that command's index in the .vm file
+AsmOrigin = namedtuple('AsmOrigin', 'label vm_function vm_command vm_index')
+
+
+# --- Part 1: Attribution ---
+def _is_function_label(label):
+    """Class.name labels mark function entries in translator output (Pong.asm and ours)."""
+    return '.' in label and '$' not in label and not label.startswith('RET_ADDRESS')
+
+
+def asm_origins(lines):
+    """
+    Walks .asm lines the way first_pass_for_labels counts ROM addresses and
+    returns one AsmOrigin per ROM word, so origins[pc] explains pc. A block
+    standing for several VM commands (a data run, a tail call) is credited
+    to the first of them.
+    """
+    origins = []
+    label = vm_function = vm_command = None
+    vm_index, next_index = -1, 0
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('//'):
+            words = stripped[2:].split()
+            if words and (words[0] in VM_COMMANDS or words[0] == 'data:'):
+                vm_command = ' '.join(words)
+                vm_index = next_index
+                # a tail call's comment is "call f n / return (tail call)"
+                data_run = DATA_RUN_COMMENT.match(vm_command)
+                next_index += int(data_run.group(1)) if data_run else 1 + vm_command.count(' / ')
+                if words[0] == 'function' and len(words) > 1:
+                    vm_function = words[1]
+            else:
+                vm_command = None  # e.g. the translator's "// Infinite loop at the end"
+            continue
+        clean = line.split('//')[0].strip()
+        if not clean:
+            continue
+        if clean.startswith('('):
+            label = clean[1:-1]
+            if _is_function_label(label):
+                vm_function = label
+            continue
+        origins.append(AsmOrigin(label, vm_function, vm_command, vm_index if vm_command else None))
+    return origins
+
+
+def vm_code_lines(vm_path):
+    """(line number, command) for each command of a .vm file, in order: the vm_index lookup."""
+    lines = []
+    with open(vm_path) as f:
+        for number, line in enumerate(f, 1):
+            command = line.split('//')[0].strip()
+            if command:
+                lines.append((number, command))
+    return lines
+
+
+# --- Part 2: Reports ---
+class Profile:
+    """Execution counts from HackEmulator.enable_profiling(), grouped by origin."""
+
+    def __init__(self, counters, origins, vm_lines=None, vm_name='vm'):
+        self.counters = counters
+        self.origins = origins
+        self.vm_lines = vm_lines
+        self.vm_name = vm_name
+
+    @property
+    def total(self):
+        return sum(self.counters)
+
+    def by_address(self):
+        counts = [(pc, n) for pc, n in enumerate(self.counters) if n]
+        return sorted(counts, key=lambda item: -item[1])
+
+    def _group(self, key):
+        totals = {}
+        for pc, n in enumerate(self.counters):
+            if n:
+                origin = self.origins[pc] if pc < len(self.origins) else None
+                name = key(origin) if origin else None
+                totals[name] = totals.get(name, 0) + n
+        return sorted(totals.items(), key=lambda item: -item[1])
+
+    def by_label(self):
+        return self._group(lambda o: o.label)
+
+    def by_vm_function(self):
+        return self._group(lambda o: o.vm_function)
+
+    def by_vm_line(self):
+        """Cycles per VM command, as 'file:line command' when the .vm lines are known."""
+        def name(origin):
+            if origin.vm_index is None:
+                return None
+            if self.vm_lines and origin.vm_index < len(self.vm_lines):
+                number, command = self.vm_lines[origin.vm_index]
+                return f"{self.vm_name}:{number} {command}"
+            return f"#{origin.vm_index} {origin.vm_command}"
+        return self._group(name)
+
+    def by_source(self, source_map):
+        """
+        Cycles per 'file:line' through a SourceMap of ROM addresses, e.g. the
+        assembler's map composed with the VM translator's; no text is re-parsed.
+        """
+        totals = {}
+        for pc, n in enumerate(self.counters):
+            if n:
+                found = source_map.lookup(pc)
+                name = f"{found[0]}:{found[1]}" if found else None
+                totals[name] = totals.get(name, 0) + n
+        return sorted(totals.items(), key=lambda item: -item[1])
+
+    def report(self, top=10):
+        total = self.total or 1
+        sections = [('label', self.by_label()), ('VM function', self.by_vm_function()),
+                    ('VM line', self.by_vm_line())]
+        lines = [f"{self.total:,} instructions"]
+        for title, rows in sections:
+            if all(name is None for name, _ in rows):
+                continue
+            lines.append(f"\nhottest by {title}:")
+            for name, n in rows[:top]:
+                lines.append(f"  {n:>12,} {n / total:6.1%}  {name or '?'}")
+        return '\n'.join(lines)
+
+
+def profile_program(emulator, asm_lines, cycles, vm_path=None):
+    """Runs `cycles` instructions with profiling on and returns the Profile."""
+    emulator.enable_profiling()
+    try:
+        emulator.run(cycles)
+    finally:
+        counters = emulator.counters
+        emulator.disable_profiling()
+    vm_lines = vm_code_lines(vm_path) if vm_path else None
+    return Profile(counters, asm_origins(asm_lines), vm_lines,
+                   vm_name=os.path.basename(vm_path) if vm_path else 'vm')
@@ -0,0 +1,97 @@
+import struct
+import sys
+import zlib
+from array import array
+from collections import namedtuple
+
+from hack_emulator import RAM_WORDS
+
+# --- Part 1: Snapshots ---
+# RAM is kept as a tuple of immutable PAGE_WORDS-word pages (bytes, in the
+# machine's byte order). A snapshot taken against a base reuses the base's
+# page objects wherever RAM still matches them, so a run of snapshots of one
+# program stores each changed page once. The run loop writes RAM directly
+# and can't mark pages dirty without slowing every instruction, so "changed"
+# is found by comparing pages (memcmp, a few microseconds for all of RAM).
+PAGE_WORDS = 512
+PAGE_BYTES = 2 * PAGE_WORDS
+PAGES = RAM_WORDS // PAGE_WORDS
+
+# rom: crc32 of the ROM it was taken with, checked on restore
+Snapshot = namedtuple('Snapshot', 'A D PC cycles rom pages')
+
+
+def snapshot(emulator, base=None):
+    """The emulator's registers, cycle count and RAM, sharing unchanged pages with `base`."""
+    ram = emulator.ram.tobytes()
+    pages = []
+    for i in range(PAGES):
+        page = ram[i * PAGE_BYTES:(i + 1) * PAGE_BYTES]
+        pages.append(base.pages[i] if base is not None and page == base.pages[i] else page)
+    return Snapshot(emulator.A, emulator.D, emulator.PC, emulator.cycles,
+                    zlib.crc32(emulator.rom), tuple(pages))
+
+
+def restore(emulator, snap):
+    """
+    Puts the emulator back in `snap`'s state, in place (emulator.ram stays the
+    same array, so screen views and patched traps survive), writing only the
+    pages that differ. Returns the number of pages written. Raises ValueError
+    if a different program is loaded.
+    """
+    if zlib.crc32(emulator.rom) != snap.rom:
+        raise ValueError("snapshot was taken with a different ROM")
+    ram, window = emulator.ram.tobytes(), memoryview(emulator.ram).cast('B')
+    written = 0
+    for i, page in enumerate(snap.pages):
+        start = i * PAGE_BYTES
+        if ram[start:start + PAGE_BYTES] != page:
+            window[start:start + PAGE_BYTES] = page
+            written += 1
+    emulator.A, emulator.D, emulator.PC, emulator.cycles = snap.A, snap.D, snap.PC, snap.cycles
+    return written
+
+
+def shared_pages(snap, other):
+    """How many pages two snapshots hold as the same object."""
+    return sum(a is b for a, b in zip(snap.pages, other.pages))
+
+
+# --- Part 2: Snapshot Files ---
+# "HSNP", a version byte, A, D, PC (uint16), cycles (uint64), the ROM's
+# crc32 (uint32), then all of RAM zlib-compressed as little-endian words.
+SNAPSHOT_MAGIC = b'HSNP\x01'
+_HEADER = struct.Struct('<HHHQI')
+
+
+def save_snapshot(path, snap):
+    words = array('H', b''.join(snap.pages))
+    if sys.byteorder == 'big':
+        words.byteswap()
+    with open(path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(_HEADER.pack(snap.A, snap.D, snap.PC, snap.cycles, snap.rom))
+        f.write(zlib.compress(words.tobytes(), 1))
+
+
+def load_snapshot(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(SNAPSHOT_MAGIC):
+        raise ValueError(f"{path} is not an emulator snapshot")
+    header = data[len(SNAPSHOT_MAGIC):len(SNAPSHOT_MAGIC) + _HEADER.size]
+    if len(header) < _HEADER.size:
+        raise ValueError(f"{path} is truncated")
+    A, D, PC, cycles, rom = _HEADER.unpack(header)
+    try:
+        raw = zlib.decompress(data[len(SNAPSHOT_MAGIC) + _HEADER.size:])
+    except zlib.error:
+        raise ValueError(f"{path} is truncated") from None
+    if len(raw) != 2 * RAM_WORDS:
+        raise ValueError(f"{path} is truncated")
+    words = array('H', raw)
+    if sys.byteorder == 'big':
+        words.byteswap()
+    raw = words.tobytes()
+    pages = tuple(raw[i * PAGE_BYTES:(i + 1) * PAGE_BYTES] for i in range(PAGES))
+    return Snapshot(A, D, PC, cycles, rom, pages)
@@ -1,5 +1,8 @@
+import os
 import sys
 
+from sourcemap import SourceMap
+
 # --- Part 1: Constants and Translation Maps ---
 # These maps are the "knowledge base" for C-instruction translation.
 COMP_MAP = {
@@ -14,6 +17,15 @@ COMP_MAP = {
 DEST_MAP = {'null':'000', 'M':'001', 'D':'010', 'MD':'011', 'A':'100', 'AM':'101', 'AD':'110', 'AMD':'111'}
 JUMP_MAP = {'null':'000', 'JGT':'001', 'JEQ':'010', 'JGE':'011', 'JLT':'100', 'JNE':'101', 'JLE':'110', 'JMP':'111'}
 
+# The platform's limits: 32K words of ROM, 15-bit A-instruction constants, and
+# variables from RAM 16 up to the screen. The VM translator's output keeps
+# its variables (VM statics) in 16-255, below the stack.
+ROM_WORDS = 32768
+MAX_CONSTANT = 0x7FFF
+VARIABLE_BASE = 16
+VARIABLE_END = 256
+SCREEN_BASE = 16384
+
 # --- Part 2: Symbol Table Management ---
 def initialize_symbol_table():
     """Creates the symbol table and fills it with predefined symbols."""
@@ -45,33 +57,45 @@ def parse_c_instruction(line):
     return {'dest': dest, 'comp': comp, 'jump': jump}
 
 # --- Part 4: Translation Functions ---
-def translate_a_instruction(symbol, symbol_table, ram_address_counter):
-    """Translates a parsed A-instruction into binary."""
+def translate_a_instruction(symbol, symbol_table, ram_address_counter, variable_end=SCREEN_BASE):
+    """Translates a parsed A-instruction into binary. Raises ValueError for a
+    constant over 15 bits or a variable at variable_end or above (the screen;
+    VARIABLE_END, the stack, for translator output)."""
     if symbol.isdigit():
         address = int(symbol)
+        if address > MAX_CONSTANT:
+            raise ValueError(f"@{symbol} doesn't fit in an A-instruction (15 bits, at most {MAX_CONSTANT})")
     else:
         if symbol not in symbol_table:
+            if ram_address_counter >= variable_end:
+                raise ValueError(f"no RAM for variable {symbol}: variables {VARIABLE_BASE}-{variable_end - 1} "
+                                 f"are all taken")
             symbol_table[symbol] = ram_address_counter
             ram_address_counter += 1
         address = symbol_table[symbol]
     return f'0{address:015b}', ram_address_counter
 
 def translate_c_instruction(parts):
-    """Translates parsed C-instruction parts into binary."""
+    """Translates parsed C-instruction parts into binary. Raises ValueError for an unknown comp, dest or jump."""
+    for field, table in (('comp', COMP_MAP), ('dest', DEST_MAP), ('jump', JUMP_MAP)):
+        if parts[field] not in table:
+            raise ValueError(f"unknown {field} '{parts[field]}'")
     comp_bits = COMP_MAP[parts['comp']]
     dest_bits = DEST_MAP[parts['dest']]
     jump_bits = JUMP_MAP[parts['jump']]
     return f'111{comp_bits}{dest_bits}{jump_bits}'
 
 # --- Part 5: The Two Passes ---
-def first_pass_for_labels(lines):
+def first_pass_for_labels(lines, source_map=None, file_id=0):
     """
     Builds the symbol table for labels and returns a list of clean instructions.
+    If a SourceMap is given, each ROM address is mapped to its 1-based .asm line.
+    Raises ValueError if the program needs more than ROM_WORDS.
     """
     symbol_table = initialize_symbol_table()
     clean_instructions = []
     rom_address = 0
-    for line in lines:
+    for line_number, line in enumerate(lines, 1):
         clean_line = line.split('//')[0].strip()
         if not clean_line:
             continue
@@ -81,23 +105,28 @@ def first_pass_for_labels(lines):
             symbol_table[clean_line[1:-1]] = rom_address
         else:
             clean_instructions.append(clean_line)
+            if source_map is not None:
+                source_map.add(rom_address, file_id, line_number)
             rom_address += 1
+    if rom_address > ROM_WORDS:
+        raise ValueError(f"program needs {rom_address} ROM words, more than {ROM_WORDS}")
             
     return clean_instructions, symbol_table
 
-def second_pass_for_translation(instructions, symbol_table):
+def second_pass_for_translation(instructions, symbol_table, variable_end=SCREEN_BASE):
     """
-    Translates a clean list of instructions into binary code.
+    Translates a clean list of instructions into binary code. Variables go
+    from RAM 16 up to variable_end (pass VARIABLE_END for translator output).
     """
     binary_code = []
-    next_ram_address = 16 # Variables are allocated from RAM address 16
+    next_ram_address = VARIABLE_BASE # Variables are allocated from RAM address 16
     
     for instruction in instructions:
         instr_type = classify_instruction(instruction)
         
         if instr_type == 'A_INSTRUCTION':
             symbol = parse_a_instruction(instruction)
-            binary_line, next_ram_address = translate_a_instruction(symbol, symbol_table, next_ram_address)
+            binary_line, next_ram_address = translate_a_instruction(symbol, symbol_table, next_ram_address, variable_end)
             binary_code.append(binary_line)
             
         elif instr_type == 'C_INSTRUCTION':
@@ -108,8 +137,11 @@ def second_pass_for_translation(instructions, symbol_table):
     return binary_code
 
 # --- Part 6: Main Orchestrator ---
-def assemble(input_file):
-    """Orchestrates the two-pass assembly process."""
+def assemble(input_file, write_source_map=False):
+    """
+    Orchestrates the two-pass assembly process. With write_source_map, the
+    ROM address -> .asm line map is saved next to the .hack as .hackmap.
+    """
     try:
         with open(input_file, 'r') as f:
             lines = f.readlines()
@@ -118,7 +150,9 @@ def assemble(input_file):
         return
 
     # Pass 1: Handle labels and clean the code
-    instructions, symbol_table = first_pass_for_labels(lines)
+    source_map = SourceMap() if write_source_map else None
+    file_id = source_map.file_id(os.path.basename(input_file)) if write_source_map else 0
+    instructions, symbol_table = first_pass_for_labels(lines, source_map, file_id)
     
     # Pass 2: Translate instructions to binary
     binary_code = second_pass_for_translation(instructions, symbol_table)
@@ -128,6 +162,8 @@ def assemble(input_file):
     with open(output_file, 'w') as f:
         f.write('\n'.join(binary_code))
         f.write('\n')
+    if source_map is not None:
+        source_map.save(input_file.replace('.asm', '.hackmap'))
         
     print(f"Assembly successful. Output written to {output_file}")
 
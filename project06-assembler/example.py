@@ -1,5 +1,5 @@
 """
-tests for HackAssembler.py
+tests for HackAssembler.py, sourcemap.py, linker.py and layout.py
 run: python3 example.py
 """
 
@@ -15,7 +15,11 @@ from HackAssembler import (
     translate_c_instruction,
     first_pass_for_labels,
     second_pass_for_translation,
+    VARIABLE_END,
 )
+from sourcemap import SourceMap
+from linker import LOCAL, STATIC, SYMBOL, HackObject, assemble_object, link
+from layout import asm_layout, format_layout, linked_layout
 
 PASS = 0
 FAIL = 0
@@ -211,6 +215,115 @@ def test_assemble_rect():
     print(f"    assembled {len(binary)} instructions")
 
 
+def test_source_map():
+    print("  source maps: ranges, binary roundtrip, assembler map")
+    sm = SourceMap()
+    a, b = sm.file_id('A.vm'), sm.file_id('B.vm')
+    check("file ids", (a, b, sm.file_id('A.vm')), (0, 1, 0))
+    sm.add(0, a, 10)
+    sm.add(3, a, 10)   # same line again: no new entry
+    sm.add(5, b, 2)
+    sm.add(9, a, 11)
+    check("runs collapse", len(sm), 3)
+    check("lookup inside a range", sm.lookup(4), ('A.vm', 10))
+    check("lookup at a boundary", (sm.lookup(5), sm.lookup(100)), (('B.vm', 2), ('A.vm', 11)))
+    data = sm.encode()
+    check("3 bytes an entry after the header", len(data), len('HSMAP\x01') + 1 + 2 * 5 + 1 + 3 * 3)
+    check("roundtrip", list(SourceMap.decode(data).entries()), list(sm.entries()))
+
+    program = ['// comment\n', '@R0\n', 'D=M\n', '(LOOP)\n', '  D=D-1\n', '@LOOP\n', 'D;JGT\n']
+    rom_map = SourceMap()
+    first_pass_for_labels(program, rom_map, rom_map.file_id('Loop.asm'))
+    check("ROM 2 is line 5", rom_map.lookup(2), ('Loop.asm', 5))
+    check("one entry per instruction", len(rom_map), 5)
+
+
+def test_linker():
+    print("  relocatable objects and the linker")
+    this_dir = os.path.dirname(__file__)
+    with open(os.path.join(this_dir, 'Pong.asm')) as f:
+        pong = f.read().splitlines()
+    instructions, table = first_pass_for_labels(pong)
+    whole = [int(word, 2) for word in second_pass_for_translation(instructions, table)]
+    obj = HackObject.decode(assemble_object(pong, 'Pong').encode())
+    check("one object links to what assemble() makes", list(link([obj]).code), whole)
+
+    main = ['(Main.main)', '@Main.0', 'M=1', '@count', 'M=M+1', '@Lib.twice', '0;JMP', '(END)', '@END', '0;JMP']
+    lib = ['(Lib.twice)', '@Lib.0', 'D=M', '@count', 'M=D+M', '(END)', '@END', '0;JMP']
+    main_obj, lib_obj = assemble_object(main, 'Main', 'abc'), assemble_object(lib, 'Lib')
+    check("exports", (main_obj.exports, lib_obj.exports), ({'Main.main': 0}, {'Lib.twice': 0}))
+    check("imports", main_obj.imports(), ['Lib.twice', 'count'])
+    check("statics", main_obj.statics(), ['Main.0'])
+    check("relocation kinds", [r.kind for r in main_obj.relocations], [STATIC, SYMBOL, SYMBOL, LOCAL])
+    copy = HackObject.decode(main_obj.encode())
+    check("roundtrip", (copy.module, copy.source_hash, list(copy.code), copy.exports, copy.relocations),
+          (main_obj.module, 'abc', list(main_obj.code), main_obj.exports, main_obj.relocations))
+
+    program = link([main_obj, lib_obj])
+    check("Lib after Main in ROM", program.symbols, {'Main.main': 0, 'Lib.twice': 8})
+    check("statics and shared variables from 16", program.variables, {'Main.0': 16, 'count': 17, 'Lib.0': 18})
+    check("call patched", program.code[4], 8)
+    check("each END stays local", (program.code[6], program.code[12]), (6, 12))
+    for objects, message in [([main_obj], 'Lib.twice'), ([main_obj, lib_obj, lib_obj], 'more than one')]:
+        try:
+            link(objects)
+            check(f"link error: {message}", False, True)
+        except ValueError as e:
+            check(f"link error: {message}", message in str(e), True)
+
+
+def expect_error(name, action, message):
+    try:
+        action()
+        check(name, False, True)
+    except ValueError as e:
+        check(name, message in str(e), True)
+
+
+def test_layout():
+    print("  ROM/RAM layout and budget errors")
+    with open(os.path.join(os.path.dirname(__file__), 'Pong.asm')) as f:
+        pong = f.read().splitlines()
+    layout = asm_layout(pong)
+    check("Pong ROM", layout.rom_words, 27483)
+    check("functions cover the ROM", sum(words for _, _, words in layout.functions), 27483)
+    check("classes cover the ROM", sum(layout.classes.values()), 27483)
+    check("loop labels aren't functions", [name for name, _, _ in layout.functions if name.startswith('LOOP_')], [])
+    check("largest function", max(layout.functions, key=lambda f: f[2])[0], 'output.initmap')
+    check("statics per class", {owner: len(names) for owner, names in layout.statics.items()},
+          {'ponggame': 1, 'math': 2, 'memory': 1, 'output': 7, 'screen': 3})
+    report = format_layout(layout, top=3)
+    check("budget lines", report.splitlines()[:2], ['ROM         27483 / 32768   84%', 'statics        14 / 240      6%'])
+
+    main = ['(Main.main)', '@Main.0', 'M=1', '@Lib.f', '0;JMP', '(Lib.f)', '@i', 'M=0']
+    linked = linked_layout(link([assemble_object(main[:5], 'Main'), assemble_object(main[5:], 'Lib')]))
+    check("linked layout", (linked.functions, linked.classes), ([('Main.main', 0, 4), ('Lib.f', 4, 2)],
+                                                                 {'Main': 4, 'Lib': 2}))
+    check("linked statics", linked.statics, {'Main': [('Main.0', 16)], '(variables)': [('i', 17)]})
+
+    # every overflow is an error, not a silently wrong program
+    expect_error("15-bit constant", lambda: second_pass_for_translation(['@32768'], initialize_symbol_table()),
+                 "doesn't fit")
+    expect_error("15-bit constant in an object", lambda: assemble_object(['@40000'], 'Big'), "doesn't fit")
+    many = [f'@v{i}' for i in range(241)]
+    second_pass_for_translation(many[:240], initialize_symbol_table(), VARIABLE_END)
+    expect_error("241st variable in translator output",
+                 lambda: second_pass_for_translation(many, initialize_symbol_table(), VARIABLE_END),
+                 'no RAM for variable v240')
+    check("plain .asm: 241 variables assemble", second_pass_for_translation(many, initialize_symbol_table())[-1],
+          f'0{256:015b}')
+    everything = [f'@v{i}' for i in range(16384 - 16 + 1)]
+    expect_error("variable over the screen", lambda: second_pass_for_translation(everything, initialize_symbol_table()),
+                 'no RAM for variable v16368')
+    expect_error("241st static when linking", lambda: link([assemble_object([f'@Big.{i}' for i in range(241)], 'Big')]),
+                 'no RAM for Big.240')
+    expect_error("ROM overflow", lambda: first_pass_for_labels(['D=0'] * 32769), 'more than 32768')
+    expect_error("unknown comp", lambda: translate_c_instruction(parse_c_instruction('D=Q')), "unknown comp 'Q'")
+    expect_error("unknown jump", lambda: translate_c_instruction(parse_c_instruction('D=M;JXX')), "unknown jump 'JXX'")
+    expect_error("unknown dest", lambda: assemble_object(['X=1'], 'Bad'), "unknown dest 'X'")
+    check("a full ROM is fine", len(first_pass_for_labels(['D=0'] * 32768)[0]), 32768)
+
+
 if __name__ == '__main__':
     print("=== project 6: assembler tests ===\n")
     test_symbol_table()
@@ -222,5 +335,8 @@ if __name__ == '__main__':
     test_first_pass()
     test_assemble_mult()
     test_assemble_rect()
+    test_source_map()
+    test_linker()
+    test_layout()
     print(f"\n{PASS} passed, {FAIL} failed")
     sys.exit(1 if FAIL else 0)
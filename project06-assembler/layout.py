@@ -0,0 +1,87 @@
+import re
+import sys
+from collections import namedtuple
+
+from HackAssembler import (ROM_WORDS, VARIABLE_BASE, VARIABLE_END, first_pass_for_labels,
+                           initialize_symbol_table, second_pass_for_translation)
+from linker import STATIC_NAME
+
+# --- Part 1: The Layout ---
+# functions: (name, first ROM address, words) in ROM order, a function
+# running up to the next one (code before the first is '(startup)');
+# classes: class -> ROM words; statics: class -> [(static, RAM address)];
+# variables: every RAM symbol -> address; labels: how many ROM labels there are
+Layout = namedtuple('Layout', 'rom_words functions classes statics variables labels')
+
+# VM functions compile to Class.name labels (lowercase in some compilers' output, as in Pong.asm)
+FUNCTION_LABEL = re.compile(r'^[A-Za-z]\w*\.[A-Za-z]\w*$')
+STARTUP = '(startup)'
+
+
+def _function_entries(labels):
+    """Function labels by address, leaving out helpers named after one (LOOP_math.divide is inside math.divide)."""
+    names = {name for name in labels if FUNCTION_LABEL.match(name)}
+    names = {name for name in names if not ('_' in name and name.split('_', 1)[1] in names)}
+    return sorted((address, name) for name, address in labels.items() if name in names)
+
+
+def make_layout(rom_words, labels, variables):
+    """A Layout from the ROM size, label -> ROM address and RAM symbol -> address."""
+    entries = _function_entries(labels)
+    if not entries or entries[0][0] > 0:
+        entries.insert(0, (0, STARTUP))
+    functions, classes = [], {}
+    for (start, name), (end, _) in zip(entries, entries[1:] + [(rom_words, None)]):
+        functions.append((name, start, end - start))
+        owner = name.split('.')[0]
+        classes[owner] = classes.get(owner, 0) + end - start
+    statics = {}
+    for name, address in sorted(variables.items(), key=lambda item: item[1]):
+        owner = name.split('.')[0] if STATIC_NAME.match(name) else '(variables)'
+        statics.setdefault(owner, []).append((name, address))
+    return Layout(rom_words, functions, classes, statics, dict(variables), len(labels))
+
+
+def asm_layout(lines):
+    """Assembles translator .asm lines (raising ValueError on any overflow) and lays out the result."""
+    instructions, table = first_pass_for_labels(lines)
+    predefined = initialize_symbol_table()
+    labels = {name: address for name, address in table.items() if name not in predefined}
+    second_pass_for_translation(instructions, table, VARIABLE_END)
+    variables = {name: address for name, address in table.items()
+                 if name not in predefined and name not in labels}
+    return make_layout(len(instructions), labels, variables)
+
+
+def linked_layout(program):
+    """The Layout of a linker.LinkedProgram, from its exported labels (local labels aren't kept)."""
+    return make_layout(len(program.code), program.symbols, program.variables)
+
+
+# --- Part 2: The Report ---
+def _budget(name, used, total):
+    return f"{name:<10} {used:>6} / {total:<6} {used / total:>4.0%}"
+
+
+def format_layout(layout, top=10):
+    """The budget lines, then the `top` largest classes and functions and the statics per class."""
+    statics_used = len(layout.variables)
+    out = [_budget('ROM', layout.rom_words, ROM_WORDS),
+           _budget('statics', statics_used, VARIABLE_END - VARIABLE_BASE),
+           f"{'symbols':<10} {layout.labels + statics_used:>6}   ({layout.labels} labels, {statics_used} variables)",
+           '', 'ROM by class']
+    for owner, words in sorted(layout.classes.items(), key=lambda item: -item[1])[:top]:
+        out.append(f"{words:>8}  {owner}")
+    out += ['', 'ROM by function']
+    for name, start, words in sorted(layout.functions, key=lambda item: -item[2])[:top]:
+        out.append(f"{words:>8}  {name} @{start}")
+    out += ['', 'statics by class']
+    for owner, names in sorted(layout.statics.items()):
+        addresses = [address for _, address in names]
+        out.append(f"{len(names):>8}  {owner} RAM {min(addresses)}-{max(addresses)}")
+    return '\n'.join(out)
+
+
+if __name__ == '__main__':
+    with open(sys.argv[1]) as f:
+        print(format_layout(asm_layout(f.read().splitlines())))
@@ -0,0 +1,204 @@
+import re
+import struct
+from array import array
+from collections import namedtuple
+
+from HackAssembler import (MAX_CONSTANT, ROM_WORDS, VARIABLE_BASE, VARIABLE_END, classify_instruction,
+                           first_pass_for_labels, initialize_symbol_table, parse_a_instruction,
+                           parse_c_instruction, translate_c_instruction)
+from sourcemap import read_varint, write_varint
+
+# --- Part 1: Symbols and Relocations ---
+# What the A-instruction at `offset` in an object's code refers to:
+#   LOCAL  - a label of the object itself; the word holds its offset in the object
+#   SYMBOL - another object's exported label, or failing that a shared variable (i, sum...)
+#   STATIC - a VM static (File.3), given a RAM address at link time
+LOCAL, SYMBOL, STATIC = range(3)
+Relocation = namedtuple('Relocation', 'offset kind symbol')
+
+STATIC_NAME = re.compile(r'^[A-Za-z_]\w*\.\d+$')
+
+
+def is_exported(label):
+    """VM function entries (Class.name) are visible to other objects; Class.f$x, END and loop labels are not."""
+    return '.' in label and '$' not in label
+
+
+# --- Part 2: Object Files ---
+# MAGIC, the module name and source hash, the symbol names, the code as
+# little-endian words, then exports (name, offset) and relocations
+# (offset delta, name * 3 + kind), every number a varint.
+OBJECT_MAGIC = b'HOBJ\x01'
+
+
+def _write_text(out, text):
+    raw = text.encode('utf-8')
+    write_varint(out, len(raw))
+    out += raw
+
+
+def _read_text(data, pos):
+    length, pos = read_varint(data, pos)
+    return bytes(data[pos:pos + length]).decode('utf-8'), pos + length
+
+
+class HackObject:
+    """One separately assembled .asm file: code with unresolved A-words, its exports and relocations."""
+
+    def __init__(self, module, code, exports, relocations, source_hash=''):
+        self.module = module
+        self.code = code                  # array('H')
+        self.exports = exports            # label -> offset in code
+        self.relocations = relocations    # [Relocation], by offset
+        self.source_hash = source_hash    # whatever the build uses to tell it's stale
+
+    def imports(self):
+        return sorted({r.symbol for r in self.relocations if r.kind == SYMBOL})
+
+    def statics(self):
+        """Static names in order of first reference, the order the assembler would allocate them."""
+        return list(dict.fromkeys(r.symbol for r in self.relocations if r.kind == STATIC))
+
+    def encode(self):
+        names = sorted(set(self.exports) | {r.symbol for r in self.relocations if r.kind != LOCAL})
+        index = {name: i for i, name in enumerate(names)}
+        out = bytearray(OBJECT_MAGIC)
+        _write_text(out, self.module)
+        _write_text(out, self.source_hash)
+        write_varint(out, len(names))
+        for name in names:
+            _write_text(out, name)
+        write_varint(out, len(self.code))
+        out += struct.pack(f'<{len(self.code)}H', *self.code)
+        write_varint(out, len(self.exports))
+        for name, offset in self.exports.items():
+            write_varint(out, index[name])
+            write_varint(out, offset)
+        write_varint(out, len(self.relocations))
+        previous = 0
+        for offset, kind, symbol in self.relocations:
+            write_varint(out, offset - previous)
+            write_varint(out, (index[symbol] * 3 if kind != LOCAL else 0) + kind)
+            previous = offset
+        return bytes(out)
+
+    @classmethod
+    def decode(cls, data):
+        if not data.startswith(OBJECT_MAGIC):
+            raise ValueError("not a Hack object file")
+        pos = len(OBJECT_MAGIC)
+        module, pos = _read_text(data, pos)
+        source_hash, pos = _read_text(data, pos)
+        count, pos = read_varint(data, pos)
+        names = []
+        for _ in range(count):
+            name, pos = _read_text(data, pos)
+            names.append(name)
+        count, pos = read_varint(data, pos)
+        code = array('H', struct.unpack_from(f'<{count}H', data, pos))
+        pos += 2 * count
+        exports = {}
+        count, pos = read_varint(data, pos)
+        for _ in range(count):
+            name, pos = read_varint(data, pos)
+            exports[names[name]], pos = read_varint(data, pos)
+        relocations = []
+        offset = 0
+        count, pos = read_varint(data, pos)
+        for _ in range(count):
+            delta, pos = read_varint(data, pos)
+            tag, pos = read_varint(data, pos)
+            offset += delta
+            kind = tag % 3
+            relocations.append(Relocation(offset, kind, names[tag // 3] if kind != LOCAL else None))
+        return cls(module, code, exports, relocations, source_hash)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.encode())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.decode(f.read())
+
+
+def assemble_object(lines, module, source_hash=''):
+    """
+    Assembles .asm lines without resolving anything outside them: the first
+    pass finds the labels, and every A-instruction naming one of them, an
+    unknown symbol or a static becomes a relocation instead of an address.
+    """
+    instructions, table = first_pass_for_labels(lines)
+    predefined = initialize_symbol_table()
+    labels = {name: address for name, address in table.items()
+              if name not in predefined or predefined[name] != address}
+    code = array('H')
+    relocations = []
+    for offset, instruction in enumerate(instructions):
+        if classify_instruction(instruction) == 'C_INSTRUCTION':
+            code.append(int(translate_c_instruction(parse_c_instruction(instruction)), 2))
+            continue
+        symbol = parse_a_instruction(instruction)
+        if symbol.isdigit():
+            if int(symbol) > MAX_CONSTANT:
+                raise ValueError(f"{module}: @{symbol} doesn't fit in an A-instruction (15 bits)")
+            code.append(int(symbol))
+        elif symbol in labels:
+            code.append(labels[symbol])
+            relocations.append(Relocation(offset, LOCAL, None))
+        elif symbol in predefined:
+            code.append(predefined[symbol])
+        else:
+            code.append(0)
+            relocations.append(Relocation(offset, STATIC if STATIC_NAME.match(symbol) else SYMBOL, symbol))
+    exports = {name: address for name, address in labels.items() if is_exported(name)}
+    return HackObject(module, code, exports, relocations, source_hash)
+
+
+# --- Part 3: Linking ---
+# code: the ROM words; symbols: exported label -> ROM address;
+# variables: static or variable name -> RAM address
+LinkedProgram = namedtuple('LinkedProgram', 'code symbols variables')
+
+
+def link(objects, ram_base=VARIABLE_BASE, ram_end=VARIABLE_END):
+    """
+    Lays the objects out in ROM in the order given, resolves every exported
+    label, gives statics and variables RAM from ram_base in order of first
+    reference, and patches the relocations. Raises ValueError on duplicate
+    or undefined labels, on ROM overflow and when the variables reach ram_end.
+    """
+    symbols, bases, rom = {}, [], 0
+    for obj in objects:
+        bases.append(rom)
+        for name, offset in obj.exports.items():
+            if name in symbols:
+                raise ValueError(f"{name} is defined in more than one object ({obj.module} and another)")
+            symbols[name] = rom + offset
+        rom += len(obj.code)
+    if rom > ROM_WORDS:
+        raise ValueError(f"program needs {rom} ROM words, more than {ROM_WORDS}")
+
+    variables, undefined = {}, {}
+    code = array('H')
+    for obj, base in zip(objects, bases):
+        words = array('H', obj.code)
+        for offset, kind, symbol in obj.relocations:
+            if kind == LOCAL:
+                words[offset] += base
+            elif kind == SYMBOL and symbol in symbols:
+                words[offset] = symbols[symbol]
+            elif kind == STATIC or '.' not in symbol:
+                if symbol not in variables:
+                    if ram_base + len(variables) >= ram_end:
+                        raise ValueError(f"no RAM for {symbol} (used in {obj.module}): "
+                                         f"{ram_base}-{ram_end - 1} are all taken")
+                    variables[symbol] = ram_base + len(variables)
+                words[offset] = variables[symbol]
+            else:
+                undefined.setdefault(symbol, obj.module)
+        code.extend(words)
+    if undefined:
+        raise ValueError("undefined: " + ', '.join(f"{name} (used in {module})" for name, module in sorted(undefined.items())))
+    return LinkedProgram(code, symbols, variables)
@@ -0,0 +1,152 @@
+from array import array
+from bisect import bisect_right
+
+# --- Part 1: Varints ---
+# Source maps are mostly small deltas, so every number is a LEB128 varint and
+# signed deltas are zigzag-encoded first (0, -1, 1, -2, ... -> 0, 1, 2, 3, ...).
+MAGIC = b'HSMAP\x01'
+
+
+def write_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def read_varint(data, pos):
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _zigzag(n):
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def _unzigzag(n):
+    return n >> 1 if not n & 1 else -(n >> 1) - 1
+
+
+# --- Part 2: The Map ---
+class SourceMap:
+    """
+    Maps output positions (ROM addresses, .asm lines, XML lines...) to
+    (source file, line). Entries are ranges: an entry covers every position
+    from its own up to the next entry's, so runs of output from one source
+    line cost a single entry.
+    """
+
+    def __init__(self):
+        self.files = []
+        self._file_ids = {}
+        self.positions = array('I')
+        self.file_ids = array('H')
+        self.lines = array('I')
+
+    def file_id(self, name):
+        """The id of a source file, registering it on first use."""
+        if name not in self._file_ids:
+            self._file_ids[name] = len(self.files)
+            self.files.append(name)
+        return self._file_ids[name]
+
+    def add(self, position, file_id, line):
+        """Records that output from `position` on comes from file_id:line (positions ascending)."""
+        if self.positions:
+            if self.file_ids[-1] == file_id and self.lines[-1] == line:
+                return
+            if self.positions[-1] == position:
+                self.file_ids[-1] = file_id
+                self.lines[-1] = line
+                return
+            if position < self.positions[-1]:
+                raise ValueError(f"source map positions must ascend ({position} after {self.positions[-1]})")
+        self.positions.append(position)
+        self.file_ids.append(file_id)
+        self.lines.append(line)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def lookup(self, position):
+        """(file, line) for an output position, or None before the first entry."""
+        i = bisect_right(self.positions, position) - 1
+        if i < 0:
+            return None
+        return self.files[self.file_ids[i]], self.lines[i]
+
+    def entries(self):
+        for position, file_id, line in zip(self.positions, self.file_ids, self.lines):
+            yield position, self.files[file_id], line
+
+    def compose(self, inner):
+        """
+        Chains two stages: self maps positions to lines of one file and `inner`
+        maps that file's lines onward, e.g. ROM -> .asm line then .asm line -> .vm line.
+        Positions whose line `inner` doesn't cover are dropped.
+        """
+        result = SourceMap()
+        for position, _, line in self.entries():
+            found = inner.lookup(line)
+            if found is not None:
+                result.add(position, result.file_id(found[0]), found[1])
+        return result
+
+    # --- binary form ---
+
+    def encode(self):
+        """MAGIC, the file names, then (position, file id, line) deltas as varints."""
+        out = bytearray(MAGIC)
+        write_varint(out, len(self.files))
+        for name in self.files:
+            raw = name.encode('utf-8')
+            write_varint(out, len(raw))
+            out += raw
+        write_varint(out, len(self.positions))
+        position = file_id = line = 0
+        for p, f, l in zip(self.positions, self.file_ids, self.lines):
+            write_varint(out, p - position)
+            write_varint(out, _zigzag(f - file_id))
+            write_varint(out, _zigzag(l - line))
+            position, file_id, line = p, f, l
+        return bytes(out)
+
+    @classmethod
+    def decode(cls, data):
+        if not data.startswith(MAGIC):
+            raise ValueError("not a source map")
+        source_map = cls()
+        pos = len(MAGIC)
+        n_files, pos = read_varint(data, pos)
+        for _ in range(n_files):
+            length, pos = read_varint(data, pos)
+            source_map.file_id(data[pos:pos + length].decode('utf-8'))
+            pos += length
+        count, pos = read_varint(data, pos)
+        position = file_id = line = 0
+        for _ in range(count):
+            delta, pos = read_varint(data, pos)
+            position += delta
+            delta, pos = read_varint(data, pos)
+            file_id += _unzigzag(delta)
+            delta, pos = read_varint(data, pos)
+            line += _unzigzag(delta)
+            source_map.positions.append(position)
+            source_map.file_ids.append(file_id)
+            source_map.lines.append(line)
+        return source_map
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.encode())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.decode(f.read())
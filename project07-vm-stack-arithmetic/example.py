@@ -1,11 +1,12 @@
 """
-tests for vm_translator.py
+tests for vm_translator.py, vm_interpreter.py, os_intrinsics.py, vm_build.py and vm_analyzer.py
 run: python3 example.py
 """
 
 import os
 import sys
 import tempfile
+import time
 
 from vm_translator import (
     get_command_parts,
@@ -15,11 +16,28 @@ from vm_translator import (
     write_pop,
     clean_line,
     parse_vm_file,
+    find_data_run,
+    plan_static_frames,
+    frame_address,
+    write_call,
+    write_function,
+    write_init,
+    write_return,
 )
 
 # need the assembler to do full pipeline tests
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'project06-assembler'))
-from HackAssembler import first_pass_for_labels, second_pass_for_translation
+from HackAssembler import VARIABLE_END, first_pass_for_labels, second_pass_for_translation
+from sourcemap import SourceMap
+from vm_interpreter import VMInterpreter, VMProgram, load_vm
+from os_intrinsics import Heap, Intrinsics, SCREEN
+from vm_build import analyze_module, build, native_os_object, vm_files
+from vm_analyzer import analyze, analyze_file, report, stack_headroom, template_cycles
+
+# and the emulator, to count cycles of whole linked programs
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'project05-computer-architecture'))
+from hack_emulator import HackEmulator
+from intrinsic_traps import IntrinsicTraps
 
 PASS = 0
 FAIL = 0
@@ -40,6 +58,12 @@ def test_get_command_parts():
     check("pop local 0",  get_command_parts('pop local 0'),          ('pop', 'local', 0))
     check("pop temp 6",   get_command_parts('pop temp 6'),           ('pop', 'temp', 6))
     check("push static 1",get_command_parts('push static 1'),        ('push', 'static', 1))
+    for line in ('call Sys.f', 'function Main.main', 'push constant', 'function Main.main x', 'return 0'):
+        try:
+            get_command_parts(line)
+            check(f"'{line}' raises", False, True)
+        except ValueError as e:
+            check(f"'{line}' raises", line in str(e), True)
 
 
 def test_classify_command_type():
@@ -189,9 +213,12 @@ class MiniCPU:
         self.A = self.D = self.PC = 0
 
     def run(self, binary, max_steps=5000):
+        """runs until the end loop or max_steps, returns the number of instructions run"""
         rom = [int(line.strip(), 2) for line in binary if line.strip()]
-        for _ in range(max_steps):
+        steps = 0
+        for steps in range(1, max_steps + 1):
             if self.PC >= len(rom):
+                steps -= 1
                 break
             instr = rom[self.PC]
             if not (instr & 0x8000):
@@ -211,10 +238,11 @@ class MiniCPU:
                 s = result - 0x10000 if result >= 0x8000 else result
                 jmp = ((jump >> 2) & 1 and s < 0) or ((jump >> 1) & 1 and s == 0) or (jump & 1 and s > 0)
                 self.PC = addr if jmp else self.PC + 1
-            # stop on infinite loop (end of program)
+            # stop on infinite loop (end of program): "(END) @END 0;JMP" jumps back to its own @
             if self.PC < len(rom) and rom[self.PC] & 0x8000 and (rom[self.PC] & 7) == 7:
-                if self.A == self.PC:
+                if self.A in (self.PC, self.PC - 1):
                     break
+        return steps
 
 
 def test_simpleadd_correctness():
@@ -252,6 +280,494 @@ def test_simpleadd_correctness():
         os.unlink(tmp_asm)
 
 
+def test_source_maps():
+    """ROM address -> .asm line -> .vm line, by composing the assembler's and translator's maps"""
+    print("  source maps: StackTest ROM -> .vm lines")
+    vm_path = os.path.join(os.path.dirname(__file__), 'StackTest.vm')
+    with tempfile.NamedTemporaryFile(suffix='.asm', mode='w', delete=False) as tmp:
+        tmp_asm = tmp.name
+    try:
+        asm_map = SourceMap()
+        parse_vm_file(vm_path, tmp_asm, asm_map)
+        with open(tmp_asm, 'r') as f:
+            asm_lines = f.readlines()
+        check("asm line 1 is the first command", asm_map.lookup(1), ('StackTest.vm', 8))
+        comment_lines = [i for i, line in enumerate(asm_lines, 1) if line.startswith('// ')]
+        check("each command starts an entry", list(asm_map.positions), comment_lines[:len(asm_map)])
+
+        rom_map = SourceMap()
+        first_pass_for_labels(asm_lines, rom_map, rom_map.file_id(os.path.basename(tmp_asm)))
+        vm_map = rom_map.compose(asm_map)
+        check("ROM 0 from line 8", vm_map.lookup(0), ('StackTest.vm', 8))
+        check("ROM 7 from line 9", vm_map.lookup(7), ('StackTest.vm', 9))
+        check("one entry per VM command", len(vm_map), len(asm_map))
+        check("survives encoding", list(SourceMap.decode(vm_map.encode()).entries()), list(vm_map.entries()))
+    finally:
+        os.unlink(tmp_asm)
+
+
+PROJECT08 = os.path.join(os.path.dirname(__file__), '..', 'project08-vm-program-control')
+
+
+def assemble_file(asm_path):
+    with open(asm_path, 'r') as f:
+        instructions, table = first_pass_for_labels(f.readlines())
+    return second_pass_for_translation(instructions, table, VARIABLE_END)
+
+
+def run_vm(paths, setup=(), memory=None, bootstrap=False):
+    vm = VMInterpreter(load_vm(paths))
+    vm.ram[0:len(setup)] = setup
+    for address, value in (memory or {}).items():
+        vm.ram[address] = value
+    if bootstrap:
+        vm.bootstrap()
+    vm.run(100000)
+    return vm
+
+
+def test_vm_interpreter():
+    """runs .vm programs directly and checks them against the project 8 test results"""
+    print("  vm interpreter: project 8 programs")
+    vm = run_vm(os.path.join(PROJECT08, 'BasicLoop', 'BasicLoop.vm'), [256, 300, 400], {400: 3})
+    check("BasicLoop 1+2+3", (vm.ram[0], vm.ram[256]), (257, 6))
+    check("BasicLoop halts at the end", vm.halted, True)
+    vm = run_vm(os.path.join(PROJECT08, 'FibonacciSeries', 'FibonacciSeries.vm'), [256, 300, 400],
+                {400: 6, 401: 3000})
+    check("FibonacciSeries", vm.ram[3000:3006], [0, 1, 1, 2, 3, 5])
+    vm = run_vm(os.path.join(PROJECT08, 'SimpleFunction', 'SimpleFunction.vm'), [317, 317, 310, 3000, 4000],
+                dict(zip(range(310, 317), [1234, 37, 1000, 305, 300, 3010, 4010])))
+    check("SimpleFunction frame restored", vm.ram[0:5], [311, 305, 300, 3010, 4010])
+    check("SimpleFunction result", vm.ram[310], 1196)
+    vm = run_vm(os.path.join(PROJECT08, 'FibonacciElement'), bootstrap=True)
+    check("FibonacciElement fib(4)", (vm.ram[0], vm.ram[261]), (262, 3))
+    check("halted in Sys.init's loop", vm.halted, True)
+    vm = run_vm(os.path.join(PROJECT08, 'StaticTest'), bootstrap=True)
+    check("StaticTest", (vm.ram[0], vm.ram[261], vm.ram[262]), (263, 0x10000 - 2, 8))
+    check("statics per file", sorted(vm.program.statics), ['Class1.0', 'Class1.1', 'Class2.0', 'Class2.1'])
+    vm = run_vm(os.path.join(PROJECT08, 'NestedCall'), bootstrap=True)
+    check("NestedCall temps", vm.ram[5:7], [135, 246])
+
+    program = VMProgram()
+    program.add_source(['function A.f 0', 'label L', 'goto L', 'function B.g 0', 'label L', 'goto L'], 'A')
+    program.link()
+    check("labels scoped per function", [program.code[3 * i + 1] for i in (1, 3)], [1, 3])
+    program = VMProgram()
+    program.add_source(['function A.f 0', 'goto MISSING'], 'A')
+    try:
+        program.link()
+        check("unknown label raises", False, True)
+    except ValueError as e:
+        check("unknown label raises", 'MISSING' in str(e), True)
+
+
+def test_vm_interpreter_differential():
+    """the same RAM after translating + running on the cpu and after interpreting"""
+    print("  vm interpreter vs translated code")
+    this_dir = os.path.dirname(__file__)
+    setup = [256, 300, 400, 3000, 3010]
+    compared = list(range(13)) + list(range(16, 4096))  # R13-R15 are translator scratch
+    for name in ['SimpleAdd', 'StackTest', 'BasicTest', 'PointerTest', 'StaticTest']:
+        vm_path = os.path.join(this_dir, name + '.vm')
+        with tempfile.NamedTemporaryFile(suffix='.asm', mode='w', delete=False) as tmp:
+            tmp_asm = tmp.name
+        try:
+            parse_vm_file(vm_path, tmp_asm)
+            cpu = MiniCPU()
+            cpu.ram[0:5] = setup
+            cpu.run(assemble_file(tmp_asm))
+        finally:
+            os.unlink(tmp_asm)
+        vm = run_vm(vm_path, setup)
+        check(f"{name} RAM matches", [a for a in compared if cpu.ram[a] != vm.ram[a]], [])
+
+    # lt/gt test the sign of the wrapped x - y, so operands 32768 or more apart compare "wrongly" on both
+    lines = []
+    for x, y, op in [(20000, -20000, 'lt'), (-20000, 20000, 'lt'), (20000, -20000, 'gt'), (-20000, 20000, 'gt'),
+                     (3, 5, 'lt'), (5, 3, 'gt'), (-1, -1, 'gt')]:
+        lines += [f'push constant {abs(x)}'] + (['neg'] if x < 0 else [])
+        lines += [f'push constant {abs(y)}'] + (['neg'] if y < 0 else []) + [op]
+    lines += [f'pop temp {k}' for k in range(6, -1, -1)]
+    cpu, vm, _ = run_both(lines, {0: 256})
+    check("far-apart comparisons as translated", vm.ram[5:12], cpu.ram[5:12])
+    check("far-apart comparisons wrap", vm.ram[5:12], [0xFFFF, 0, 0, 0xFFFF, 0xFFFF, 0xFFFF, 0])
+
+    # the reference translation of FibonacciElement: Hack instructions per VM command
+    cpu = MiniCPU()
+    cycles = cpu.run(assemble_file(os.path.join(PROJECT08, 'FibonacciElement', 'FibonacciElement.asm')))
+    vm = run_vm(os.path.join(PROJECT08, 'FibonacciElement'), bootstrap=True)
+    check("same fib(4)", cpu.ram[261], vm.ram[261])
+    check("10+ Hack instructions per VM command", cycles >= 10 * vm.steps, True)
+    per_command = cycles / vm.steps
+
+    program = VMProgram()
+    for name in ['Main', 'Sys']:
+        with open(os.path.join(PROJECT08, 'FibonacciElement', name + '.vm')) as f:
+            program.add_source(f.read().replace('push constant 4', 'push constant 18').splitlines(), name)
+    vm = VMInterpreter(program.link())
+    vm.bootstrap()
+    start = time.perf_counter()
+    vm.run()
+    seconds = time.perf_counter() - start
+    check("fib(18)", vm.ram[261], 2584)
+    print(f"    fib(18): {vm.steps:,} VM commands in {seconds * 1000:.0f} ms "
+          f"({vm.steps / seconds / 1e6:.2f}M/s, {per_command:.1f} Hack instructions each when translated)")
+
+
+def test_os_intrinsics():
+    """OS calls run natively: the math, the heap, strings built the way the compiler builds them"""
+    print("  os intrinsics: Math, Memory, String, Screen")
+    os_ = Intrinsics()
+    ram = [0] * 32768
+    check("multiply signed", os_.call('Math.multiply', ram, [0x10000 - 7, 6]), 0x10000 - 42)
+    check("divide truncates to zero", os_.call('Math.divide', ram, [0x10000 - 7, 2]), 0x10000 - 3)
+    check("sqrt", os_.call('Math.sqrt', ram, [30000]), 173)
+    check("multiply counted", os_.counts['Math.multiply'], 1)
+
+    heap = Heap()
+    a, b, c = heap.alloc(10), heap.alloc(5), heap.alloc(1)
+    check("first fit from 2048", (a, b, c), (2048, 2058, 2063))
+    heap.dealloc(a)
+    heap.dealloc(b)
+    check("neighbours merge", heap.free[0], (2048, 15))
+    check("freed space reused", heap.alloc(12), 2048)
+
+    program = VMProgram()
+    program.add_source([
+        'function Sys.init 0',
+        'push constant 2', 'call String.new 1',
+        'push constant 72', 'call String.appendChar 2',
+        'push constant 105', 'call String.appendChar 2',
+        'pop temp 0',
+        'push temp 0', 'call String.length 1', 'pop temp 1',
+        'push temp 0', 'push constant 1', 'call String.charAt 2', 'pop temp 2',
+        'push constant 0', 'push constant 0', 'push constant 31', 'push constant 0', 'call Screen.drawLine 4',
+        'pop temp 3',
+        'label END', 'goto END',
+    ], 'Sys')
+    try:
+        VMInterpreter(program.link())
+        check("calls to a missing OS fail to link", False, True)
+    except ValueError as e:
+        check("calls to a missing OS fail to link", 'String.new' in str(e), True)
+    os_ = Intrinsics()
+    vm = VMInterpreter(program.link(os_), os_)
+    vm.bootstrap()
+    vm.run(1000)
+    check("String length and charAt", vm.ram[6:8], [2, 105])
+    check("drawLine fills 2 words", vm.ram[SCREEN:SCREEN + 3], [0xFFFF, 0xFFFF, 0])
+    check("appendChar counted", os_.counts['String.appendChar'], 2)
+    check("report most-called first", os_.report().split('\n')[0].split(), ['2', 'String.appendChar'])
+    try:
+        Intrinsics(classes=('Math', 'String'))
+        check("String needs Memory", False, True)
+    except ValueError:
+        check("String needs Memory", True, True)
+
+
+PROJECT09 = os.path.join(os.path.dirname(__file__), '..', 'project09-high-level-language')
+
+
+def array_store(base, index, value):
+    """the compiler's code for `let base[index] = value` with constants"""
+    load = [f'push constant {abs(value)}'] + (['neg'] if value < 0 else [])
+    return [f'push constant {index}', f'push {base}', 'add'] + load + [
+        'pop temp 0', 'pop pointer 1', 'push temp 0', 'pop that 0']
+
+
+def translate_lines(vm_lines, compact_data, assemble=True):
+    """vm_lines -> .asm -> binary, or the .asm's instruction count without assembling"""
+    directory = tempfile.mkdtemp()
+    vm_path, asm_path = os.path.join(directory, 'Data.vm'), os.path.join(directory, 'Data.asm')
+    with open(vm_path, 'w') as f:
+        f.write('\n'.join(vm_lines) + '\n')
+    parse_vm_file(vm_path, asm_path, compact_data=compact_data)
+    if assemble:
+        return assemble_file(asm_path)
+    with open(asm_path) as f:
+        return sum(1 for line in f if clean_line(line) and not clean_line(line).startswith('('))
+
+
+def run_both(vm_lines, setup):
+    """the compact translation on the cpu and the interpreter, from the same RAM"""
+    cpu, vm = MiniCPU(), VMInterpreter(VMProgram())
+    vm.program.add_source(vm_lines, 'Data')
+    vm.program.link()
+    for address, value in setup.items():
+        cpu.ram[address] = vm.ram[address] = value
+    cycles = cpu.run(translate_lines(vm_lines, compact_data=True), max_steps=100000)
+    vm.run()
+    return cpu, vm, cycles
+
+
+def test_compact_data():
+    """runs of constant array stores become a data block with the same effect"""
+    print("  compact data: Trig.init tables")
+    with open(os.path.join(PROJECT09, 'Cube', 'Trig.vm')) as f:
+        trig = [line.strip() for line in f]
+    stores = trig[7:trig.index('push constant 0', 6100)]  # between the Array.new calls and the return
+    check("720 stores found", len(find_data_run([get_command_parts(line) for line in stores], 0)), 720)
+    plain_rom = translate_lines(stores, compact_data=False, assemble=False)
+    compact_rom = len(translate_lines(stores, compact_data=True))
+    check("plain translation overflows the 32K ROM", plain_rom > 32768, True)
+    try:
+        translate_lines(stores, compact_data=False)
+        check("and the assembler refuses it", False, True)
+    except ValueError as e:
+        check("and the assembler refuses it", 'more than 32768' in str(e), True)
+
+    cpu, vm, cycles = run_both(stores, {0: 256, 16: 2048, 17: 2408})
+    check("same tables as interpreted", cpu.ram[2048:2768], vm.ram[2048:2768])
+    check("sin(359) = -4", cpu.ram[2048 + 359], 0x10000 - 4)
+    check("same SP, THAT and temp 0", cpu.ram[0:6], vm.ram[0:6])
+    # both are straight-line code, so the plain version would take a cycle per ROM word
+    check("10x less ROM and fewer cycles", plain_rom >= 10 * compact_rom and plain_rom >= 10 * cycles, True)
+    print(f"    ROM {plain_rom} -> {compact_rom} words, {cycles} startup cycles")
+
+    # two names for one array, a gap in the indices, values needing neg and !
+    lines = []
+    for base, index, value in [('static 0', 0, 7), ('static 0', 1, -1), ('local 0', 1, 0), ('static 0', 4, -32767),
+                               ('static 0', 5, 1), ('local 0', 2, 300), ('static 0', 6, 300), ('this 2', 0, 9),
+                               ('static 0', 7, -20000)]:
+        lines += array_store(base, index, value)
+    cpu, vm, _ = run_both(lines, {0: 256, 1: 300, 3: 400, 300: 1000, 402: 1100, 16: 1000})
+    check("aliased stores in order", cpu.ram[1000:1010], vm.ram[1000:1010])
+    check("last store's THAT and temp 0", cpu.ram[0:6], vm.ram[0:6])
+    check("this 2 array", cpu.ram[1100], 9)
+
+
+def run_linked(program, setup=None):
+    cpu = MiniCPU()
+    for address, value in (setup or {}).items():
+        cpu.ram[address] = value
+    cpu.run([f'{word:016b}' for word in program.code], max_steps=100000)
+    return cpu
+
+
+def test_separate_compilation():
+    """function calls translated per file, linked from cached objects; only changed files rebuilt"""
+    print("  separate compilation: objects, link, incremental rebuild")
+    build_root = tempfile.mkdtemp()
+    result = build(os.path.join(PROJECT08, 'FibonacciElement'), os.path.join(build_root, 'fib'))
+    check("both classes built", result.rebuilt, ['Main', 'Sys'])
+    cpu = run_linked(result.program)
+    check("FibonacciElement", (cpu.ram[0], cpu.ram[261]), (262, 3))
+    result = build(os.path.join(PROJECT08, 'NestedCall'), os.path.join(build_root, 'nested'))
+    check("NestedCall", run_linked(result.program).ram[5:7], [135, 246])
+    result = build(os.path.join(PROJECT08, 'FibonacciSeries'), os.path.join(build_root, 'series'))
+    cpu = run_linked(result.program, {0: 256, 1: 300, 2: 400, 400: 6, 401: 3000})
+    check("FibonacciSeries without bootstrap", cpu.ram[3000:3006], [0, 1, 1, 2, 3, 5])
+
+    # a private copy of StaticTest, so one class can change
+    source = os.path.join(tempfile.mkdtemp(), 'StaticTest')
+    os.makedirs(source)
+    for name in ['Class1.vm', 'Class2.vm', 'Sys.vm']:
+        with open(os.path.join(PROJECT08, 'StaticTest', name)) as f, open(os.path.join(source, name), 'w') as out:
+            out.write(f.read())
+    build_dir = os.path.join(build_root, 'static')
+    result = build(source, build_dir)
+    check("statics per class", result.program.variables,
+          {'Class1.0': 16, 'Class1.1': 17, 'Class2.0': 18, 'Class2.1': 19})
+    check("StaticTest", run_linked(result.program).ram[261:263], [0x10000 - 2, 8])
+    check("nothing rebuilt when nothing changed", build(source, build_dir).rebuilt, [])
+    with open(os.path.join(source, 'Class2.vm')) as f:
+        text = f.read()
+    with open(os.path.join(source, 'Class2.vm'), 'w') as f:
+        f.write(text.replace('sub', 'add'))
+    result = build(source, build_dir)
+    check("only Class2 rebuilt", result.rebuilt, ['Class2'])
+    check("and linked in", run_linked(result.program).ram[262], 38)
+
+    try:
+        build(os.path.join(PROJECT09, 'Bloxors'), os.path.join(build_root, 'bloxors'))
+        check("Bloxors needs the OS", False, True)
+    except ValueError as e:
+        check("Bloxors needs the OS", 'Math.multiply (used in Block)' in str(e), True)
+
+
+def run_native_os(paths, static_frames, tick, ticks):
+    """
+    Links a Jack program against a native OS (Sys.init just calls Main.main)
+    and runs it on the emulator until `tick` has been called `ticks` times.
+    Returns (ROM words, cycles, the screen at each tick).
+    """
+    stub = tempfile.mkdtemp()
+    with open(os.path.join(stub, 'Sys.vm'), 'w') as f:
+        f.write("function Sys.init 0\ncall Main.main 0\npop temp 0\nlabel HALT\ngoto HALT\n")
+    intrinsics = Intrinsics()
+    screens = []
+
+    def record(os_, ram, args):
+        screens.append(hash(tuple(ram[SCREEN:SCREEN + 8192])))
+        return 0
+    for name in ['Keyboard.keyPressed', 'Sys.wait', 'Output.moveCursor', 'Output.printString']:
+        intrinsics.register(name, record if name == tick else lambda os_, ram, args: 0)
+    result = build(vm_files(paths) + [os.path.join(stub, 'Sys.vm')], os.path.join(stub, 'build'),
+                   static_frames=static_frames, extra_objects=[native_os_object(sorted(intrinsics.table))])
+    emulator = HackEmulator(list(result.program.code))
+    traps = IntrinsicTraps(emulator, result.program.symbols, intrinsics)
+    while len(screens) < ticks and emulator.cycles < 10_000_000:
+        traps.run(100)
+    return len(result.program.code), emulator.cycles, screens[:ticks]
+
+
+def test_static_frames():
+    """non-recursive functions keep arguments and locals at fixed addresses; results and screens unchanged"""
+    print("  static frames for non-recursive functions")
+    plan = plan_static_frames(vm_files(os.path.join(PROJECT08, 'NestedCall')))
+    check("NestedCall: both callees static", sorted(plan.frames), ['Sys.add12', 'Sys.main'])
+    main, add12 = plan.frames['Sys.main'], plan.frames['Sys.add12']
+    check("callee's frame above its caller's", add12.base >= main.base + 5 + 2 + 2, True)
+    check("pointers saved (both pop pointer)", main.saves_pointers and add12.saves_pointers, True)
+    check("region ends at the heap", (plan.bottom, plan.top), (2048 - 14, 2048))
+    check("local 2 address", frame_address(main, 'local', 2), main.base + 2)
+    check("pop local is five instructions", len(write_pop('local', 0, 'X', main).split()), 5)
+    check("push argument: one @addr, no LCL/ARG arithmetic",
+          write_push('argument', 0, 'X', add12).split()[:2], [f'@{add12.base}', 'D=M'])
+
+    plan = plan_static_frames(vm_files(os.path.join(PROJECT08, 'StaticTest')))
+    check("sibling functions share one frame", plan.frames['Class1.set'].base, plan.frames['Class2.set'].base)
+    check("recursive fibonacci stays dynamic",
+          plan_static_frames(vm_files(os.path.join(PROJECT08, 'FibonacciElement'))).frames, {})
+
+    build_root = tempfile.mkdtemp()
+    result = build(os.path.join(PROJECT08, 'NestedCall'), os.path.join(build_root, 'nested'), static_frames=True)
+    cpu = run_linked(result.program)
+    check("NestedCall results, SP, THIS/THAT", cpu.ram[0:7], [261, 261, 256, 4000, 5000, 135, 246])
+    check("stack checked up to the frames", (result.stack_limit, result.stack_headroom),
+          (2048 - 14, 2048 - 14 - 256 - 5 - analyze(os.path.join(PROJECT08, 'NestedCall'))['Sys.init'].depth))
+    analysis = os.path.join(build_root, 'nested', 'Sys.analysis')
+    stamp = os.stat(analysis).st_mtime_ns
+    warm = build(os.path.join(PROJECT08, 'NestedCall'), os.path.join(build_root, 'nested'), static_frames=True)
+    check("warm build reuses the saved analysis", (os.stat(analysis).st_mtime_ns, warm.stack_headroom),
+          (stamp, result.stack_headroom))
+    sys_vm = os.path.join(PROJECT08, 'NestedCall', 'Sys.vm')
+    check("saved analysis == a fresh one", analyze_module(sys_vm, os.path.join(build_root, 'nested')),
+          analyze_file(sys_vm))
+    result = build(os.path.join(PROJECT08, 'StaticTest'), os.path.join(build_root, 'static'), static_frames=True)
+    check("StaticTest", run_linked(result.program).ram[261:263], [0x10000 - 2, 8])
+    result = build(os.path.join(PROJECT08, 'FibonacciElement'), os.path.join(build_root, 'fib'), static_frames=True)
+    check("FibonacciElement", run_linked(result.program).ram[261], 3)
+    check("plan change rebuilds", build(os.path.join(PROJECT08, 'StaticTest'),
+                                        os.path.join(build_root, 'static')).rebuilt, ['Class1', 'Class2', 'Sys'])
+
+    # a deep stack under static frames is refused rather than left to overwrite them
+    deep = os.path.join(build_root, 'deep')
+    os.makedirs(deep)
+    with open(os.path.join(deep, 'Sys.vm'), 'w') as f:
+        f.write('\n'.join(['function Sys.init 0'] + ['push constant 1'] * 1800 +
+                          ['call Sys.f 0', 'label HALT', 'goto HALT', 'function Sys.f 2', 'push constant 0', 'return']) + '\n')
+    try:
+        build(deep, os.path.join(deep, 'build'), static_frames=True)
+        check("stack reaching the frames refused", False, True)
+    except ValueError as e:
+        check("stack reaching the frames refused", 'into the static frames' in str(e), True)
+    check("not checked without static frames", build(deep, os.path.join(deep, 'build')).stack_headroom, None)
+
+    for program, tick, ticks in [('Cube', 'Sys.wait', 5), ('Bloxors', 'Keyboard.keyPressed', 50)]:
+        path = os.path.join(PROJECT09, program)
+        rom, cycles, screens = run_native_os(path, False, tick, ticks)
+        static_rom, static_cycles, static_screens = run_native_os(path, True, tick, ticks)
+        check(f"{program}: same screen at every {tick}", static_screens, screens)
+        check(f"{program}: smaller and faster", static_rom < rom and static_cycles < cycles, True)
+        print(f"    {program}: {rom} -> {static_rom} ROM words ({1 - static_rom / rom:.0%} less), "
+              f"{cycles:,} -> {static_cycles:,} cycles to {ticks} x {tick} ({1 - static_cycles / cycles:.0%} less)")
+
+
+TAIL_SUM = [
+    'function Sys.init 0', 'push constant 300', 'push constant 0', 'call Main.sum 2',
+    'pop static 0', 'label HALT', 'goto HALT',
+    # sum(n, total): n + ... + 1 + total, the recursive call in tail position
+    'function Main.sum 0', 'push argument 0', 'if-goto MORE', 'push argument 1', 'return',
+    'label MORE', 'push argument 0', 'push constant 1', 'sub',
+    'push argument 1', 'push argument 0', 'add', 'call Main.sum 2', 'return',
+    # only one argument of its own, so a two-argument tail call can't reuse the frame
+    'function Main.twice 0', 'push argument 0', 'push constant 0', 'call Main.sum 2', 'return',
+]
+
+
+def test_tail_calls():
+    """call + return reuses the caller's frame; call, entry and return sequences are shorter"""
+    print("  tail calls and call sequences")
+    directory = tempfile.mkdtemp()
+    vm_path, asm_path = os.path.join(directory, 'Main.vm'), os.path.join(directory, 'Main.asm')
+    with open(vm_path, 'w') as f:
+        f.write('\n'.join(TAIL_SUM) + '\n')
+    results = {}
+    for tail_calls in (False, True):
+        parse_vm_file(vm_path, asm_path, tail_calls=tail_calls)
+        with open(asm_path) as f:
+            text = f.read()
+        with open(asm_path, 'w') as f:
+            f.write(write_init() + text)
+        cpu = MiniCPU()
+        cycles = cpu.run(assemble_file(asm_path), max_steps=200000)
+        results[tail_calls] = (cpu, cycles, text)
+    (cpu, cycles, text), (tail_cpu, tail_cycles, tail_text) = results[False], results[True]
+    check("sum(300) either way", (cpu.ram[16], tail_cpu.ram[16]), (45150, 45150))
+    check("one tail call, in Main.sum", tail_text.count('(tail call)'), 1)
+    check("stack grew 300 frames deep", any(cpu.ram[1000:2000]), True)
+    check("stack stayed flat with tail calls", any(tail_cpu.ram[300:2000]), False)
+    check("fewer cycles", tail_cycles < cycles, True)
+    print(f"    sum(300): {cycles:,} -> {tail_cycles:,} cycles")
+
+    check("call: 35 instructions (47 pushing one word at a time)",
+          len([line for line in write_call('F.f', 2, 'R').split() if not line.startswith('(')]), 35)
+    check("3 locals zeroed with one SP update", write_function('F.f', 3).count('@SP'), 2)
+    check("no locals: just the label", write_function('F.f', 0), '(F.f)')
+    check("return with arguments needs no R14",
+          (len(write_return(True).split()), '@R14' in write_return(True), len(write_return().split())), (35, False, 41))
+
+
+def test_analyzer():
+    """static costs and stack depths agree with what running the program shows"""
+    print("  static cycle and stack analysis")
+    check("eq: 12 on its longer path", template_cycles(write_arithmetic('eq').splitlines()), 12)
+    check("call: stops at the jump to the callee",
+          template_cycles(write_call('F.f', 1, 'R').splitlines()), 35)
+
+    path = os.path.join(PROJECT08, 'NestedCall')
+    functions = analyze(path)
+    check("straight-line function: cycles = words", (functions['Sys.add12'].cycles, functions['Sys.add12'].words),
+          (93, 93))
+    cpu = MiniCPU()
+    cycles = cpu.run([f'{word:016b}' for word in build(path, tempfile.mkdtemp()).program.code], max_steps=100000)
+    bootstrap = len(write_init().split()) - 1  # less the return label
+    # MiniCPU stops on the halt loop's @, one instruction before the analyzer's loop block ends
+    check("every function once: the cycles MiniCPU counts", bootstrap + sum(f.cycles for f in functions.values()),
+          cycles + 1)
+    vm = VMInterpreter(load_vm(path))
+    vm.bootstrap()
+    highest = 0
+    while not vm.halted:
+        vm.run(1)
+        highest = max(highest, vm.ram[0])
+    check("deepest SP predicted", 256 + 5 + functions['Sys.init'].depth, highest)
+    check("headroom below the heap", stack_headroom(functions), 2048 - highest)
+    check("recursion has no bound", analyze(os.path.join(PROJECT08, 'FibonacciElement'))['Main.fibonacci'].depth,
+          None)
+
+    cube = analyze(os.path.join(PROJECT09, 'Cube'))
+    check("Cube fits its stack", stack_headroom(cube, 'Main.main') > 1000, True)
+    plan = plan_static_frames(vm_files(os.path.join(PROJECT09, 'Cube')))
+    check("static frames lower the ceiling", stack_headroom(cube, 'Main.main', plan=plan),
+          stack_headroom(cube, 'Main.main') - (2048 - plan.bottom))
+    check("OS calls listed", 'Math.multiply' in cube['FixedMath.toFixed'].external, True)
+    draw = cube['Cube.updateAndDraw']
+    check("the frame loop found", [loop.header for loop in draw.loops], ['Cube_2'])
+    check("a loop costs less than the function", 0 < draw.loops[0].cycles < draw.cycles, True)
+    lines = report(cube, sort='loop', limit=3).splitlines()
+    check("report sorted by loop cost", [line.split()[0] for line in lines[1:4]],
+          ['Cube.updateAndDraw', 'Main.run', 'Matrix.dot'])
+    try:
+        report(cube, sort='name')
+        check("unknown sort key rejected", False, True)
+    except ValueError:
+        check("unknown sort key rejected", True, True)
+    for line in report(cube, sort='loop', limit=3).splitlines():
+        print(f"    {line}".rstrip())
+
+
 if __name__ == '__main__':
     print("=== project 7: vm translator tests ===\n")
     test_get_command_parts()
@@ -262,5 +778,14 @@ if __name__ == '__main__':
     test_write_pop()
     test_translate_and_assemble()
     test_simpleadd_correctness()
+    test_source_maps()
+    test_vm_interpreter()
+    test_vm_interpreter_differential()
+    test_os_intrinsics()
+    test_compact_data()
+    test_separate_compilation()
+    test_static_frames()
+    test_tail_calls()
+    test_analyzer()
     print(f"\n{PASS} passed, {FAIL} failed")
     sys.exit(1 if FAIL else 0)
@@ -0,0 +1,308 @@
+from math import isqrt
+
+# --- Part 1: Memory Map ---
+HEAP_BASE = 2048
+HEAP_END = 16384
+SCREEN = 16384
+SCREEN_WORDS = 8192
+
+
+def _signed(x):
+    return x - 0x10000 if x & 0x8000 else x
+
+
+class Heap:
+    """
+    A first-fit allocator over the Jack heap (2048-16383) kept on the Python
+    side: RAM only ever holds the blocks themselves, never a free list.
+    """
+
+    def __init__(self, base=HEAP_BASE, end=HEAP_END):
+        self.free = [(base, end - base)]   # (address, size), by address
+        self.sizes = {}                    # allocated address -> size
+
+    def alloc(self, size):
+        size = max(size, 1)
+        for i, (address, available) in enumerate(self.free):
+            if available >= size:
+                if available == size:
+                    del self.free[i]
+                else:
+                    self.free[i] = (address + size, available - size)
+                self.sizes[address] = size
+                return address
+        raise MemoryError(f"heap overflow allocating {size} words")
+
+    def dealloc(self, address):
+        if address not in self.sizes:
+            raise ValueError(f"Memory.deAlloc of {address}, which was never allocated")
+        size = self.sizes.pop(address)
+        self.free.append((address, size))
+        self.free.sort()
+        merged = [self.free[0]]
+        for block, length in self.free[1:]:
+            last, last_length = merged[-1]
+            if last + last_length == block:
+                merged[-1] = (last, last_length + length)
+            else:
+                merged.append((block, length))
+        self.free = merged
+
+
+# --- Part 2: The Intrinsics ---
+# Each takes (os, ram, args) with args as unsigned 16-bit words and returns the
+# function's result (0 for void). A class is replaced as a whole: the String
+# functions share one object layout [maxLength, length, chars], and Array and
+# String allocate through the same Heap as Memory, so mixing native and
+# compiled members of one class would corrupt its state.
+def _math_multiply(os, ram, args):
+    return _signed(args[0]) * _signed(args[1])
+
+
+def _math_divide(os, ram, args):
+    x, y = _signed(args[0]), _signed(args[1])
+    if y == 0:
+        raise ZeroDivisionError("Math.divide by zero")
+    quotient = abs(x) // abs(y)
+    return -quotient if (x < 0) != (y < 0) else quotient
+
+
+def _math_sqrt(os, ram, args):
+    x = _signed(args[0])
+    if x < 0:
+        raise ValueError("Math.sqrt of a negative number")
+    return isqrt(x)
+
+
+def _math_abs(os, ram, args):
+    return abs(_signed(args[0]))
+
+
+def _math_min(os, ram, args):
+    return min(_signed(args[0]), _signed(args[1]))
+
+
+def _math_max(os, ram, args):
+    return max(_signed(args[0]), _signed(args[1]))
+
+
+def _memory_peek(os, ram, args):
+    return ram[args[0]]
+
+
+def _memory_poke(os, ram, args):
+    ram[args[0]] = args[1]
+    return 0
+
+
+def _memory_alloc(os, ram, args):
+    return os.heap.alloc(_signed(args[0]))
+
+
+def _memory_dealloc(os, ram, args):
+    os.heap.dealloc(args[0])
+    return 0
+
+
+def _string_new(os, ram, args):
+    max_length = _signed(args[0])
+    string = os.heap.alloc(3)
+    ram[string] = max_length
+    ram[string + 1] = 0
+    ram[string + 2] = os.heap.alloc(max_length)
+    return string
+
+
+def _string_dispose(os, ram, args):
+    os.heap.dealloc(ram[args[0] + 2])
+    os.heap.dealloc(args[0])
+    return 0
+
+
+def _string_length(os, ram, args):
+    return ram[args[0] + 1]
+
+
+def _string_char_at(os, ram, args):
+    return ram[ram[args[0] + 2] + args[1]]
+
+
+def _string_set_char_at(os, ram, args):
+    ram[ram[args[0] + 2] + args[1]] = args[2]
+    return 0
+
+
+def _string_append_char(os, ram, args):
+    string = args[0]
+    length = ram[string + 1]
+    if length >= ram[string]:
+        raise ValueError("String.appendChar: string is full")
+    ram[ram[string + 2] + length] = args[1]
+    ram[string + 1] = length + 1
+    return string
+
+
+def _string_erase_last_char(os, ram, args):
+    if ram[args[0] + 1]:
+        ram[args[0] + 1] -= 1
+    return 0
+
+
+def _string_int_value(os, ram, args):
+    string = args[0]
+    chars, length = ram[string + 2], ram[string + 1]
+    text = ''.join(chr(ram[chars + i]) for i in range(length))
+    sign = -1 if text.startswith('-') else 1
+    digits = ''
+    for c in text[1:] if sign < 0 else text:
+        if not c.isdigit():
+            break
+        digits += c
+    return sign * int(digits or '0')
+
+
+def _string_set_int(os, ram, args):
+    string = args[0]
+    text = str(_signed(args[1]))
+    if len(text) > ram[string]:
+        raise ValueError("String.setInt: string is too short")
+    chars = ram[string + 2]
+    for i, c in enumerate(text):
+        ram[chars + i] = ord(c)
+    ram[string + 1] = len(text)
+    return 0
+
+
+def _array_new(os, ram, args):
+    return os.heap.alloc(_signed(args[0]))
+
+
+def _array_dispose(os, ram, args):
+    os.heap.dealloc(args[0])
+    return 0
+
+
+def _draw_span(os, ram, row, x1, x2):
+    """Pixels x1..x2 of one row, a whole word at a time where possible."""
+    if not (0 <= row < 256):
+        return
+    x1, x2 = max(x1, 0), min(x2, 511)
+    base = SCREEN + row * 32
+    while x1 <= x2:
+        word, bit = divmod(x1, 16)
+        last = min(x2, word * 16 + 15) - word * 16
+        mask = ((1 << (last - bit + 1)) - 1) << bit
+        if os.color:
+            ram[base + word] |= mask
+        else:
+            ram[base + word] &= ~mask & 0xFFFF
+        x1 = word * 16 + 16
+
+
+def _screen_clear(os, ram, args):
+    for address in range(SCREEN, SCREEN + SCREEN_WORDS):
+        ram[address] = 0
+    return 0
+
+
+def _screen_set_color(os, ram, args):
+    os.color = bool(args[0])
+    return 0
+
+
+def _screen_draw_pixel(os, ram, args):
+    x, y = _signed(args[0]), _signed(args[1])
+    _draw_span(os, ram, y, x, x)
+    return 0
+
+
+def _screen_draw_line(os, ram, args):
+    x1, y1, x2, y2 = (_signed(a) for a in args[:4])
+    if y1 == y2:
+        _draw_span(os, ram, y1, min(x1, x2), max(x1, x2))
+        return 0
+    dx, dy = abs(x2 - x1), -abs(y2 - y1)
+    sx, sy = (1 if x2 > x1 else -1), (1 if y2 > y1 else -1)
+    error = dx + dy
+    while True:
+        _draw_span(os, ram, y1, x1, x1)
+        if x1 == x2 and y1 == y2:
+            return 0
+        if 2 * error >= dy:
+            error += dy
+            x1 += sx
+        if 2 * error <= dx:
+            error += dx
+            y1 += sy
+
+
+def _screen_draw_rectangle(os, ram, args):
+    x1, y1, x2, y2 = (_signed(a) for a in args[:4])
+    for row in range(y1, y2 + 1):
+        _draw_span(os, ram, row, x1, x2)
+    return 0
+
+
+def _screen_draw_circle(os, ram, args):
+    x, y, r = (_signed(a) for a in args[:3])
+    for dy in range(-r, r + 1):
+        half = isqrt(r * r - dy * dy)
+        _draw_span(os, ram, y + dy, x - half, x + half)
+    return 0
+
+
+INTRINSICS = {
+    'Math.multiply': _math_multiply, 'Math.divide': _math_divide, 'Math.sqrt': _math_sqrt,
+    'Math.abs': _math_abs, 'Math.min': _math_min, 'Math.max': _math_max,
+    'Memory.peek': _memory_peek, 'Memory.poke': _memory_poke,
+    'Memory.alloc': _memory_alloc, 'Memory.deAlloc': _memory_dealloc,
+    'Array.new': _array_new, 'Array.dispose': _array_dispose,
+    'String.new': _string_new, 'String.dispose': _string_dispose,
+    'String.length': _string_length, 'String.charAt': _string_char_at,
+    'String.setCharAt': _string_set_char_at, 'String.appendChar': _string_append_char,
+    'String.eraseLastChar': _string_erase_last_char, 'String.intValue': _string_int_value,
+    'String.setInt': _string_set_int,
+    'String.newLine': lambda os, ram, args: 128, 'String.backSpace': lambda os, ram, args: 129,
+    'String.doubleQuote': lambda os, ram, args: 34,
+    'Screen.clearScreen': _screen_clear, 'Screen.setColor': _screen_set_color,
+    'Screen.drawPixel': _screen_draw_pixel, 'Screen.drawLine': _screen_draw_line,
+    'Screen.drawRectangle': _screen_draw_rectangle, 'Screen.drawCircle': _screen_draw_circle,
+}
+# Memory.alloc is shared by Array and String, so they can't go native without it
+REQUIRES = {'Array': 'Memory', 'String': 'Memory'}
+
+
+# --- Part 3: The Table ---
+class Intrinsics:
+    """
+    The OS functions an interpreter or emulator runs natively, with a call
+    count per function. `classes` picks whole OS classes from INTRINSICS;
+    register() adds or replaces single functions.
+    """
+
+    def __init__(self, classes=('Math', 'Memory', 'Array', 'String', 'Screen')):
+        for name in classes:
+            if name in REQUIRES and REQUIRES[name] not in classes:
+                raise ValueError(f"native {name} needs native {REQUIRES[name]}")
+        self.table = {name: function for name, function in INTRINSICS.items()
+                      if name.split('.')[0] in classes}
+        self.counts = dict.fromkeys(self.table, 0)
+        self.heap = Heap()
+        self.color = True
+
+    def __contains__(self, name):
+        return name in self.table
+
+    def register(self, name, function):
+        self.table[name] = function
+        self.counts.setdefault(name, 0)
+
+    def call(self, name, ram, args):
+        """Runs one intrinsic against `ram` and returns its result as a 16-bit word."""
+        self.counts[name] += 1
+        return self.table[name](self, ram, args) & 0xFFFF
+
+    def report(self):
+        """'calls  name' lines for the intrinsics that ran, most-called first."""
+        rows = sorted(((n, name) for name, n in self.counts.items() if n), reverse=True)
+        return '\n'.join(f"{n:>10,}  {name}" for n, name in rows)
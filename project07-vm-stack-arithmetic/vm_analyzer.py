@@ -0,0 +1,294 @@
+import os
+import sys
+import tempfile
+from collections import namedtuple
+
+from vm_translator import FRAME_TOP, clean_line, get_command_parts, parse_vm_file
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'project06-assembler'))
+from sourcemap import SourceMap
+
+# --- Part 1: What Each Command Costs ---
+# Costs come from the translator itself: a file is translated with a source
+# map, and the .asm between one command's block and the next is that
+# command's code, so the numbers follow the templates (and tail calls, data
+# runs, specialised returns) as they are. Commands the translator merged
+# into the one before them (the `return` of a tail call, the rest of a data
+# run) cost nothing on their own.
+Cost = namedtuple('Cost', 'words cycles')
+
+
+def template_cycles(asm_lines):
+    """
+    Worst-case instructions executed by one command's .asm: the longest path
+    through it, following jumps to labels inside it and stopping at jumps
+    out (a call's jump to its callee, a goto, a return).
+    """
+    instructions, labels = [], {}
+    for line in asm_lines:
+        line = clean_line(line)
+        if not line:
+            continue
+        if line.startswith('('):
+            labels[line[1:-1]] = len(instructions)
+        else:
+            instructions.append(line)
+    longest = [0] * (len(instructions) + 1)
+    for i in range(len(instructions) - 1, -1, -1):
+        instruction = instructions[i]
+        if ';' not in instruction:
+            longest[i] = 1 + longest[i + 1]
+            continue
+        target = instructions[i - 1][1:] if i and instructions[i - 1].startswith('@') else None
+        inside = labels.get(target)
+        if inside is not None and inside <= i:
+            raise ValueError(f"backward jump inside a command's code: {instruction}")
+        after = [longest[inside]] if inside is not None else [0]  # 0: left the command
+        if not instruction.endswith(';JMP'):
+            after.append(longest[i + 1])  # conditional: may fall through
+        longest[i] = 1 + max(after)
+    return longest[0]
+
+
+def command_costs(vm_path, **options):
+    """{vm line: Cost} for a .vm file as parse_vm_file(**options) translates it."""
+    module = os.path.basename(vm_path).split('.')[0]
+    source_map = SourceMap()
+    with tempfile.TemporaryDirectory() as directory:
+        asm_path = os.path.join(directory, module + '.asm')
+        parse_vm_file(vm_path, asm_path, source_map, **options)
+        with open(asm_path) as f:
+            lines = f.read().splitlines()
+    end = next(i for i in range(len(lines) - 1, -1, -1) if lines[i].startswith('// Infinite loop'))
+    starts = [(position, line) for position, _, line in source_map.entries()]
+    costs = {}
+    for k, (position, vm_line) in enumerate(starts):
+        stop = starts[k + 1][0] - 1 if k + 1 < len(starts) else end
+        block = lines[position:stop]  # position is 1-based and the block's first line is its // comment
+        words = sum(1 for line in block if clean_line(line) and not clean_line(line).startswith('('))
+        costs[vm_line] = Cost(words, template_cycles(block))
+    return costs
+
+
+# --- Part 2: Basic Blocks and Loops ---
+# stack: the working stack's height (words above LCL, locals included) at the
+# block's entry and its highest point inside it
+BasicBlock = namedtuple('BasicBlock', 'label first last words cycles successors stack_in stack_max')
+# header: the label the loop jumps back to; cycles: one trip round it, the
+# longest way through (loops inside it counted once); blocks: indices of the blocks in it
+Loop = namedtuple('Loop', 'header blocks cycles')
+# stack: highest working stack of the function itself; depth: words of stack
+# it needs above its own frame, callees included (None if recursive);
+# cycles: the longest path through it counting every loop once; external:
+# callees outside the analyzed files (the OS), counted as frame only
+FunctionCost = namedtuple('FunctionCost', 'name file words cycles locals stack depth calls external loops blocks')
+
+ARITHMETIC_EFFECT = {'add': -1, 'sub': -1, 'eq': -1, 'gt': -1, 'lt': -1, 'and': -1, 'or': -1, 'neg': 0, 'not': 0}
+CALL_FRAME = 5
+
+
+def _split_blocks(commands):
+    """Block boundaries over one function's commands: labels lead, jumps and returns end."""
+    leaders = {0}
+    for i, (command, _, _, _) in enumerate(commands):
+        if command == 'label':
+            leaders.add(i)
+        if command in ('goto', 'if-goto', 'return') and i + 1 < len(commands):
+            leaders.add(i + 1)
+    starts = sorted(leaders)
+    return [(start, end - 1) for start, end in zip(starts, starts[1:] + [len(commands)])]
+
+
+def _longest(blocks, start, allowed, stop=None):
+    """Longest cycle count from block `start` over forward edges within `allowed`, ending at `stop` if given."""
+    best = {}
+    for b in sorted(allowed, reverse=True):
+        forward = [s for s in blocks[b].successors if s > b and s in allowed]
+        tails = [best[s] for s in forward if s in best]
+        if stop is None:
+            best[b] = blocks[b].cycles + max(tails, default=0)
+        elif b == stop or tails:
+            best[b] = blocks[b].cycles + (0 if b == stop else max(tails))
+    return best.get(start, 0)
+
+
+def analyze_function(name, file_name, commands, costs):
+    """
+    A FunctionCost for one function's commands, (command, arg1, arg2, vm line)
+    with the `function` command first; depth is filled in by analyze().
+    """
+    spans = _split_blocks(commands)
+    block_at = {commands[first][1]: b for b, (first, _) in enumerate(spans) if commands[first][0] == 'label'}
+    locals_count = commands[0][2]
+    successors = []
+    for b, (first, last) in enumerate(spans):
+        command, arg1, _, _ = commands[last]
+        following = [b + 1] if b + 1 < len(spans) else []
+        if command == 'goto':
+            successors.append([block_at[arg1]])
+        elif command == 'if-goto':
+            successors.append(sorted({block_at[arg1]} | set(following)))
+        elif command == 'return':
+            successors.append([])
+        else:
+            successors.append(following)
+
+    def walk(b, height):
+        """The block's height at its end, its highest point and its (callee, height at the call)s."""
+        peak, calls = height, []
+        first, last = spans[b]
+        for command, arg1, arg2, _ in commands[first:last + 1]:
+            if command == 'function':
+                height = arg2
+            elif command == 'push':
+                height += 1
+            elif command in ('pop', 'if-goto'):
+                height -= 1
+            elif command in ARITHMETIC_EFFECT:
+                height += ARITHMETIC_EFFECT[command]
+            elif command == 'call':
+                calls.append((arg1, height))
+                height += 1 - arg2
+            peak = max(peak, height)
+        return height, peak, calls
+
+    # stack heights: forward dataflow from the entry, taking the higher one where paths disagree
+    heights = {0: 0}
+    work = [0]
+    while work:
+        b = work.pop()
+        height = walk(b, heights[b])[0]
+        for s in successors[b]:
+            if s not in heights or heights[s] < height:
+                if height > 1 << 15:
+                    raise ValueError(f"{name}: the stack grows without bound round a loop")
+                heights[s] = height
+                work.append(s)
+    stack_max, calls = {}, []
+    for b in sorted(heights):
+        _, stack_max[b], block_calls = walk(b, heights[b])
+        calls += block_calls
+
+    blocks = []
+    for b, (first, last) in enumerate(spans):
+        block_costs = [costs.get(commands[i][3], Cost(0, 0)) for i in range(first, last + 1)]
+        label = commands[first][1] if commands[first][0] == 'label' else None
+        blocks.append(BasicBlock(label, commands[first][3], commands[last][3],
+                                 sum(c.words for c in block_costs), sum(c.cycles for c in block_costs),
+                                 successors[b], heights.get(b), stack_max.get(b)))
+
+    loops = []
+    for b, block in enumerate(blocks):
+        for header in block.successors:
+            if header <= b:
+                inside = set(range(header, b + 1))
+                loops.append(Loop(blocks[header].label, sorted(inside), _longest(blocks, header, inside, b)))
+    reachable = set(heights)
+    return FunctionCost(name, file_name, sum(block.words for block in blocks),
+                        _longest(blocks, 0, reachable), locals_count,
+                        max(stack_max.values(), default=0), None, calls, [], loops, blocks)
+
+
+# --- Part 3: Whole Programs ---
+def analyze_file(vm_path, **options):
+    """
+    {function name: FunctionCost} for one .vm file, without depth or
+    external: those need the other files (see call_depths).
+    """
+    costs = command_costs(vm_path, **options)
+    file_name = os.path.basename(vm_path)
+    with open(vm_path) as f:
+        commands = [get_command_parts(clean_line(line)) + (number,)
+                    for number, line in enumerate(f, 1) if clean_line(line)]
+    starts = [i for i, command in enumerate(commands) if command[0] == 'function'] + [len(commands)]
+    return {commands[start][1]: analyze_function(commands[start][1], file_name, commands[start:end], costs)
+            for start, end in zip(starts, starts[1:])}
+
+
+def analyze(paths, **options):
+    """
+    {function name: FunctionCost} for .vm files and/or directories; options
+    go to parse_vm_file. Stack depths assume the standard 5-word call frame
+    (not static frames) and are None for functions that can recurse.
+    """
+    functions = {}
+    for path in [paths] if isinstance(paths, str) else paths:
+        files = ([os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.vm')]
+                 if os.path.isdir(path) else [path])
+        for vm_path in files:
+            functions.update(analyze_file(vm_path, **options))
+    return call_depths(functions)
+
+
+def call_depths(functions):
+    """functions (from analyze_file) with depth and external filled in over the whole call graph."""
+    functions = dict(functions)
+    depths, active = {}, set()
+
+    def depth(name):
+        """Words above name's frame while it runs, callees included; None when it can recurse."""
+        if name in depths:
+            return depths[name]
+        if name in active:
+            return None
+        active.add(name)
+        function = functions[name]
+        deepest = function.stack
+        for callee, height in function.calls:
+            below = depth(callee) if callee in functions else 0
+            if below is None:
+                deepest = None
+            elif deepest is not None:
+                deepest = max(deepest, height + CALL_FRAME + below)
+        active.discard(name)
+        depths[name] = deepest
+        return deepest
+
+    for name, function in functions.items():
+        external = sorted({callee for callee, _ in function.calls if callee not in functions})
+        functions[name] = function._replace(depth=depth(name), external=external)
+    return functions
+
+
+def stack_headroom(functions, entry='Sys.init', base=256, limit=FRAME_TOP, plan=None):
+    """
+    Words left between the deepest stack `entry` can reach (bootstrapped
+    with a call frame at `base`) and `limit`, where the heap starts. With
+    static frames, pass their FramePlan: the stack must then stay below
+    plan.bottom, where the frames start. Negative means it would overflow
+    into them or the heap; None if entry can recurse.
+    """
+    if plan is not None:
+        limit = plan.bottom
+    depth = functions[entry].depth
+    return None if depth is None else limit - base - CALL_FRAME - depth
+
+
+REPORT_KEYS = {
+    'cycles': lambda f: f.cycles, 'words': lambda f: f.words, 'stack': lambda f: f.stack,
+    'depth': lambda f: float('inf') if f.depth is None else f.depth,
+    'loop': lambda f: max((loop.cycles for loop in f.loops), default=0),
+}
+
+
+def report(functions, sort='cycles', limit=None):
+    """A table of functions, largest first by `sort` (a REPORT_KEYS name), then their loops."""
+    if sort not in REPORT_KEYS:
+        raise ValueError(f"sort by one of {', '.join(REPORT_KEYS)}")
+    rows = sorted(functions.values(), key=REPORT_KEYS[sort], reverse=True)[:limit]
+    out = [f"{'function':<32} {'words':>6} {'cycles':>7} {'locals':>6} {'stack':>5} {'depth':>6} {'loop':>6}"]
+    for f in rows:
+        depth = 'rec' if f.depth is None else f.depth
+        loop = max((loop.cycles for loop in f.loops), default='')
+        out.append(f"{f.name:<32} {f.words:>6} {f.cycles:>7} {f.locals:>6} {f.stack:>5} {depth:>6} {loop:>6}")
+    loops = sorted(((loop.cycles, f.name, loop.header) for f in rows for loop in f.loops), reverse=True)
+    if loops:
+        out.append('')
+        out.append('loops by cycles per iteration')
+        for cycles, name, header in loops[:limit]:
+            out.append(f"{cycles:>7}  {name} {header}")
+    return '\n'.join(out)
+
+
+if __name__ == '__main__':
+    print(report(analyze(sys.argv[1:] or '.'), sort=os.environ.get('SORT', 'cycles')))
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+from vm_analyzer import BasicBlock, FunctionCost, Loop, analyze_file, call_depths, stack_headroom
+from vm_translator import ENTRY_POINTS, FRAME_TOP, parse_vm_file, plan_static_frames, write_init
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'project06-assembler'))
+from linker import HackObject, assemble_object, link
+
+# Bumped whenever the translator's output changes, so cached objects are rebuilt
+TRANSLATOR_VERSION = '2'
+BOOTSTRAP_MODULE = '_bootstrap'
+
+# program: the linker's LinkedProgram; rebuilt: modules translated this time;
+# stack_limit: where the stack has to stop (the static frames' bottom, or the
+# heap); stack_headroom: words left below it at the deepest point, None if
+# not checked (no static frames, or recursion)
+BuildResult = namedtuple('BuildResult', 'program objects rebuilt seconds stack_limit stack_headroom')
+
+
+def vm_files(paths):
+    """.vm files from files and/or directories, sorted within each directory."""
+    files = []
+    for path in [paths] if isinstance(paths, str) else paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.vm')]
+        else:
+            files.append(path)
+    return files
+
+
+def source_hash(data):
+    return hashlib.sha256(TRANSLATOR_VERSION.encode() + b'\0' + data).hexdigest()
+
+
+def compile_module(vm_path, build_dir, frames=None, memory=None):
+    """
+    The object for one .vm file, from build_dir/<Module>.hobj when its source
+    hash matches, otherwise translated, assembled and saved there (the .asm
+    is kept next to it). Returns (object, rebuilt). Static `frames` are part
+    of the hash: a call site's code depends on its callee's frame. memory
+    (vm path -> object), kept by a long-running caller, is checked before
+    the disk and updated.
+    """
+    module = os.path.basename(vm_path).split('.')[0]
+    with open(vm_path, 'rb') as f:
+        data = f.read()
+    if frames:
+        data += b'\0' + repr(sorted(frames.items())).encode()
+    digest = source_hash(data)
+    if memory is not None and vm_path in memory and memory[vm_path].source_hash == digest:
+        return memory[vm_path], False
+    object_path = os.path.join(build_dir, module + '.hobj')
+    if os.path.exists(object_path):
+        try:
+            cached = HackObject.load(object_path)
+            if cached.source_hash == digest:
+                if memory is not None:
+                    memory[vm_path] = cached
+                return cached, False
+        except (ValueError, IndexError):
+            pass  # unreadable or truncated: rebuild
+    asm_path = os.path.join(build_dir, module + '.asm')
+    parse_vm_file(vm_path, asm_path, frames=frames)
+    with open(asm_path) as f:
+        obj = assemble_object(f.read().splitlines(), module, digest)
+    temporary = object_path + '.tmp'
+    obj.save(temporary)
+    os.replace(temporary, object_path)
+    if memory is not None:
+        memory[vm_path] = obj
+    return obj, True
+
+
+def analyze_module(vm_path, build_dir):
+    """
+    analyze_file for one .vm file, from build_dir/<Module>.analysis when its
+    source hash matches, otherwise analyzed and saved there, so a build with
+    static frames only analyzes the modules that changed.
+    """
+    module = os.path.basename(vm_path).split('.')[0]
+    with open(vm_path, 'rb') as f:
+        digest = source_hash(f.read())
+    analysis_path = os.path.join(build_dir, module + '.analysis')
+    if os.path.exists(analysis_path):
+        try:
+            with open(analysis_path) as f:
+                cached = json.load(f)
+            if cached['source_hash'] == digest:
+                return {name: FunctionCost(*fields[:7], [tuple(call) for call in fields[7]], fields[8],
+                                           [Loop(*loop) for loop in fields[9]],
+                                           [BasicBlock(*block) for block in fields[10]])
+                        for name, fields in cached['functions'].items()}
+        except (ValueError, KeyError, TypeError):
+            pass  # unreadable or truncated: analyze again
+    functions = analyze_file(vm_path)
+    temporary = analysis_path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump({'source_hash': digest, 'functions': functions}, f)
+    os.replace(temporary, analysis_path)
+    return functions
+
+
+def build(paths, build_dir, bootstrap=None, static_frames=False, extra_objects=(), native_os=False, memory=None):
+    """
+    Separate compilation: every .vm file becomes a cached object, and only
+    those whose source changed are translated again before the link.
+    bootstrap (SP = 256, call Sys.init) defaults to whether there is a Sys.vm.
+    static_frames plans frames over all the files first (see
+    plan_static_frames), so a change that alters the plan rebuilds every
+    object. The frames sit right above the stack, so the analyzer's deepest
+    stack (see analyze_module) is checked against their bottom, and the
+    build refuses a program that could run into them (the bound assumes
+    dynamic frames, so it errs on the safe side; recursive programs can't
+    be checked). extra_objects (e.g. native_os_object) are linked in last;
+    native_os links one for every function called but not defined. memory
+    goes to compile_module.
+    """
+    start = time.perf_counter()
+    os.makedirs(build_dir, exist_ok=True)
+    files = vm_files(paths)
+    if bootstrap is None:
+        bootstrap = any(os.path.basename(path) == 'Sys.vm' for path in files)
+    objects, rebuilt = [], []
+    if bootstrap:
+        objects.append(assemble_object(write_init().splitlines(), BOOTSTRAP_MODULE))
+    plan = plan_static_frames(files) if static_frames else None
+    frames = plan.frames if plan else None
+    headroom = None
+    if plan is not None and plan.frames:
+        functions = call_depths({name: function for path in files
+                                 for name, function in analyze_module(path, build_dir).items()})
+        entry = next((name for name in ENTRY_POINTS if name in functions), None)
+        headroom = stack_headroom(functions, entry, plan=plan) if entry else None
+        if headroom is not None and headroom < 0:
+            raise ValueError(f"the stack from {entry} can reach {-headroom} words into the static frames "
+                             f"at {plan.bottom}-{plan.top - 1}")
+    for path in files:
+        obj, fresh = compile_module(path, build_dir, frames, memory)
+        objects.append(obj)
+        if fresh:
+            rebuilt.append(obj.module)
+    extra_objects = list(extra_objects)
+    if native_os:
+        defined = {name for obj in objects + extra_objects for name in obj.exports}
+        missing = sorted({name for obj in objects for name in obj.imports()} - defined)
+        extra_objects.append(native_os_object(missing))
+    program = link(objects + extra_objects)
+    return BuildResult(program, objects, rebuilt, time.perf_counter() - start,
+                       plan.bottom if plan else FRAME_TOP, headroom)
+
+
+def native_os_object(names, module='_native_os'):
+    """
+    An object exporting a one-word body for each OS function in `names`, for
+    linking a program whose OS runs as intrinsics (IntrinsicTraps patches
+    every entry with TRAP, so the body never runs).
+    """
+    lines = []
+    for name in names:
+        lines += [f"({name})", "0;JMP"]
+    return assemble_object(lines, module)
@@ -0,0 +1,278 @@
+import os
+from array import array
+
+from vm_translator import clean_line, get_command_parts, classify_command_type
+
+# --- Part 1: Opcodes ---
+# Every VM command becomes one (opcode, arg1, arg2) triple. Push and pop are
+# specialized by addressing mode so the run loop never looks at segment names.
+PUSH_CONST, PUSH_SEG, PUSH_ADDR, POP_SEG, POP_ADDR = range(5)
+ADD, SUB, NEG, EQ, GT, LT, AND, OR, NOT = range(5, 14)
+GOTO, IF_GOTO, FUNCTION, CALL, RETURN, NATIVE = range(14, 20)
+
+ARITHMETIC_OPCODES = {'add': ADD, 'sub': SUB, 'neg': NEG, 'eq': EQ, 'gt': GT,
+                      'lt': LT, 'and': AND, 'or': OR, 'not': NOT}
+# segments addressed through a base pointer: arg1 is the pointer's RAM address
+POINTER_SEGMENTS = {'local': 1, 'argument': 2, 'this': 3, 'that': 4}
+# segments at fixed addresses: arg1 is the address itself
+FIXED_SEGMENTS = {'temp': 5, 'pointer': 3}
+STATIC_BASE = 16
+STACK_BASE = 256
+RAM_WORDS = 32768
+
+
+# --- Part 2: Loading ---
+class VMProgram:
+    """
+    One or more .vm files parsed once into a flat array('i') of opcode
+    triples. Labels are scoped to their function (as the translator's
+    Function$label would be), call targets and labels are resolved to code
+    indices, and statics get RAM addresses from 16 in order of first use.
+    """
+
+    def __init__(self):
+        self.code = array('i')
+        self.functions = {}      # name -> code index
+        self.statics = {}        # 'File.i' -> RAM address
+        self.natives = []        # NATIVE arg1 -> intrinsic name
+        self.lines = []          # code index -> (file, line), for error messages
+        self._pending = []       # (code index, label key or function name, kind)
+        self._labels = {}
+        self._instructions = None
+
+    def __len__(self):
+        return len(self.code) // 3
+
+    def instructions(self):
+        """The code as a list of (op, arg1, arg2) tuples, which the run loop unpacks fastest."""
+        if self._instructions is None:
+            code = self.code
+            self._instructions = [tuple(code[i:i + 3]) for i in range(0, len(code), 3)]
+        return self._instructions
+
+    def _emit(self, op, arg1=0, arg2=0, where=None):
+        self.code.extend((op, arg1, arg2))
+        self._instructions = None
+        self.lines.append(where)
+
+    def add_file(self, path):
+        with open(path, 'r') as f:
+            self.add_source(f.read().splitlines(), os.path.basename(path).split('.')[0])
+
+    def add_source(self, lines, file_name):
+        function = None
+        for number, line in enumerate(lines, 1):
+            cleaned = clean_line(line)
+            if not cleaned:
+                continue
+            where = (file_name, number)
+            command, arg1, arg2 = get_command_parts(cleaned)
+            c_type = classify_command_type(command)
+            index = len(self)
+            if c_type == 'C_ARITHMETIC':
+                self._emit(ARITHMETIC_OPCODES[command], where=where)
+            elif c_type in ('C_PUSH', 'C_POP'):
+                self._emit_push_pop(c_type, arg1, arg2, file_name, where)
+            elif c_type == 'C_LABEL':
+                self._labels[(function, arg1)] = index
+            elif c_type in ('C_GOTO', 'C_IF'):
+                self._pending.append((index, (function, arg1), 'label'))
+                self._emit(GOTO if c_type == 'C_GOTO' else IF_GOTO, where=where)
+            elif c_type == 'C_FUNCTION':
+                function = arg1
+                self.functions[arg1] = index
+                self._emit(FUNCTION, arg2, where=where)
+            elif c_type == 'C_CALL':
+                self._pending.append((index, arg1, 'function'))
+                self._emit(CALL, 0, arg2, where=where)
+            elif c_type == 'C_RETURN':
+                self._emit(RETURN, where=where)
+
+    def _emit_push_pop(self, c_type, segment, index, file_name, where):
+        push = c_type == 'C_PUSH'
+        if segment == 'constant':
+            if not push:
+                raise ValueError(f"{where}: cannot pop to constant")
+            self._emit(PUSH_CONST, index, where=where)
+        elif segment in POINTER_SEGMENTS:
+            self._emit(PUSH_SEG if push else POP_SEG, POINTER_SEGMENTS[segment], index, where)
+        elif segment in FIXED_SEGMENTS:
+            self._emit(PUSH_ADDR if push else POP_ADDR, FIXED_SEGMENTS[segment] + index, where=where)
+        elif segment == 'static':
+            name = f"{file_name}.{index}"
+            if name not in self.statics:
+                self.statics[name] = STATIC_BASE + len(self.statics)
+            self._emit(PUSH_ADDR if push else POP_ADDR, self.statics[name], where=where)
+        else:
+            raise ValueError(f"{where}: unknown segment '{segment}'")
+
+    def link(self, natives=()):
+        """
+        Resolves goto/call targets; call after the last file is added. Calls to
+        names in `natives` (e.g. an os_intrinsics.Intrinsics) become NATIVE ops,
+        whether or not the function is also defined in .vm code.
+        """
+        for index, target, kind in self._pending:
+            if kind == 'function' and target in natives:
+                if target not in self.natives:
+                    self.natives.append(target)
+                self.code[3 * index] = NATIVE
+                self.code[3 * index + 1] = self.natives.index(target)
+                continue
+            table = self._labels if kind == 'label' else self.functions
+            if target not in table:
+                name = target[1] if kind == 'label' else target
+                raise ValueError(f"{self.lines[index]}: unknown {kind} '{name}'")
+            self.code[3 * index + 1] = table[target]
+        self._pending = []
+        self._instructions = None
+        return self
+
+
+def load_vm(paths, natives=()):
+    """A linked VMProgram from .vm files and/or directories of them (sorted, like the translator would see them)."""
+    program = VMProgram()
+    for path in [paths] if isinstance(paths, str) else paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith('.vm'):
+                    program.add_file(os.path.join(path, name))
+        else:
+            program.add_file(path)
+    return program.link(natives)
+
+
+# --- Part 3: Running ---
+class VMInterpreter:
+    """
+    Runs a VMProgram on the same RAM layout the translated Hack code uses
+    (SP/LCL/ARG/THIS/THAT at 0-4, temp at 5, statics from 16, stack from
+    256, the standard 5-word call frame), so RAM can be compared word for
+    word with an emulator in differential tests. Return addresses are VM code
+    indices rather than ROM addresses. Calls linked as NATIVE run in
+    `intrinsics` (see os_intrinsics.py) instead of as VM code.
+    """
+
+    def __init__(self, program, intrinsics=None):
+        missing = [name for name in program.natives if intrinsics is None or name not in intrinsics]
+        if missing:
+            raise ValueError(f"no intrinsics for {', '.join(missing)}")
+        self.program = program
+        self.intrinsics = intrinsics
+        self.ram = [0] * RAM_WORDS
+        self.pc = 0
+        self.steps = 0
+        self.halted = False
+
+    def bootstrap(self):
+        """SP = 256 and call Sys.init, like the translator's bootstrap code."""
+        self.ram[0] = STACK_BASE
+        if 'Sys.init' not in self.program.functions:
+            raise ValueError("bootstrap needs a Sys.init function")
+        ram = self.ram
+        sp = ram[0]
+        ram[sp:sp + 5] = [len(self.program), ram[1], ram[2], ram[3], ram[4]]
+        ram[2] = sp
+        ram[1] = ram[0] = sp + 5
+        self.pc = self.program.functions['Sys.init']
+
+    def run(self, max_steps=10_000_000):
+        """
+        Runs until the code falls off its end, reaches a `label X / goto X`
+        self-loop (halted), or max_steps. Returns the number of VM commands run.
+        SP lives in a local and RAM[0] is written back on exit, even when an
+        intrinsic raises. Branches are ordered by how often compiled code uses
+        them, and flipping the sign bit turns a signed 16-bit comparison into
+        an unsigned one.
+        """
+        code = self.program.instructions()
+        natives, intrinsics = self.program.natives, self.intrinsics
+        ram = self.ram
+        end = len(code)
+        pc = self.pc
+        sp = ram[0]
+        steps = 0
+        try:
+            while steps < max_steps:
+                if pc >= end:
+                    self.halted = True
+                    break
+                op, arg1, arg2 = code[pc]
+                steps += 1
+                pc += 1
+                if op == PUSH_SEG:
+                    ram[sp] = ram[ram[arg1] + arg2]
+                    sp += 1
+                elif op == PUSH_CONST:
+                    ram[sp] = arg1
+                    sp += 1
+                elif op == POP_SEG:
+                    sp -= 1
+                    ram[ram[arg1] + arg2] = ram[sp]
+                elif op == PUSH_ADDR:
+                    ram[sp] = ram[arg1]
+                    sp += 1
+                elif op == POP_ADDR:
+                    sp -= 1
+                    ram[arg1] = ram[sp]
+                elif op == ADD:
+                    sp -= 1
+                    ram[sp - 1] = (ram[sp - 1] + ram[sp]) & 0xFFFF
+                elif op == SUB:
+                    sp -= 1
+                    ram[sp - 1] = (ram[sp - 1] - ram[sp]) & 0xFFFF
+                elif op == LT:
+                    sp -= 1
+                    # like the translated D=M-D; D;JLT: the sign of the wrapped difference
+                    ram[sp - 1] = 0xFFFF if (ram[sp - 1] - ram[sp]) & 0x8000 else 0
+                elif op == IF_GOTO:
+                    sp -= 1
+                    if ram[sp]:
+                        pc = arg1
+                elif op == GOTO:
+                    if arg1 == pc - 1:
+                        pc -= 1
+                        self.halted = True
+                        break
+                    pc = arg1
+                elif op == CALL:
+                    ram[sp:sp + 5] = [pc, ram[1], ram[2], ram[3], ram[4]]
+                    ram[2] = sp - arg2
+                    sp += 5
+                    ram[1] = sp
+                    pc = arg1
+                elif op == FUNCTION:
+                    ram[sp:sp + arg1] = [0] * arg1
+                    sp += arg1
+                elif op == RETURN:
+                    frame = ram[1]
+                    pc = ram[frame - 5]
+                    arg = ram[2]
+                    ram[arg] = ram[sp - 1]
+                    sp = arg + 1
+                    ram[4], ram[3], ram[2], ram[1] = ram[frame - 1], ram[frame - 2], ram[frame - 3], ram[frame - 4]
+                elif op == NATIVE:
+                    sp -= arg2
+                    ram[sp] = intrinsics.call(natives[arg1], ram, ram[sp:sp + arg2])
+                    sp += 1
+                elif op == GT:
+                    sp -= 1
+                    ram[sp - 1] = 0xFFFF if 0 < (ram[sp - 1] - ram[sp]) & 0xFFFF < 0x8000 else 0
+                elif op == EQ:
+                    sp -= 1
+                    ram[sp - 1] = 0xFFFF if ram[sp - 1] == ram[sp] else 0
+                elif op == AND:
+                    sp -= 1
+                    ram[sp - 1] &= ram[sp]
+                elif op == OR:
+                    sp -= 1
+                    ram[sp - 1] |= ram[sp]
+                elif op == NEG:
+                    ram[sp - 1] = -ram[sp - 1] & 0xFFFF
+                else:
+                    ram[sp - 1] = ~ram[sp - 1] & 0xFFFF
+        finally:
+            ram[0] = sp
+            self.pc = pc
+            self.steps += steps
+        return steps
@@ -1,11 +1,21 @@
 import random
 import os
+from collections import namedtuple
+
+# arguments each command other than arithmetic takes
+COMMAND_ARGUMENTS = {'push': 2, 'pop': 2, 'function': 2, 'call': 2,
+                     'label': 1, 'goto': 1, 'if-goto': 1, 'return': 0}
 
 def get_command_parts(line):
     """Extracts the command and its arguments from a line of VM code."""
     parts = line.split()
     command = parts[0]
+    expected = COMMAND_ARGUMENTS.get(command)
+    if expected is not None and len(parts) - 1 != expected:
+        raise ValueError(f"'{line}': {command} takes {expected} argument{'s' if expected != 1 else ''}")
     arg1 = parts[1] if len(parts) > 1 else None
+    if len(parts) > 2 and not parts[2].isdigit():
+        raise ValueError(f"'{line}': {parts[2]} is not a number")
     arg2 = int(parts[2]) if len(parts) > 2 else None
     return command, arg1, arg2
 
@@ -79,9 +89,12 @@ def _write_comparison_op(command):
 (END_{label_suffix})
 """
 
-def _get_address_calc(segment, index, static_filename):
+def _get_address_calc(segment, index, static_filename, frame=None):
     """Helper to generate assembly for calculating an effective memory address and
-       placing it into the A register."""
+       placing it into the A register. In a static frame, local and argument are one @addr."""
+    if frame is not None and segment in ('local', 'argument'):
+        return f"""
+    @{frame_address(frame, segment, index)}"""
     if segment in ['local', 'argument', 'this', 'that']:
         segment_map = {'local': 'LCL', 'argument': 'ARG', 'this': 'THIS', 'that': 'THAT'}
         return f"""
@@ -103,7 +116,7 @@ def _get_address_calc(segment, index, static_filename):
     A=A""" # A now holds the final address
     raise ValueError(f"Unknown segment: {segment}")
 
-def write_push(segment, index, static_filename):
+def write_push(segment, index, static_filename, frame=None):
     """Generates assembly code for a push operation."""
     if segment == 'constant':
         return f"""
@@ -117,7 +130,7 @@ def write_push(segment, index, static_filename):
 """
     
     # Calculate the address and put it into A
-    address_calc_asm = _get_address_calc(segment, index, static_filename)
+    address_calc_asm = _get_address_calc(segment, index, static_filename, frame)
     
     # Common code: load value from A into D, then push D to stack
     return address_calc_asm + """
@@ -129,8 +142,17 @@ def write_push(segment, index, static_filename):
     M=M+1
 """
 
-def write_pop(segment, index, static_filename):
+def write_pop(segment, index, static_filename, frame=None):
     """Generates assembly code for a pop operation."""
+    if frame is not None and segment in ('local', 'argument'):
+        # a fixed address needs no R13 to hold it while popping
+        return f"""
+    @SP
+    AM=M-1
+    D=M
+    @{frame_address(frame, segment, index)}
+    M=D
+"""
     # Calculate the address and put it into A
     address_calc_asm = _get_address_calc(segment, index, static_filename)
 
@@ -149,6 +171,251 @@ def write_pop(segment, index, static_filename):
 """
 
 
+def write_label(label, function):
+    """Labels are scoped to their function as function$label, like the standard translator's."""
+    return f"({function}${label})" if function else f"({label})"
+
+def write_goto(label, function):
+    target = f"{function}${label}" if function else label
+    return f"""
+    @{target}
+    0;JMP
+"""
+
+def write_if_goto(label, function):
+    target = f"{function}${label}" if function else label
+    return f"""
+    @SP
+    AM=M-1
+    D=M
+    @{target}
+    D;JNE
+"""
+
+def write_function(function_name, n_vars):
+    """The entry label, then n_vars zeros pushed for the locals: one SP update for all of them."""
+    if n_vars == 0:
+        return f"({function_name})"
+    if n_vars == 1:
+        return f"""({function_name})
+    @SP
+    A=M
+    M=0
+    @SP
+    M=M+1"""
+    return f"""({function_name})
+    @SP
+    A=M
+    M=0""" + """
+    A=A+1
+    M=0""" * (n_vars - 1) + """
+    D=A+1
+    @SP
+    M=D"""
+
+def write_call(function_name, n_args, return_label):
+    """
+    Pushes the return address and the caller's LCL/ARG/THIS/THAT, repositions
+    ARG and LCL, jumps. SP is bumped as each word is stored (AM=M+1) and once
+    more at the end, which leaves the new SP in D for LCL and ARG.
+    """
+    saved = ''.join(f"""
+    @{pointer}
+    D=M
+    @SP
+    AM=M+1
+    M=D""" for pointer in ('LCL', 'ARG', 'THIS', 'THAT'))
+    return f"""
+    @{return_label}
+    D=A
+    @SP
+    A=M
+    M=D""" + saved + f"""
+    @SP
+    MD=M+1
+    @LCL
+    M=D
+    @{n_args + 5}
+    D=D-A
+    @ARG
+    M=D
+    @{function_name}
+    0;JMP
+({return_label})
+"""
+
+def write_tail_call(function_name, n_args):
+    """
+    `call f n` directly followed by `return`, when the caller has at least n
+    arguments: f's arguments overwrite the caller's, the caller's saved frame
+    and LCL are reused as they are, and f returns straight to the caller's
+    caller. SP = LCL drops the caller's locals and working stack.
+    """
+    copies = ''.join("""
+    @SP
+    AM=M-1
+    D=M
+    @ARG
+    A=M""" + """
+    A=A+1""" * i + """
+    M=D""" for i in reversed(range(n_args)))
+    return copies + f"""
+    @LCL
+    D=M
+    @SP
+    M=D
+    @{function_name}
+    0;JMP
+"""
+
+def write_return(has_args=False):
+    """
+    Return value to ARG[0], SP after it, caller's pointers back from the frame,
+    jump to the return address. With no arguments ARG[0] is the return
+    address's own slot, so it's saved in R14 first; a function known to have
+    arguments (has_args) reads it last instead.
+    """
+    lines = ['@SP', 'AM=M-1', 'D=M', '@ARG', 'A=M', 'M=D', 'D=A+1', '@SP', 'M=D',
+             '@LCL', 'D=M', '@R13', 'AM=D-1', 'D=M', '@THAT', 'M=D']
+    for pointer in ('THIS', 'ARG', 'LCL'):
+        lines += ['@R13', 'AM=M-1', 'D=M', f'@{pointer}', 'M=D']
+    if has_args:
+        lines += ['@R13', 'A=M-1', 'A=M', '0;JMP']
+    else:
+        lines = ['@LCL', 'D=M', '@5', 'A=D-A', 'D=M', '@R14', 'M=D'] + lines + ['@R14', 'A=M', '0;JMP']
+    return '\n    '.join(lines)
+
+def write_init():
+    """Bootstrap: SP = 256, then call Sys.init."""
+    return """
+    @256
+    D=A
+    @SP
+    M=D""" + write_call('Sys.init', 0, 'Sys.init$ret.bootstrap')
+
+# Static frames: a function that can never have two activations at once
+# (it is on no call-graph cycle) keeps its arguments and locals at fixed RAM
+# addresses, so `push local 2` is `@addr D=M` instead of an LCL-relative
+# address calculation, and the call needs no saved LCL/ARG/THIS/THAT.
+# Layout from base: arguments, locals, return address, SP at entry, and
+# THIS/THAT when the function pops to pointer.
+Frame = namedtuple('Frame', 'base n_args n_locals saves_pointers')
+FramePlan = namedtuple('FramePlan', 'frames bottom top')
+ENTRY_POINTS = ('Sys.init', 'Main.main')
+FRAME_TOP = 2048  # frames go just below the heap, taking the top of the stack
+
+def frame_size(frame):
+    return frame.n_args + frame.n_locals + 2 + (2 if frame.saves_pointers else 0)
+
+def frame_address(frame, segment, index):
+    """The fixed RAM address of argument/local `index`, or of 'ret', 'sp', 'this' or 'that'."""
+    if segment == 'argument':
+        if index >= frame.n_args:
+            raise ValueError(f"argument {index} of a function called with {frame.n_args}")
+        return frame.base + index
+    if segment == 'local':
+        if index >= frame.n_locals:
+            raise ValueError(f"local {index} of a function with {frame.n_locals}")
+        return frame.base + frame.n_args + index
+    return frame.base + frame.n_args + frame.n_locals + ('ret', 'sp', 'this', 'that').index(segment)
+
+def plan_static_frames(input_files, entry_points=ENTRY_POINTS, top=FRAME_TOP):
+    """
+    Whole-program call graph of the .vm files, and a Frame for every function
+    that is defined there, not an entry point, always called with the same
+    number of arguments and on no cycle. Frames are overlaid like a compiled
+    stack: a function's frame lies above those of everything that can be
+    active when it runs, so the region (bottom..top) is as deep as the
+    deepest chain of static calls, not the sum of all frames. Calls to
+    functions outside the files (the OS) are leaves.
+    """
+    callees, n_locals, n_args, pops_pointer = {}, {}, {}, set()
+    for path in input_files:
+        function = None
+        with open(path, 'r') as infile:
+            for vm_line, line in enumerate(infile, 1):
+                cleaned = clean_line(line)
+                if not cleaned:
+                    continue
+                try:
+                    command, arg1, arg2 = get_command_parts(cleaned)
+                except ValueError as e:
+                    raise ValueError(f"{os.path.basename(path)} line {vm_line}: {e}") from None
+                if command == 'function':
+                    function = arg1
+                    callees[function], n_locals[function] = set(), arg2
+                elif command == 'call':
+                    callees[function].add(arg1)
+                    n_args.setdefault(arg1, set()).add(arg2)
+                elif command == 'pop' and arg1 == 'pointer':
+                    pops_pointer.add(function)
+
+    def reaches(start, goal):
+        seen, stack = set(), list(callees[start])
+        while stack:
+            name = stack.pop()
+            if name == goal:
+                return True
+            if name in callees and name not in seen:
+                seen.add(name)
+                stack.extend(callees[name])
+        return False
+
+    sizes = {}
+    for name in callees:
+        if name in entry_points or len(n_args.get(name, ())) != 1 or reaches(name, name):
+            continue
+        args, = n_args[name]
+        sizes[name] = frame_size(Frame(0, args, n_locals[name], name in pops_pointer))
+    # longest path over the call graph, counting static frames only; cycles
+    # are all dynamic (size 0), so this settles
+    offsets = dict.fromkeys(callees, 0)
+    changed = True
+    while changed:
+        changed = False
+        for caller, called in callees.items():
+            depth = offsets[caller] + sizes.get(caller, 0)
+            for name in called:
+                if name in offsets and depth > offsets[name]:
+                    offsets[name] = depth
+                    changed = True
+    total = max((offsets[name] + size for name, size in sizes.items()), default=0)
+    bottom = top - total
+    frames = {}
+    for name in sizes:
+        args, = n_args[name]
+        frames[name] = Frame(bottom + offsets[name], args, n_locals[name], name in pops_pointer)
+    return FramePlan(frames, bottom, top)
+
+def write_static_function(function_name, frame):
+    """The entry label, SP saved for the return, locals zeroed in place, THIS/THAT saved if they'll be popped."""
+    lines = [f"({function_name})", '@SP', 'D=M', f"@{frame_address(frame, 'sp', 0)}", 'M=D']
+    for i in range(frame.n_locals):
+        lines += [f"@{frame_address(frame, 'local', i)}", 'M=0']
+    if frame.saves_pointers:
+        for pointer in ('THIS', 'THAT'):
+            lines += [f"@{pointer}", 'D=M', f"@{frame_address(frame, pointer.lower(), 0)}", 'M=D']
+    return '\n    '.join(lines)
+
+def write_static_call(function_name, frame, return_label):
+    """Pops the arguments straight into the callee's frame, stores the return address there, jumps."""
+    lines = []
+    for i in reversed(range(frame.n_args)):
+        lines += ['@SP', 'AM=M-1', 'D=M', f"@{frame_address(frame, 'argument', i)}", 'M=D']
+    lines += [f"@{return_label}", 'D=A', f"@{frame_address(frame, 'ret', 0)}", 'M=D',
+              f"@{function_name}", '0;JMP']
+    return '\n    '.join(lines) + f"\n({return_label})"
+
+def write_static_return(frame):
+    """Return value to where the arguments were (SP at entry), SP after it, THIS/THAT back, jump."""
+    lines = ['@SP', 'A=M-1', 'D=M', f"@{frame_address(frame, 'sp', 0)}", 'A=M', 'M=D',
+             'D=A+1', '@SP', 'M=D']
+    if frame.saves_pointers:
+        for pointer in ('THIS', 'THAT'):
+            lines += [f"@{frame_address(frame, pointer.lower(), 0)}", 'D=M', f"@{pointer}", 'M=D']
+    lines += [f"@{frame_address(frame, 'ret', 0)}", 'A=M', '0;JMP']
+    return '\n    '.join(lines)
+
 def clean_line(line):
     """Removes comments and leading/trailing whitespace."""
     return line.split('//')[0].strip()
@@ -162,30 +429,193 @@ def add_end_loop():
     0;JMP
 """
 
-def parse_vm_file(input_file, output_file):
-    """Translates a .vm file into a .asm file."""
+# Segments an array base can come from inside a data run: `pop pointer 1`
+# and `pop temp 0` are part of every store, so THAT and temp 0 are excluded
+DATA_BASE_SEGMENTS = ('static', 'local', 'argument', 'this', 'temp')
+DATA_POINTERS = ('R13', 'R14', 'R15')
+MIN_DATA_RUN = 8
+
+def match_array_store(commands, i):
+    """
+    Matches the compiler's `let base[index] = value` with constant index and
+    value at commands[i]:  push constant index / push <base> / add /
+    push constant value [/ neg] / pop temp 0 / pop pointer 1 / push temp 0 / pop that 0.
+    Returns ((segment, base index), index, value as a 16-bit word, commands used) or None.
+    """
+    def at(k):
+        return commands[i + k] if i + k < len(commands) else (None, None, None)
+
+    index, base, add, value = at(0), at(1), at(2), at(3)
+    if not (index[:2] == ('push', 'constant') and base[0] == 'push' and base[1] in DATA_BASE_SEGMENTS
+            and not (base[1] == 'temp' and base[2] == 0)
+            and add[0] == 'add' and value[:2] == ('push', 'constant')):
+        return None
+    word, used = value[2], 4
+    if at(4)[0] == 'neg':
+        word, used = -word & 0xFFFF, 5
+    tail = [at(used + k) for k in range(4)]
+    if tail != [('pop', 'temp', 0), ('pop', 'pointer', 1), ('push', 'temp', 0), ('pop', 'that', 0)]:
+        return None
+    return (base[1], base[2]), index[2], word, used + 4
+
+def find_data_run(commands, i):
+    """The array stores starting at commands[i] that one data block can take: at most one base per pointer."""
+    stores, bases = [], set()
+    while True:
+        store = match_array_store(commands, i)
+        if store is None:
+            break
+        if store[0] not in bases and len(bases) == len(DATA_POINTERS):
+            break
+        bases.add(store[0])
+        stores.append(store)
+        i += store[3]
+    return stores
+
+# constants the ALU makes without an A-instruction
+ALU_CONSTANTS = {0: '0', 1: '1', 0xFFFF: '-1'}
+
+def _write_load_constant(word):
+    """D = word in as few instructions as possible."""
+    if word in ALU_CONSTANTS:
+        return f"D={ALU_CONSTANTS[word]}"
+    if word < 0x8000:
+        return f"@{word}\nD=A"
+    if -word & 0xFFFF < 0x8000:
+        return f"@{-word & 0xFFFF}\nD=-A"
+    return f"@{~word & 0xFFFF}\nD=!A"
+
+def write_data_run(stores, static_filename, frame=None):
+    """
+    Straight-line code for a run of constant array stores. Hack can't read
+    ROM as data, so the table lives in the instruction stream: a pointer per
+    array base in R13-R15, and each store is `<load value> @Rk AM=M+1 M=D`
+    while indices ascend by one. A value already in D isn't loaded again.
+    Ends with THAT and temp 0 as the original stores leave them; the stack
+    is untouched.
+    """
+    lines = []
+    pointers, positions = {}, {}
+    d_value = None
+    for base, index, word, _ in stores:
+        if base not in pointers:
+            pointers[base] = DATA_POINTERS[len(pointers)]
+        pointer = pointers[base]
+        if positions.get(base) != index - 1:
+            # point one before the element, ready for the pre-increment
+            lines += _get_address_calc(base[0], base[1], static_filename, frame).split() + ['D=M']
+            if index == 0:
+                lines.append('D=D-1')
+            elif index > 1:
+                lines += [f'@{index - 1}', 'D=D+A']
+            lines += [f'@{pointer}', 'M=D']
+            d_value = None
+        if d_value != word:
+            lines += _write_load_constant(word).split('\n')
+            d_value = word
+        lines += [f'@{pointer}', 'AM=M+1', 'M=D']
+        positions[base] = index
+    last_base, _, last_word, _ = stores[-1]
+    lines += [f'@{pointers[last_base]}', 'D=M', '@THAT', 'M=D']
+    lines += _write_load_constant(last_word).split('\n') + ['@5', 'M=D']
+    return '\n'.join(f"    {line}" for line in lines)
+
+def parse_vm_file(input_file, output_file, source_map=None, compact_data=True, frames=None, tail_calls=True):
+    """
+    Translates a .vm file into a .asm file. If a SourceMap is given, each .asm
+    line (1-based) is mapped to the .vm line it was translated from. With
+    compact_data, runs of MIN_DATA_RUN or more constant array stores (like
+    Trig.init's tables) become one data block (see write_data_run). `frames`
+    (plan_static_frames(...).frames, for every file of the program) gives
+    the functions translated with static frames. With tail_calls, `call` then
+    `return` becomes write_tail_call where the caller is known to have
+    enough arguments: it reads argument n-1 or above.
+    """
+    frames = frames or {}
+    frame = None
     static_filename = os.path.basename(output_file).split('.')[0]
+    if source_map is not None:
+        file_id = source_map.file_id(os.path.basename(input_file))
+    asm_line = 1
+    function = None
+    calls = 0
 
-    with open(input_file, 'r') as infile, open(output_file, 'w') as outfile:
-        for line in infile:
-            cleaned_line = clean_line(line)
-            if not cleaned_line:
-                continue
+    with open(input_file, 'r') as infile:
+        lines = [(vm_line, clean_line(line)) for vm_line, line in enumerate(infile, 1)]
+    lines = [(vm_line, cleaned) for vm_line, cleaned in lines if cleaned]
+    commands = []
+    for vm_line, cleaned in lines:
+        try:
+            commands.append(get_command_parts(cleaned))
+        except ValueError as e:
+            raise ValueError(f"{os.path.basename(input_file)} line {vm_line}: {e}") from None
+    # arguments each function certainly has: one more than the highest it uses
+    min_args, current = {}, None
+    for command, arg1, arg2 in commands:
+        if command == 'function':
+            min_args[arg1] = 0
+            current = arg1
+        elif arg1 == 'argument' and command in ('push', 'pop'):
+            min_args[current] = max(min_args.get(current, 0), arg2 + 1)
 
-            command, arg1, arg2 = get_command_parts(cleaned_line)
+    with open(output_file, 'w') as outfile:
+        i = 0
+        while i < len(commands):
+            vm_line, cleaned_line = lines[i]
+            command, arg1, arg2 = commands[i]
             c_type = classify_command_type(command)
             assembly_code = ""
+            used = 1
 
-            if c_type == 'C_ARITHMETIC':
+            stores = find_data_run(commands, i) if compact_data else []
+            if len(stores) >= MIN_DATA_RUN:
+                used = sum(store[3] for store in stores)
+                cleaned_line = (f"data: {len(stores)} array stores, {used} commands,"
+                                f" lines {vm_line}-{lines[i + used - 1][0]}")
+                assembly_code = write_data_run(stores, static_filename, frame)
+            elif c_type == 'C_ARITHMETIC':
                 assembly_code = write_arithmetic(command)
             elif c_type == 'C_PUSH':
-                assembly_code = write_push(arg1, arg2, static_filename)
+                assembly_code = write_push(arg1, arg2, static_filename, frame)
             elif c_type == 'C_POP':
-                assembly_code = write_pop(arg1, arg2, static_filename)
-            outfile.write(f"// {cleaned_line}\n{assembly_code.strip()}\n")
-            
-        outfile.write(add_end_loop())
+                assembly_code = write_pop(arg1, arg2, static_filename, frame)
+            elif c_type == 'C_LABEL':
+                assembly_code = write_label(arg1, function)
+            elif c_type == 'C_GOTO':
+                assembly_code = write_goto(arg1, function)
+            elif c_type == 'C_IF':
+                assembly_code = write_if_goto(arg1, function)
+            elif c_type == 'C_FUNCTION':
+                function, frame = arg1, frames.get(arg1)
+                if frame is not None:
+                    assembly_code = write_static_function(arg1, frame)
+                else:
+                    assembly_code = write_function(arg1, arg2)
+            elif c_type == 'C_CALL':
+                return_label = f"{function or static_filename}$ret.{calls}"
+                if (tail_calls and frame is None and arg1 not in frames and i + 1 < len(commands)
+                        and commands[i + 1][0] == 'return' and arg2 <= min_args.get(function, 0)):
+                    cleaned_line += " / return (tail call)"
+                    assembly_code = write_tail_call(arg1, arg2)
+                    used = 2
+                elif arg1 in frames:
+                    assembly_code = write_static_call(arg1, frames[arg1], return_label)
+                else:
+                    assembly_code = write_call(arg1, arg2, return_label)
+                calls += 1
+            elif c_type == 'C_RETURN':
+                if frame is not None:
+                    assembly_code = write_static_return(frame)
+                else:
+                    assembly_code = write_return(min_args.get(function, 0) > 0)
+            block = f"// {cleaned_line}\n{assembly_code.strip()}\n"
+            if source_map is not None:
+                source_map.add(asm_line, file_id, vm_line)
+            asm_line += block.count('\n')
+            outfile.write(block)
+            i += used
 
+        outfile.write(add_end_loop())
 
 if __name__ == '__main__':
     parse_vm_file('StaticTest.vm', 'StaticTest.asm')
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""
+throughput benchmarks for tokenizer.py and parser.py over synthetic Jack classes
+run: python3 benchmark.py [--out results.json] [--baseline old.json]
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tokenizer import JackTokenizer
+from parser import JackParser
+
+# name -> generator settings; each corpus stresses a different part of the grammar
+CORPORA = {
+    'many_subroutines': dict(subroutines=400, statements=8, depth=1, expression_terms=3),
+    'deep_nesting':     dict(subroutines=20, statements=4, depth=12, expression_terms=3),
+    'long_expressions': dict(subroutines=40, statements=10, depth=1, expression_terms=60),
+}
+
+
+# --- Synthetic Jack Generation ---
+
+def _expression(rng, terms):
+    """A flat expression of `terms` terms mixing variables, constants, calls and arrays."""
+    parts = []
+    for _ in range(terms):
+        kind = rng.randrange(5)
+        if kind == 0:
+            parts.append(str(rng.randrange(32768)))
+        elif kind == 1:
+            parts.append(f"a[i + {rng.randrange(16)}]")
+        elif kind == 2:
+            parts.append("Math.max(x, y)")
+        elif kind == 3:
+            parts.append("(x - y)")
+        else:
+            parts.append(rng.choice(('x', 'y', 'i')))
+    expression = parts[0]
+    for part in parts[1:]:
+        expression += f" {rng.choice('+-*/&|')} {part}"
+    return expression
+
+
+def _statements(rng, count, depth, terms, indent, counter):
+    """Emits `count` statements; while/if bodies recurse until depth runs out."""
+    lines = []
+    pad = '    ' * indent
+    for _ in range(count):
+        counter[0] += 1
+        kind = rng.randrange(4) if depth > 1 else rng.randrange(2)
+        if kind == 0:
+            lines.append(f"{pad}let x = {_expression(rng, terms)};")
+        elif kind == 1:
+            lines.append(f"{pad}do Output.printInt({_expression(rng, terms)});")
+        elif kind == 2:
+            lines.append(f"{pad}while (i < {_expression(rng, terms)}) {{")
+            lines.extend(_statements(rng, 2, depth - 1, terms, indent + 1, counter))
+            lines.append(f"{pad}}}")
+        else:
+            lines.append(f"{pad}if (x = {_expression(rng, terms)}) {{")
+            lines.extend(_statements(rng, 2, depth - 1, terms, indent + 1, counter))
+            lines.append(f"{pad}}} else {{")
+            lines.extend(_statements(rng, 1, depth - 1, terms, indent + 1, counter))
+            lines.append(f"{pad}}}")
+    return lines
+
+
+def generate_class(subroutines, statements, depth, expression_terms, seed=0):
+    """Returns (jack source, number of statements) for a synthetic class."""
+    rng = random.Random(seed)
+    counter = [0]
+    lines = ["class Synthetic {", "    field int x, y;", "    static Array a;", ""]
+    for n in range(subroutines):
+        lines.append(f"    method int f{n}(int i) {{")
+        lines.append("        var int k;")
+        lines.extend(_statements(rng, statements, depth, expression_terms, 2, counter))
+        lines.append("        return x;")
+        counter[0] += 1
+        lines.append("    }")
+        lines.append("")
+    lines.append("}")
+    return '\n'.join(lines) + '\n', counter[0]
+
+
+# --- Measurement ---
+
+def _best_of(repeats, fn):
+    """Runs fn `repeats` times and returns the fastest wall time."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_memory(fn):
+    """Peak bytes allocated by Python while fn runs."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_corpus(name, settings, repeats=3):
+    """Benchmarks tokenizing and parsing one synthetic corpus."""
+    code, statement_count = generate_class(**settings)
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.jack', delete=False) as f:
+        f.write(code)
+        path = f.name
+    try:
+        tokenizer = JackTokenizer(path)
+        tokens = list(tokenizer.tokenize())
+
+        def tokenize():
+            list(tokenizer.tokenize())
+
+        def parse():
+            JackParser(tokens, io.StringIO()).compile_class()
+
+        tokenize_time = _best_of(repeats, tokenize)
+        parse_time = _best_of(repeats, parse)
+        return {
+            'corpus': name,
+            'settings': settings,
+            'bytes': len(code),
+            'tokens': len(tokens),
+            'statements': statement_count,
+            'tokenize_seconds': tokenize_time,
+            'parse_seconds': parse_time,
+            'tokens_per_sec': len(tokens) / tokenize_time,
+            'statements_per_sec': statement_count / parse_time,
+            'tokenize_peak_bytes': _peak_memory(tokenize),
+            'parse_peak_bytes': _peak_memory(parse),
+        }
+    finally:
+        os.unlink(path)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance=0.10):
+    """Returns a message for every rate that dropped more than `tolerance` below the baseline."""
+    old = {r['corpus']: r for r in baseline['results']}
+    regressions = []
+    for r in results['results']:
+        before = old.get(r['corpus'])
+        if before is None:
+            continue
+        for metric in ('tokens_per_sec', 'statements_per_sec'):
+            if r[metric] < before[metric] * (1 - tolerance):
+                drop = 1 - r[metric] / before[metric]
+                regressions.append(f"{r['corpus']} {metric}: {before[metric]:,.0f} -> {r[metric]:,.0f} (-{drop:.0%})")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--out', default='bench_results.json', help='where to write the JSON results')
+    ap.add_argument('--baseline', help='JSON results from another revision to compare against')
+    ap.add_argument('--repeats', type=int, default=3)
+    ap.add_argument('--scale', type=float, default=1.0, help='multiplies the number of subroutines')
+    ap.add_argument('--tolerance', type=float, default=0.10, help='allowed slowdown vs the baseline')
+    args = ap.parse_args(argv)
+
+    results = {
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'results': [],
+    }
+    print(f"{'corpus':>18} {'tokens':>8} {'stmts':>7} {'tokens/s':>11} {'stmts/s':>9} {'peak KiB':>9}")
+    for name, settings in CORPORA.items():
+        settings = dict(settings, subroutines=max(1, int(settings['subroutines'] * args.scale)))
+        r = run_corpus(name, settings, args.repeats)
+        results['results'].append(r)
+        peak = max(r['tokenize_peak_bytes'], r['parse_peak_bytes']) / 1024
+        print(f"{name:>18} {r['tokens']:>8} {r['statements']:>7} "
+              f"{r['tokens_per_sec']:>11,.0f} {r['statements_per_sec']:>9,.0f} {peak:>9,.0f}")
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+watch-mode builds: rebuilds .jack/.vm/.asm artifacts under a tree on every save
+run: python3 build_daemon.py [root] [--native-os] [--static-frames]
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+from collections import namedtuple
+
+from parser import IncrementalJackParser, check_jack_files
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'project07-vm-stack-arithmetic'))
+from vm_build import build
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'project06-assembler'))
+from HackAssembler import first_pass_for_labels, second_pass_for_translation
+
+SOURCE_EXTENSIONS = ('.jack', '.vm', '.asm')
+BUILD_DIR = 'build'
+
+# changes: source paths this rebuild covers; outputs: artifacts written;
+# translated: VM modules translated again (the rest came from memory or the
+# object cache); errors: path -> message; seconds: time spent building;
+# latency: from the earliest save in the batch to the last artifact written
+Rebuild = namedtuple('Rebuild', 'changes outputs translated errors seconds latency')
+
+
+# --- Part 1: Watching ---
+# Polling stat() is all the stdlib offers on every platform, and a project
+# tree is a few dozen files: one scan costs well under a millisecond.
+
+def scan(root):
+    """{source path: (mtime_ns, size)} for every .jack/.vm/.asm under root, skipping build dirs."""
+    files = {}
+    pending = [root]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if entry.name != BUILD_DIR and not entry.name.startswith('.'):
+                        pending.append(entry.path)
+                elif entry.name.endswith(SOURCE_EXTENSIONS):
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def changed_files(before, after):
+    """Paths added, modified or removed between two scans."""
+    return sorted(path for path in before.keys() | after.keys() if before.get(path) != after.get(path))
+
+
+# --- Part 2: Warm Builds ---
+# A .jack file is parsed to the <Class>.xml next to it (there is no Jack code
+# generator in this tree yet, so the .vm files beside it are sources too). A
+# directory of .vm files is one program, linked to build/<Dir>.hack. An .asm
+# file in a directory without .vm files is a program of its own, assembled
+# to the .hack next to it.
+
+def _write(path, text):
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+class WarmBuilder:
+    """
+    Builds artifacts for changed sources, keeping what a fresh process would
+    recompute: the incremental Jack parser's token and subroutine caches and
+    every VM module's assembled object.
+    """
+
+    def __init__(self, native_os=False, static_frames=False):
+        self.native_os = native_os
+        self.static_frames = static_frames
+        self.parser = IncrementalJackParser()
+        self.objects = {}  # vm path -> HackObject, for vm_build
+
+    def build_jack(self, path):
+        output = io.StringIO()
+        try:
+            self.parser.parse(path, output)
+        except RuntimeError as e:  # the tokenizer's
+            raise ValueError(str(e)) from None
+        except SyntaxError as e:
+            diagnostics = check_jack_files([path]).get(path)  # the same parse, with line numbers
+            raise ValueError('; '.join(f"line {d.line}: {d.message}" for d in diagnostics)
+                             if diagnostics else str(e)) from None
+        xml_path = path[:-len('.jack')] + '.xml'
+        _write(xml_path, output.getvalue())
+        return xml_path, []
+
+    def build_program(self, directory):
+        """Links the directory's .vm files; returns the .hack and the modules translated again."""
+        build_dir = os.path.join(directory, BUILD_DIR)
+        result = build(directory, build_dir, static_frames=self.static_frames,
+                       native_os=self.native_os, memory=self.objects)
+        hack_path = os.path.join(build_dir, os.path.basename(os.path.abspath(directory)) + '.hack')
+        _write(hack_path, ''.join(f"{word:016b}\n" for word in result.program.code))
+        return hack_path, result.rebuilt
+
+    def build_asm(self, path):
+        with open(path) as f:
+            instructions, table = first_pass_for_labels(f.read().splitlines())
+        hack_path = path[:-len('.asm')] + '.hack'
+        _write(hack_path, ''.join(line + '\n' for line in second_pass_for_translation(instructions, table)))
+        return hack_path, []
+
+    def targets(self, changes):
+        """(builder, path) for what `changes` affect: each program directory once, removed files dropped."""
+        targets, programs = [], set()
+        for path in changes:
+            directory = os.path.dirname(path)
+            has_vm = os.path.isdir(directory) and any(name.endswith('.vm') for name in os.listdir(directory))
+            if path.endswith('.vm'):
+                if not os.path.exists(path):
+                    self.objects.pop(path, None)
+                if has_vm and directory not in programs:
+                    programs.add(directory)
+                    targets.append((self.build_program, directory))
+            elif not os.path.exists(path):
+                continue
+            elif path.endswith('.jack'):
+                targets.append((self.build_jack, path))
+            elif not has_vm:  # otherwise it's the VM translator's output
+                targets.append((self.build_asm, path))
+        return targets
+
+    def rebuild(self, changes, saved=None):
+        """
+        Builds everything `changes` affect and returns a Rebuild. A source that
+        fails records its error and leaves its old artifact in place. saved is
+        the wall-clock time of the earliest save, for the latency.
+        """
+        start = time.perf_counter()
+        outputs, translated, errors = [], [], {}
+        for builder, path in self.targets(changes):
+            try:
+                output, modules = builder(path)
+                outputs.append(output)
+                translated += modules
+            except (ValueError, OSError) as e:
+                errors[path] = str(e)
+        seconds = time.perf_counter() - start
+        latency = time.time() - saved if saved is not None else seconds
+        return Rebuild(list(changes), outputs, translated, errors, seconds, latency)
+
+
+# --- Part 3: The Daemon ---
+
+def format_rebuild(rebuild, root='.'):
+    names = ', '.join(os.path.relpath(path, root) for path in rebuild.changes[:3])
+    if len(rebuild.changes) > 3:
+        names += f" and {len(rebuild.changes) - 3} more"
+    line = (f"{time.strftime('%H:%M:%S')} {names}: {len(rebuild.outputs)} built"
+            f" in {rebuild.seconds * 1000:.0f} ms, {rebuild.latency * 1000:.0f} ms after save")
+    if rebuild.translated:
+        line += f" (translated {', '.join(rebuild.translated)})"
+    for path, message in rebuild.errors.items():
+        line += f"\n    {os.path.relpath(path, root)}: {message}"
+    return line
+
+
+class BuildDaemon:
+    """
+    Watches root and rebuilds on every save. A burst of saves (an editor
+    writing several files, a checkout) becomes one rebuild once the tree has
+    been quiet for `debounce` seconds. Every rebuild, starting with a full
+    one when the daemon starts, goes to report(). Builds run in a worker
+    thread, so other tasks on the loop keep running meanwhile.
+    """
+
+    def __init__(self, root, report=None, interval=0.05, debounce=0.1, **options):
+        self.root = root
+        self.report = report or (lambda rebuild: print(format_rebuild(rebuild, root), flush=True))
+        self.interval = interval
+        self.debounce = debounce
+        self.builder = WarmBuilder(**options)
+        self.files = {}
+
+    async def run(self, stop=None):
+        """Runs until the `stop` asyncio.Event is set (forever without one)."""
+        self.files = scan(self.root)
+        self.report(await asyncio.to_thread(self.builder.rebuild, sorted(self.files)))
+        pending, quiet_since, saved = set(), None, None
+        while stop is None or not stop.is_set():
+            await asyncio.sleep(self.interval)
+            files = scan(self.root)
+            changes = changed_files(self.files, files)
+            self.files = files
+            now = time.time()
+            if changes:
+                pending.update(changes)
+                quiet_since = now
+                saved = min([saved or now] + [files[path][0] / 1e9 for path in changes if path in files])
+            elif pending and now - quiet_since >= self.debounce:
+                batch, pending = sorted(pending), set()
+                self.report(await asyncio.to_thread(self.builder.rebuild, batch, saved))
+                saved = None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('root', nargs='?', default='.')
+    ap.add_argument('--native-os', action='store_true', help='link OS calls to one-word stubs for IntrinsicTraps')
+    ap.add_argument('--static-frames', action='store_true', help='give non-recursive functions static frames')
+    ap.add_argument('--debounce', type=float, default=0.1, help='seconds of quiet before a rebuild')
+    args = ap.parse_args(argv)
+    daemon = BuildDaemon(args.root, debounce=args.debounce, native_os=args.native_os,
+                         static_frames=args.static_frames)
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,26 @@
 """
-tests for tokenizer.py and parser.py
+tests for tokenizer.py, parser.py and build_daemon.py
 run: python3 example.py
 """
 
+import asyncio
 import os
+import shutil
 import sys
 import io
 import tempfile
 
 from tokenizer import JackTokenizer
-from parser import JackParser
+from parser import JackParser, IncrementalJackParser, check_jack_files
+from benchmark import generate_class
+from build_daemon import BUILD_DIR, BuildDaemon, scan
+from tokenizer import tokenize_code
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'project06-assembler'))
+from sourcemap import SourceMap
+from expression import (
+    Const, Var, Binary, Shift, Unary,
+    CONVENTIONAL_PRECEDENCE, build_expression_tree, optimize_expression, ExpressionCompiler,
+)
 
 PASS = 0
 FAIL = 0
@@ -270,6 +281,301 @@ def test_parse_array_access():
     check("has [ somewhere", '[' in xml or '&lt;' in xml, True)
 
 
+# -- incremental re-parse --
+
+def test_incremental_matches_full_parse():
+    print("  incremental parse == full parse")
+    code = """
+    class Inc {
+        field int x;
+        method int a() { return x + 1; }
+        method int b() { var String s; let s = "{ not a brace }"; return 2; }
+        function void c() { do Output.printInt(3); return; }
+    }
+    """
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.jack', delete=False) as f:
+        f.write(code)
+        path = f.name
+    try:
+        inc = IncrementalJackParser()
+        output = io.StringIO()
+        inc.parse(path, output)
+        check("first run matches", output.getvalue(), parse_string(code))
+        check("first run parses all", inc.stats, {'reused': 0, 'reparsed': 3})
+
+        edited = code.replace('return 2;', 'return 2 * x;')
+        with open(path, 'w') as f:
+            f.write(edited)
+        output = io.StringIO()
+        inc.parse(path, output)
+        check("edit matches", output.getvalue(), parse_string(edited))
+        check("only edited subroutine reparsed", inc.stats, {'reused': 2, 'reparsed': 1})
+
+        # whitespace and comments don't change the token range
+        with open(path, 'w') as f:
+            f.write(edited.replace('method int a()', '// hi\n    method   int a()'))
+        output = io.StringIO()
+        inc.parse(path, output)
+        check("whitespace edit reuses all", inc.stats, {'reused': 3, 'reparsed': 0})
+    finally:
+        os.unlink(path)
+
+
+def test_parse_rejects_multichar_op():
+    print("  only single-char symbols count as operators")
+    code = """
+    class Test {
+        function void main() {
+            let x = 1 "+-";
+            return;
+        }
+    }
+    """
+    try:
+        parse_string(code)
+        check("string after term rejected", False, True)
+    except SyntaxError:
+        check("string after term rejected", True, True)
+
+
+def test_token_positions():
+    print("  token positions")
+    code = 'class A {\n  /* two\n  lines */ field int x; // c\n}'
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.jack', delete=False) as f:
+        f.write(code)
+        path = f.name
+    try:
+        t = JackTokenizer(path)
+        tokens = list(t.tokenize(with_positions=True))
+        check("one position per token", len(t.positions), len(tokens))
+        check("class at 1:1", t.positions[0], (1, 1))
+        check("field after comment", t.positions[3], (3, 12))
+        check("closing brace", t.positions[-1], (4, 1))
+    finally:
+        os.unlink(path)
+
+
+def test_parser_source_map():
+    print("  parser source map: xml line -> jack line")
+    code = 'class A {\n  field int x;\n  method void f() {\n    let x = 1;\n    return;\n  }\n}\n'
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.jack', delete=False) as f:
+        f.write(code)
+        path = f.name
+    try:
+        t = JackTokenizer(path)
+        tokens = list(t.tokenize(with_positions=True))
+        out = io.StringIO()
+        source_map = SourceMap()
+        JackParser(tokens, out, positions=t.positions, source_map=source_map,
+                   file_id=source_map.file_id('A.jack')).compile_class()
+        xml = out.getvalue().splitlines()
+        line_of = lambda text: xml.index(text) + 1
+        check("class keyword on line 1", source_map.lookup(line_of('  <keyword> class </keyword>')), ('A.jack', 1))
+        check("field on line 2", source_map.lookup(line_of('    <keyword> field </keyword>')), ('A.jack', 2))
+        check("let on line 4", source_map.lookup(line_of('          <keyword> let </keyword>')), ('A.jack', 4))
+        check("return on line 5", source_map.lookup(line_of('          <keyword> return </keyword>')), ('A.jack', 5))
+        check("no map, same xml", xml, parse_to_lines(tokens))
+    finally:
+        os.unlink(path)
+
+
+def parse_to_lines(tokens):
+    out = io.StringIO()
+    JackParser(tokens, out).compile_class()
+    return out.getvalue().splitlines()
+
+
+def test_error_recovery():
+    print("  error recovery reports every error")
+    code = """class Bad {
+    field int x
+    field int y;
+    method void a() {
+        let x = ;
+        let y = 2;
+        x = 3;
+        do Output.printInt(x;
+        return;
+    }
+    method int b( {
+        return 1;
+    }
+    function void c() {
+        while (true) { let x = x + ; }
+        return;
+    }
+}"""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.jack', delete=False) as f:
+        f.write(code)
+        path = f.name
+    try:
+        diagnostics = check_jack_files([path])[path]
+        check("error lines", [d.line for d in diagnostics], [3, 5, 7, 8, 11, 15])
+        check("column of missing term", (diagnostics[1].line, diagnostics[1].column), (5, 17))
+
+        # without recovery, the first error stops the parse and says where it is
+        try:
+            parse_string(code)
+            check("strict mode raises", False, True)
+        except SyntaxError as e:
+            check("strict mode raises", True, True)
+    finally:
+        os.unlink(path)
+
+
+def test_synthetic_corpus():
+    print("  benchmark corpus generator")
+    code, statements = generate_class(subroutines=5, statements=6, depth=4, expression_terms=8, seed=1)
+    xml = parse_string(code)
+    counted = sum(xml.count(f'<{kind}Statement>') for kind in ('let', 'if', 'while', 'do', 'return'))
+    check("statement count matches xml", counted, statements)
+    check("deterministic", generate_class(5, 6, 4, 8, seed=1)[0], code)
+
+
+# -- expression engine --
+
+def expr(code, precedence=None):
+    tokens = list(tokenize_code(code))
+    if precedence:
+        return build_expression_tree(tokens, precedence)
+    return build_expression_tree(tokens)
+
+
+def test_expression_tree():
+    print("  expression trees")
+    check("jack is left to right", expr('a + b * c'),
+          Binary('*', Binary('+', Var('a'), Var('b')), Var('c')))
+    check("conventional precedence", expr('a + b * c', CONVENTIONAL_PRECEDENCE),
+          Binary('+', Var('a'), Binary('*', Var('b'), Var('c'))))
+    check("parens group", expr('a + (b * c)'),
+          Binary('+', Var('a'), Binary('*', Var('b'), Var('c'))))
+
+
+def test_constant_folding():
+    print("  constant folding")
+    check("3 + 4 * 2", optimize_expression(expr('3 + 4 * 2')), Const(14))
+    check("wraps to 16 bits", optimize_expression(expr('32767 + 1')), Const(-32768))
+    check("divide truncates", optimize_expression(expr('-7 / 2')), Const(-3))
+    check("comparison is -1", optimize_expression(expr('2 < 3')), Const(-1))
+    check("x / 0 left alone", optimize_expression(expr('x / 0')), Binary('/', Var('x'), Const(0)))
+    check("folds inside", optimize_expression(expr('x + (2 * 3)')), Binary('+', Var('x'), Const(6)))
+    check("< folds like the VM's lt", optimize_expression(expr('20000 < -20000')), Const(-1))
+    check("> folds like the VM's gt", optimize_expression(expr('20000 > -20000')), Const(0))
+    check("close operands compare normally", optimize_expression(expr('3 < 5')), Const(-1))
+
+
+def test_strength_reduction():
+    print("  multiply by powers of two")
+    check("r * 4", optimize_expression(expr('r * 4')), Shift(Var('r'), 2))
+    check("256 * i", optimize_expression(expr('256 * i')), Shift(Var('i'), 8))
+    check("x * -2", optimize_expression(expr('x * -2')), Unary('-', Shift(Var('x'), 1)))
+    check("Math.multiply(f, 256)", optimize_expression(expr('Math.multiply(f, 256)')), Shift(Var('f'), 8))
+    check("x * 3 stays", optimize_expression(expr('x * 3')), Binary('*', Var('x'), Const(3)))
+
+
+def test_expression_vm():
+    print("  expression -> vm")
+    symbols = {'r': ('argument', 1, 'int'), 'c': ('argument', 2, 'int'),
+               'data': ('this', 0, 'Array'), 'v': ('local', 0, 'Vector')}
+    compiler = ExpressionCompiler('Matrix', symbols.get)
+
+    vm = compiler.compile(optimize_expression(expr('data[(r*4)+c]')))
+    check("no Math.multiply", 'call Math.multiply 2' in vm, False)
+    check("indexes data", vm[0], 'push this 0')
+    check("ends with array read", vm[-3:], ['add', 'pop pointer 1', 'push that 0'])
+
+    vm = compiler.compile(optimize_expression(expr('v.getX() + get(0, 1)')))
+    check("method on var", 'call Vector.getX 1' in vm, True)
+    check("method on this", 'call Matrix.get 3' in vm, True)
+    check("negative constant", compiler.compile(Const(-5)), ['push constant 5', 'neg'])
+
+
+# -- watch-mode builds --
+
+def test_build_daemon():
+    print("  build daemon: warm rebuilds of what changed")
+    root = tempfile.mkdtemp()
+    bloxors = os.path.join(root, 'Bloxors')
+    shutil.copytree(os.path.join(os.path.dirname(__file__), '..', 'project09-high-level-language', 'Bloxors'),
+                    bloxors, ignore=shutil.ignore_patterns('*.xml'))
+    with open(os.path.join(root, 'Add.asm'), 'w') as f:
+        f.write("@2\nD=A\n@3\nD=D+A\n@0\nM=D\n")
+    rebuilds = []
+
+    def edit(name, old, new):
+        path = os.path.join(bloxors, name)
+        with open(path) as f:
+            code = f.read()
+        with open(path, 'w') as f:
+            f.write(code.replace(old, new, 1))
+
+    async def session():
+        stop = asyncio.Event()
+        daemon = BuildDaemon(root, report=rebuilds.append, interval=0.01, debounce=0.05, native_os=True)
+        task = asyncio.create_task(daemon.run(stop))
+
+        async def next_rebuild(*edits):
+            count = len(rebuilds)
+            for name, old, new in edits:
+                edit(name, old, new)
+            while len(rebuilds) == count and not task.done():
+                await asyncio.sleep(0.01)
+            return rebuilds[-1] if len(rebuilds) > count else None  # None: the daemon died
+
+        while not rebuilds:
+            await asyncio.sleep(0.01)
+        first = rebuilds[0]
+        check("startup builds everything", sorted(os.path.relpath(p, root) for p in first.outputs),
+              ['Add.hack', 'Bloxors/Block.xml', 'Bloxors/Game.xml', 'Bloxors/Level.xml', 'Bloxors/Main.xml',
+               'Bloxors/build/Bloxors.hack'])
+        check("startup translates every module", sorted(first.translated), ['Block', 'Game', 'Level', 'Main'])
+        check("build outputs aren't watched", [p for p in scan(root) if BUILD_DIR in p], [])
+        with open(os.path.join(root, 'Add.hack')) as f:
+            check("standalone .asm assembled", f.read().split(), ['0000000000000010', '1110110000010000',
+                                                                   '0000000000000011', '1110000010010000',
+                                                                   '0000000000000000', '1110001100001000'])
+
+        jack = await next_rebuild(('Level.jack', 'return;', 'return; // saved'))
+        check("comment edit: only Level.xml", [os.path.basename(p) for p in jack.outputs], ['Level.xml'])
+        check("comment edit: every subroutine reused", daemon.builder.parser.stats['reparsed'], 0)
+        check("under a second from save to artifact", jack.latency < 1.0, True)
+
+        burst = await next_rebuild(('Game.vm', 'push constant 0\n', 'push constant 0\npush constant 1\npop temp 1\n'),
+                                   ('Block.vm', 'push constant 0\n', 'push constant 0\npush constant 2\npop temp 1\n'))
+        check("a burst of saves is one rebuild", [os.path.basename(p) for p in burst.changes], ['Block.vm', 'Game.vm'])
+        check("only the saved modules translated", sorted(burst.translated), ['Block', 'Game'])
+
+        with open(os.path.join(bloxors, 'Main.xml')) as f:
+            main_xml = f.read()
+        broken = await next_rebuild(('Main.jack', '{', '{ let'))
+        check("syntax error reported with its line", list(broken.errors.values())[0].startswith('line 2:'), True)
+        with open(os.path.join(bloxors, 'Main.xml')) as f:
+            check("old artifact kept on error", f.read(), main_xml)
+
+        # a half-typed .asm or .vm is an error in the report, and the daemon keeps watching
+        add_asm = os.path.join(root, 'Add.asm')
+        bad = await next_rebuild(('../Add.asm', 'D=D+A', 'D=Q'))
+        check("bad mnemonic reported", bad and bad.errors, {add_asm: "unknown comp 'Q'"})
+        half_typed = await next_rebuild(('Main.vm', 'call Level.init 0', 'call Level.init'))
+        check("half-typed .vm reported", half_typed and list(half_typed.errors.items()),
+              [(bloxors, "Main.vm line 2: 'call Level.init': call takes 2 arguments")])
+        fixed = await next_rebuild(('Main.jack', '{ let', '{'), ('Main.vm', 'call Level.init\n', 'call Level.init 0\n'))
+        check("still rebuilding after the bad .asm and .vm", (task.done(), fixed and fixed.errors), (False, {}))
+        stop.set()
+        await asyncio.gather(task, return_exceptions=True)
+
+    try:
+        asyncio.run(session())
+        # the warm objects link to the same program as a cold build
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'project07-vm-stack-arithmetic'))
+        from vm_build import build
+        cold = build(bloxors, tempfile.mkdtemp(), native_os=True)
+        with open(os.path.join(bloxors, BUILD_DIR, 'Bloxors.hack')) as f:
+            check("warm .hack == cold build", f.read().split(), [f"{word:016b}" for word in cold.program.code])
+    finally:
+        shutil.rmtree(root)
+
+
 # -- run on the actual jack files from project 9 --
 
 def test_parse_real_jack_files():
@@ -302,6 +608,11 @@ def test_parse_real_jack_files():
             p.compile_class()
             xml = output.getvalue()
 
+            inc_output = io.StringIO()
+            IncrementalJackParser().parse(jack_path, inc_output)
+            check(f"{rel} incremental", inc_output.getvalue(), xml)
+            check(f"{rel} has no diagnostics", check_jack_files([jack_path]), {})
+
             xml_lines = len(xml.strip().split('\n'))
             ok = xml.strip().startswith('<class>') and xml.strip().endswith('</class>')
 
@@ -341,9 +652,24 @@ if __name__ == '__main__':
     test_parse_do_statement()
     test_parse_expressions()
     test_parse_array_access()
+    test_parse_rejects_multichar_op()
+    test_incremental_matches_full_parse()
+    test_token_positions()
+    test_parser_source_map()
+    test_error_recovery()
+    test_synthetic_corpus()
+
+    print("\n-- expressions --")
+    test_expression_tree()
+    test_constant_folding()
+    test_strength_reduction()
+    test_expression_vm()
 
     print("\n-- integration --")
     test_parse_real_jack_files()
 
+    print("\n-- build daemon --")
+    test_build_daemon()
+
     print(f"\n{PASS} passed, {FAIL} failed")
     sys.exit(1 if FAIL else 0)
@@ -0,0 +1,330 @@
+from collections import namedtuple
+
+from parser import JackParser, BINARY_OPS
+
+# --- Expression Tree Nodes ---
+Const = namedtuple('Const', 'value')                 # integer constant (signed 16-bit)
+String = namedtuple('String', 'value')               # string constant
+Keyword = namedtuple('Keyword', 'value')             # true | false | null | this
+Var = namedtuple('Var', 'name')                      # varName
+Index = namedtuple('Index', 'name index')            # varName '[' expression ']'
+Call = namedtuple('Call', 'target name args')        # (target '.')? name '(' expressionList ')'
+Unary = namedtuple('Unary', 'op operand')            # ('-' | '~') term
+Binary = namedtuple('Binary', 'op left right')       # expression op expression
+Shift = namedtuple('Shift', 'operand bits')          # operand * 2**bits, done with adds
+
+# Jack has no operator priority: everything is evaluated left to right.
+JACK_PRECEDENCE = {op: 1 for op in BINARY_OPS}
+# The usual C-like priorities, for callers who want them.
+CONVENTIONAL_PRECEDENCE = {
+    '|': 1, '&': 2, '=': 3, '<': 4, '>': 4, '+': 5, '-': 5, '*': 6, '/': 6,
+}
+
+VM_OPS = {'+': 'add', '-': 'sub', '&': 'and', '|': 'or', '<': 'lt', '>': 'gt', '=': 'eq'}
+
+
+# --- Building the Tree ---
+
+class ExpressionTreeParser(JackParser):
+    """
+    Parses Jack expressions into trees with precedence climbing, reusing the
+    JackParser token navigation. With JACK_PRECEDENCE the trees evaluate exactly
+    like the language says (left to right).
+    """
+
+    def __init__(self, tokens, precedence=JACK_PRECEDENCE):
+        super().__init__(tokens, None)
+        self._precedence = precedence
+
+    def _take(self, expected_type=None, expected_value=None):
+        """Like _eat, but returns the token value instead of writing XML."""
+        token_type = self.current_token_type
+        token_value = self.current_token_value
+        if token_type is None:
+            raise SyntaxError("Unexpected end of file.")
+        if expected_type and token_type != expected_type:
+            raise SyntaxError(f"Expected type '{expected_type}' but got '{token_type}' for value '{token_value}'")
+        if expected_value is not None and token_value != expected_value:
+            raise SyntaxError(f"Expected value '{expected_value}' but got '{token_value}'")
+        self._advance()
+        return token_value
+
+    def parse_expression(self, min_precedence=0):
+        """term (op term)*, grouping by operator precedence."""
+        left = self.parse_term()
+        while self.current_token_type == 'SYMBOL' and self.current_token_value in self._precedence:
+            op = self.current_token_value
+            precedence = self._precedence[op]
+            if precedence < min_precedence:
+                break
+            self._advance()
+            right = self.parse_expression(precedence + 1)
+            left = Binary(op, left, right)
+        return left
+
+    def parse_term(self):
+        """Builds the node for a single term."""
+        token_type = self.current_token_type
+        token_value = self.current_token_value
+
+        if token_type == 'INT_CONST':
+            return Const(int(self._take()))
+        if token_type == 'STRING_CONST':
+            return String(self._take())
+        if token_type == 'KEYWORD' and token_value in ('true', 'false', 'null', 'this'):
+            return Keyword(self._take())
+        if token_type == 'SYMBOL' and token_value in ('-', '~'):
+            op = self._take()
+            return Unary(op, self.parse_term())
+        if token_type == 'SYMBOL' and token_value == '(':
+            self._take()
+            node = self.parse_expression()
+            self._take('SYMBOL', ')')
+            return node
+        if token_type == 'IDENTIFIER':
+            next_type, next_value = self._peek_next_token()
+            name = self._take()
+            if next_value == '[':
+                self._take('SYMBOL', '[')
+                index = self.parse_expression()
+                self._take('SYMBOL', ']')
+                return Index(name, index)
+            if next_value in ('.', '('):
+                target = None
+                if next_value == '.':
+                    self._take('SYMBOL', '.')
+                    target, name = name, self._take('IDENTIFIER')
+                self._take('SYMBOL', '(')
+                args = []
+                if self.current_token_value != ')':
+                    args.append(self.parse_expression())
+                    while self.current_token_value == ',':
+                        self._take()
+                        args.append(self.parse_expression())
+                self._take('SYMBOL', ')')
+                return Call(target, name, tuple(args))
+            return Var(name)
+        raise SyntaxError(f"Invalid term: cannot start with '{token_value}' of type '{token_type}'")
+
+
+def build_expression_tree(tokens, precedence=JACK_PRECEDENCE):
+    """Parses a token list holding exactly one expression into a tree."""
+    parser = ExpressionTreeParser(tokens, precedence)
+    node = parser.parse_expression()
+    if parser.current_token_type is not None:
+        raise SyntaxError(f"Unexpected token after expression: '{parser.current_token_value}'")
+    return node
+
+
+# --- Optimizations ---
+
+def _to_int16(value):
+    """Wraps a Python int to the Hack's signed 16-bit range."""
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def _jack_divide(a, b):
+    """Math.divide semantics: truncates toward zero."""
+    quotient = abs(a) // abs(b)
+    return -quotient if (a < 0) != (b < 0) else quotient
+
+
+FOLD_BINARY = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': _jack_divide,
+    '&': lambda a, b: a & b,
+    '|': lambda a, b: a | b,
+    # the VM's lt/gt test the sign of the wrapped x - y, which flips when the operands are 32768 or more apart
+    '<': lambda a, b: -1 if _to_int16(a - b) < 0 else 0,
+    '>': lambda a, b: -1 if _to_int16(a - b) > 0 else 0,
+    '=': lambda a, b: -1 if a == b else 0,
+}
+FOLD_UNARY = {'-': lambda a: -a, '~': lambda a: ~a}
+MATH_OPS = {'multiply': '*', 'divide': '/'}
+
+
+def _is_pure(node):
+    """True if evaluating node has no side effects (so it may be dropped)."""
+    if isinstance(node, (Const, Keyword, Var)):
+        return True
+    if isinstance(node, Index):
+        return _is_pure(node.index)
+    if isinstance(node, Unary):
+        return _is_pure(node.operand)
+    if isinstance(node, Shift):
+        return _is_pure(node.operand)
+    if isinstance(node, Binary):
+        return _is_pure(node.left) and _is_pure(node.right)
+    return False
+
+
+def _power_of_two(value):
+    """Returns k if abs(value) == 2**k (k >= 1), else None."""
+    magnitude = abs(value)
+    if magnitude >= 2 and magnitude & (magnitude - 1) == 0:
+        return magnitude.bit_length() - 1
+    return None
+
+
+def _scale(node, factor):
+    """Rewrites node * factor for a constant factor, or returns None if it can't."""
+    if factor == 1:
+        return node
+    if factor == -1:
+        return Unary('-', node)
+    if factor == 0 and _is_pure(node):
+        return Const(0)
+    bits = _power_of_two(factor)
+    if bits is None:
+        return None
+    shifted = Shift(node, bits)
+    return shifted if factor > 0 else Unary('-', shifted)
+
+
+def optimize_expression(node):
+    """
+    Folds constant subexpressions with 16-bit wraparound and turns
+    multiplications by powers of two into repeated doubling. Division has no
+    cheap Hack equivalent, so only x / 1 and x / -1 are rewritten.
+    """
+    if isinstance(node, Unary):
+        operand = optimize_expression(node.operand)
+        if isinstance(operand, Const):
+            return Const(_to_int16(FOLD_UNARY[node.op](operand.value)))
+        return Unary(node.op, operand)
+
+    if isinstance(node, Binary):
+        left = optimize_expression(node.left)
+        right = optimize_expression(node.right)
+        op = node.op
+        if isinstance(left, Const) and isinstance(right, Const):
+            if not (op == '/' and right.value == 0):
+                return Const(_to_int16(FOLD_BINARY[op](left.value, right.value)))
+        if op == '*':
+            if isinstance(right, Const):
+                scaled = _scale(left, right.value)
+                if scaled is not None:
+                    return scaled
+            if isinstance(left, Const):
+                scaled = _scale(right, left.value)
+                if scaled is not None:
+                    return scaled
+        elif op == '/' and isinstance(right, Const) and right.value in (1, -1):
+            return left if right.value == 1 else Unary('-', left)
+        elif op in ('+', '-', '|') and isinstance(right, Const) and right.value == 0:
+            return left
+        elif op in ('+', '|') and isinstance(left, Const) and left.value == 0:
+            return right
+        return Binary(op, left, right)
+
+    if isinstance(node, Index):
+        return Index(node.name, optimize_expression(node.index))
+    if isinstance(node, Call):
+        if node.target == 'Math' and node.name in MATH_OPS and len(node.args) == 2:
+            # explicit Math.multiply/Math.divide calls get the same treatment as * and /
+            return optimize_expression(Binary(MATH_OPS[node.name], *node.args))
+        return Call(node.target, node.name, tuple(optimize_expression(a) for a in node.args))
+    if isinstance(node, Shift):
+        return Shift(optimize_expression(node.operand), node.bits)
+    return node
+
+
+# --- VM Code Generation ---
+
+class ExpressionCompiler:
+    """
+    Emits VM commands for expression trees. lookup(name) returns
+    (segment, index, type) for a variable in scope, or None for class names.
+    """
+
+    def __init__(self, class_name, lookup):
+        self._class_name = class_name
+        self._lookup = lookup
+
+    def compile(self, node):
+        """Returns the list of VM commands that leave node's value on the stack."""
+        commands = []
+        self._emit(node, commands)
+        return commands
+
+    def _emit(self, node, out):
+        if isinstance(node, Const):
+            self._emit_constant(node.value, out)
+        elif isinstance(node, String):
+            out.append(f"push constant {len(node.value)}")
+            out.append("call String.new 1")
+            for char in node.value:
+                out.append(f"push constant {ord(char)}")
+                out.append("call String.appendChar 2")
+        elif isinstance(node, Keyword):
+            if node.value == 'this':
+                out.append("push pointer 0")
+            elif node.value == 'true':
+                out.extend(["push constant 0", "not"])
+            else:
+                out.append("push constant 0")
+        elif isinstance(node, Var):
+            segment, index, _ = self._resolve(node.name)
+            out.append(f"push {segment} {index}")
+        elif isinstance(node, Index):
+            segment, index, _ = self._resolve(node.name)
+            out.append(f"push {segment} {index}")
+            self._emit(node.index, out)
+            out.extend(["add", "pop pointer 1", "push that 0"])
+        elif isinstance(node, Call):
+            self._emit_call(node, out)
+        elif isinstance(node, Unary):
+            self._emit(node.operand, out)
+            out.append('neg' if node.op == '-' else 'not')
+        elif isinstance(node, Shift):
+            self._emit(node.operand, out)
+            for _ in range(node.bits):
+                out.extend(["pop temp 0", "push temp 0", "push temp 0", "add"])
+        elif isinstance(node, Binary):
+            self._emit(node.left, out)
+            self._emit(node.right, out)
+            if node.op == '*':
+                out.append("call Math.multiply 2")
+            elif node.op == '/':
+                out.append("call Math.divide 2")
+            else:
+                out.append(VM_OPS[node.op])
+        else:
+            raise ValueError(f"Unknown expression node: {node!r}")
+
+    def _emit_constant(self, value, out):
+        if value >= 0:
+            out.append(f"push constant {value}")
+        elif value == -32768:
+            out.extend(["push constant 32767", "not"])
+        else:
+            out.extend([f"push constant {-value}", "neg"])
+
+    def _emit_call(self, node, out):
+        n_args = len(node.args)
+        if node.target is None:
+            # method on the current object
+            out.append("push pointer 0")
+            callee = f"{self._class_name}.{node.name}"
+            n_args += 1
+        else:
+            symbol = self._lookup(node.target)
+            if symbol is not None:
+                segment, index, type_name = symbol
+                out.append(f"push {segment} {index}")
+                callee = f"{type_name}.{node.name}"
+                n_args += 1
+            else:
+                callee = f"{node.target}.{node.name}"
+        for arg in node.args:
+            self._emit(arg, out)
+        out.append(f"call {callee} {n_args}")
+
+    def _resolve(self, name):
+        symbol = self._lookup(name)
+        if symbol is None:
+            raise NameError(f"Undefined variable: {name}")
+        return symbol
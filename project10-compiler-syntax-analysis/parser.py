@@ -1,15 +1,38 @@
+import io
 import re
 import sys
+from collections import namedtuple
 
-# Assumes the regex-based JackTokenizer class is defined above this.
+from tokenizer import JackTokenizer, strip_comments, split_subroutine_chunks, tokenize_code
+
+
+BINARY_OPS = ('+', '-', '*', '/', '&', '|', '<', '>', '=')
+STATEMENT_KEYWORDS = ('let', 'if', 'while', 'do', 'return')
+SUBROUTINE_KEYWORDS = ('constructor', 'function', 'method')
+
+# A syntax error found in recovery mode
+Diagnostic = namedtuple('Diagnostic', 'line column message')
 
 class JackParser:
-    def __init__(self, tokenizer_generator, output_file):
-        """Prepares the parser by buffering all tokens."""
+    def __init__(self, tokenizer_generator, output_file, positions=None, recover=False,
+                 source_map=None, file_id=0):
+        """
+        Prepares the parser by buffering all tokens. positions holds the (line, column)
+        of each token for error messages. With recover=True, syntax errors are collected
+        in self.diagnostics and parsing resynchronizes instead of stopping at the first one.
+        Given positions and a SourceMap, each XML line (1-based) is mapped to the .jack
+        line of the token being parsed when it was written.
+        """
         self._tokens = list(tokenizer_generator)
         self._current_token_index = 0
         self._output = output_file
         self._indent_level = 0
+        self._positions = positions
+        self._recover = recover
+        self.diagnostics = []
+        self._source_map = source_map
+        self._file_id = file_id
+        self._xml_line = 1
 
     # --- Core Engine: Token Navigation and State ---
 
@@ -38,11 +61,72 @@ class JackParser:
             return self._tokens[self._current_token_index + 1]
         return (None, None)
 
+    # --- Error Reporting and Recovery ---
+
+    def _position(self):
+        """Returns the (line, column) of the current token, or of the last one at end of file."""
+        if not self._positions:
+            return None, None
+        return self._positions[min(self._current_token_index, len(self._positions) - 1)]
+
+    def _error(self, message):
+        """Builds a SyntaxError located at the current token."""
+        line, column = self._position()
+        error = SyntaxError(message if line is None else f"line {line}, column {column}: {message}")
+        error.diagnostic = Diagnostic(line, column, message)
+        return error
+
+    def _record(self, error, indent_level):
+        """Recovery mode: notes the error and restores the indentation of the interrupted rule."""
+        if not self._recover:
+            raise error
+        self.diagnostics.append(getattr(error, 'diagnostic', None) or Diagnostic(*self._position(), str(error)))
+        self._indent_level = indent_level
+
+    def _synchronize(self, stop_values):
+        """
+        Panic mode: skips tokens until a ';' (consumed), a keyword in stop_values at the
+        same brace depth, or the '}' that closes the enclosing block.
+        """
+        depth = 0
+        while self.current_token_type is not None:
+            token_type = self.current_token_type
+            token_value = self.current_token_value
+            if token_type == 'SYMBOL':
+                if token_value == '{':
+                    depth += 1
+                elif token_value == '}':
+                    if depth == 0:
+                        return
+                    depth -= 1
+                elif token_value == ';' and depth == 0:
+                    self._advance()
+                    return
+            elif token_type == 'KEYWORD' and depth == 0 and token_value in stop_values:
+                return
+            self._advance()
+
+    def _skip_to_subroutine(self):
+        """Skips to the next subroutineDec, or to the class-closing '}' at the end of the file."""
+        self._advance()
+        last_index = len(self._tokens) - 1
+        while self.current_token_type is not None:
+            if self.current_token_type == 'KEYWORD' and self.current_token_value in SUBROUTINE_KEYWORDS:
+                return
+            if self._current_token_index == last_index and self.current_token_value == '}':
+                return
+            self._advance()
+
     # --- XML Writing and Token Consumption ---
 
     def _write_xml(self, tag):
         """Helper to write indented XML tags."""
         indent = "  " * self._indent_level
+        if self._source_map is not None:
+            line, _ = self._position()
+            if line is not None:
+                self._source_map.add(self._xml_line, self._file_id, line)
+            self._xml_line += 1
         self._output.write(f"{indent}<{tag}>\n")
 
     def _eat(self, expected_type=None, expected_values=None):
@@ -51,7 +135,7 @@ class JackParser:
         Handles single strings or collections for expected types/values.
         """
         if self.current_token_type is None:
-            raise SyntaxError("Unexpected end of file.")
+            raise self._error("Unexpected end of file.")
 
         token_type = self.current_token_type
         token_value = self.current_token_value
@@ -59,12 +143,12 @@ class JackParser:
         if expected_type:
             allowed_types = {expected_type} if isinstance(expected_type, str) else set(expected_type)
             if token_type not in allowed_types:
-                raise SyntaxError(f"Expected type(s) {allowed_types} but got '{token_type}' for value '{token_value}'")
+                raise self._error(f"Expected type(s) {allowed_types} but got '{token_type}' for value '{token_value}'")
 
         if expected_values:
             allowed_values = {expected_values} if isinstance(expected_values, str) else set(expected_values)
             if token_value not in allowed_values:
-                raise SyntaxError(f"Expected value(s) {allowed_values} but got '{token_value}'")
+                raise self._error(f"Expected value(s) {allowed_values} but got '{token_value}'")
 
         xml_tag = token_type.lower().replace('_const', 'Constant')
         xml_value = token_value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
@@ -78,14 +162,25 @@ class JackParser:
         """'class' className '{' classVarDec* subroutineDec* '}'"""
         self._write_xml("class")
         self._indent_level += 1
-        self._eat(expected_type='KEYWORD', expected_values='class')
-        self._eat(expected_type='IDENTIFIER')
-        self._eat(expected_type='SYMBOL', expected_values='{')
-        while self.current_token_value in ('static', 'field'):
-            self.compile_class_var_dec()
-        while self.current_token_value in ('constructor', 'function', 'method'):
-            self.compile_subroutine()
-        self._eat(expected_type='SYMBOL', expected_values='}')
+        try:
+            self._eat(expected_type='KEYWORD', expected_values='class')
+            self._eat(expected_type='IDENTIFIER')
+            self._eat(expected_type='SYMBOL', expected_values='{')
+            while self.current_token_value in ('static', 'field'):
+                try:
+                    self.compile_class_var_dec()
+                except SyntaxError as error:
+                    self._record(error, 1)
+                    self._synchronize(('static', 'field') + SUBROUTINE_KEYWORDS)
+            while self.current_token_value in SUBROUTINE_KEYWORDS:
+                try:
+                    self.compile_subroutine()
+                except SyntaxError as error:
+                    self._record(error, 1)
+                    self._skip_to_subroutine()
+            self._eat(expected_type='SYMBOL', expected_values='}')
+        except SyntaxError as error:
+            self._record(error, 1)
         self._indent_level -= 1
         self._write_xml("/class")
 
@@ -163,17 +258,29 @@ class JackParser:
         """A sequence of statements."""
         self._write_xml("statements")
         self._indent_level += 1
-        while self.current_token_value in ('let', 'if', 'while', 'do', 'return'):
-            if self.current_token_value == 'let':
-                self.compile_let()
-            elif self.current_token_value == 'if':
-                self.compile_if()
-            elif self.current_token_value == 'while':
-                self.compile_while()
-            elif self.current_token_value == 'do':
-                self.compile_do()
-            elif self.current_token_value == 'return':
-                self.compile_return()
+        indent_level = self._indent_level
+        while True:
+            start = self._current_token_index
+            try:
+                if self.current_token_value == 'let':
+                    self.compile_let()
+                elif self.current_token_value == 'if':
+                    self.compile_if()
+                elif self.current_token_value == 'while':
+                    self.compile_while()
+                elif self.current_token_value == 'do':
+                    self.compile_do()
+                elif self.current_token_value == 'return':
+                    self.compile_return()
+                elif self._recover and self.current_token_value not in ('}', None):
+                    raise self._error(f"Expected a statement but got '{self.current_token_value}'")
+                else:
+                    break
+            except SyntaxError as error:
+                self._record(error, indent_level)
+                if self._current_token_index == start:
+                    self._advance()
+                self._synchronize(STATEMENT_KEYWORDS)
         self._indent_level -= 1
         self._write_xml("/statements")
 
@@ -255,7 +362,7 @@ class JackParser:
         self._write_xml("expression")
         self._indent_level += 1
         self.compile_term()
-        while self.current_token_value in '+-*/&|<>=':
+        while self.current_token_type == 'SYMBOL' and self.current_token_value in BINARY_OPS:
             self._eat(expected_type='SYMBOL')
             self.compile_term()
         self._indent_level -= 1
@@ -298,7 +405,7 @@ class JackParser:
             else:
                 self._eat(expected_type='IDENTIFIER')
         else:
-            raise SyntaxError(f"Invalid term: cannot start with '{token_value}' of type '{token_type}'")
+            raise self._error(f"Invalid term: cannot start with '{token_value}' of type '{token_type}'")
 
         self._indent_level -= 1
         self._write_xml("/term")
@@ -314,6 +421,110 @@ class JackParser:
                 self.compile_expression()
         self._indent_level -= 1
         self._write_xml("/expressionList")
+
+
+# --- Batch Checking ---
+
+def check_jack_files(filepaths):
+    """
+    Parses every file in recovery mode and returns {filepath: [Diagnostic, ...]}
+    for the files that have syntax errors.
+    """
+    report = {}
+    for filepath in filepaths:
+        tokenizer = JackTokenizer(filepath)
+        tokens = list(tokenizer.tokenize(with_positions=True))
+        parser = JackParser(tokens, io.StringIO(), positions=tokenizer.positions, recover=True)
+        parser.compile_class()
+        if parser.diagnostics:
+            report[filepath] = parser.diagnostics
+    return report
+
+
+# --- Incremental Re-parsing ---
+
+class _SplicingParser(JackParser):
+    """A JackParser that splices cached subroutineDec XML in place of re-parsing it."""
+
+    def __init__(self, tokens, output_file, subroutine_ends, old_xml, new_xml):
+        super().__init__(tokens, output_file)
+        self._subroutine_ends = subroutine_ends
+        self._old_xml = old_xml
+        self._new_xml = new_xml
+        self.reused = 0
+        self.reparsed = 0
+
+    def compile_subroutine(self):
+        start = self._current_token_index
+        end = self._subroutine_ends.get(start)
+        if end is None:
+            return super().compile_subroutine()
+
+        key = tuple(self._tokens[start:end])
+        xml = self._old_xml.get(key)
+        if xml is not None:
+            self.reused += 1
+            self._current_token_index = end
+        else:
+            self.reparsed += 1
+            output, self._output = self._output, io.StringIO()
+            try:
+                super().compile_subroutine()
+                xml = self._output.getvalue()
+            finally:
+                self._output = output
+            if self._current_token_index != end:
+                # the chunk boundaries did not line up with the grammar, don't cache it
+                self._output.write(xml)
+                return
+        self._new_xml[key] = xml
+        self._output.write(xml)
+
+
+class IncrementalJackParser:
+    """
+    Re-parses .jack files on every save but only re-tokenizes and re-parses the
+    subroutines that changed. Tokens are cached per source chunk and the XML of
+    each subroutineDec is cached by its token range, then spliced back in, so
+    the output is identical to a full JackParser run.
+    """
+
+    def __init__(self):
+        self._chunk_tokens = {}   # filepath -> {chunk text: tokens}
+        self._subroutine_xml = {} # filepath -> {token range: subroutineDec xml}
+        self.stats = {'reused': 0, 'reparsed': 0}
+
+    def parse(self, filepath, output_file):
+        """Parses filepath into output_file, reusing whatever is unchanged since the last call."""
+        with open(filepath, 'r') as f:
+            code = strip_comments(f.read())
+
+        old_tokens = self._chunk_tokens.get(filepath, {})
+        new_tokens = {}
+        tokens = []
+        subroutine_ends = {}
+        chunks = split_subroutine_chunks(code)
+        for i, text in enumerate(chunks):
+            if text in old_tokens:
+                chunk = old_tokens[text]
+            elif text in new_tokens:
+                chunk = new_tokens[text]
+            else:
+                chunk = list(tokenize_code(text))
+            new_tokens[text] = chunk
+            if 0 < i < len(chunks) - 1:
+                subroutine_ends[len(tokens)] = len(tokens) + len(chunk)
+            tokens.extend(chunk)
+
+        new_xml = {}
+        parser = _SplicingParser(tokens, output_file, subroutine_ends,
+                                 self._subroutine_xml.get(filepath, {}), new_xml)
+        parser.compile_class()
+
+        # Only keep what the current version of the file uses
+        self._chunk_tokens[filepath] = new_tokens
+        self._subroutine_xml[filepath] = new_xml
+        self.stats = {'reused': parser.reused, 'reparsed': parser.reparsed}
         
         
         
@@ -21,36 +21,98 @@ TOKEN_REGEX = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in
 
 
 
+# Lexical landmarks used to cut a class into subroutine-sized chunks
+CHUNK_REGEX = re.compile(r'"[^"]*"|[{}]|\b(?:constructor|function|method)\b')
+
+
+def _blank_out(match):
+    """Replaces a comment with spaces, keeping its newlines so positions survive."""
+    return re.sub(r'[^\n]', ' ', match.group())
+
+
+def strip_comments(code):
+    """Blanks out /* */, /** */ and // comments from Jack source."""
+    code = re.sub(r'/\*.*?\*/', _blank_out, code, flags=re.DOTALL)
+    return re.sub(r'//.*', _blank_out, code)
+
+
+def tokenize_code(code, positions=None):
+    """
+    Yields (token_type, token_value) tuples for comment-free Jack source.
+    If a positions list is given, the 1-based (line, column) of each token is appended to it.
+    """
+    line, line_start, scanned = 1, 0, 0
+
+    for match in TOKEN_REGEX.finditer(code):
+        token_type = match.lastgroup  # The name of the group that matched
+        token_value = match.group()
+
+        if token_type == 'SKIP':
+            continue
+
+        if positions is not None:
+            start = match.start()
+            newlines = code.count('\n', scanned, start)
+            if newlines:
+                line += newlines
+                line_start = code.rfind('\n', scanned, start) + 1
+            scanned = start
+            positions.append((line, start - line_start + 1))
+
+        if token_type == 'MISMATCH':
+            where = f" at line {line}, column {match.start() - line_start + 1}" if positions is not None else ""
+            raise RuntimeError(f"Unexpected character: {token_value}{where}")
+        
+        # Post-processing steps
+        if token_type == 'STRING_CONST':
+            # As per spec, strip the quotes
+            token_value = token_value[1:-1]
+        elif token_type == 'IDENTIFIER' and token_value in KEYWORDS:
+            # If an identifier is a keyword, change its type
+            token_type = 'KEYWORD'
+            
+        yield token_type, token_value
+
+
+def split_subroutine_chunks(code):
+    """
+    Cuts comment-free source into [header, subroutine..., trailer] text chunks.
+    The header runs up to the first subroutineDec, each subroutine chunk ends where
+    the next one (or the class-closing brace) starts, and the trailer is the rest.
+    Tokenizing the chunks one by one gives the same tokens as tokenizing the whole.
+    """
+    starts = []
+    class_end = len(code)
+    depth = 0
+    for match in CHUNK_REGEX.finditer(code):
+        text = match.group()
+        if text == '{':
+            depth += 1
+        elif text == '}':
+            depth -= 1
+            if depth == 0:
+                class_end = match.start()
+                break
+        elif depth == 1 and text[0] != '"':
+            starts.append(match.start())
+
+    bounds = [0] + starts + [class_end]
+    return [code[lo:hi] for lo, hi in zip(bounds, bounds[1:])] + [code[class_end:]]
+
+
 class JackTokenizer:
     def __init__(self, filepath: str):
         with open(filepath, 'r') as f:
             code = f.read()
 
         # Remove comments first
-        code = re.sub(r'/\*.*?\*/', '', code, flags=re.DOTALL)
-        self.code = re.sub(r'//.*', '', code)
+        self.code = strip_comments(code)
+        self.positions = []
 
-    def tokenize(self):
-        """Yields (token_type, token_value) tuples."""
-        
-        for match in TOKEN_REGEX.finditer(self.code):
-            token_type = match.lastgroup  # The name of the group that matched
-            token_value = match.group()
-
-            if token_type == 'SKIP':
-                continue
-            elif token_type == 'MISMATCH':
-                raise RuntimeError(f"Unexpected character: {token_value}")
-            
-            # Post-processing steps
-            if token_type == 'STRING_CONST':
-                # As per spec, strip the quotes
-                token_value = token_value[1:-1]
-            elif token_type == 'IDENTIFIER' and token_value in KEYWORDS:
-                # If an identifier is a keyword, change its type
-                token_type = 'KEYWORD'
-                
-            yield token_type, token_value
+    def tokenize(self, with_positions=False):
+        """Yields (token_type, token_value) tuples; optionally records (line, column) in self.positions."""
+        self.positions = []
+        yield from tokenize_code(self.code, self.positions if with_positions else None)
             
             
             